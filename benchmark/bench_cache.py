@@ -0,0 +1,73 @@
+"""
+Measures how long Cache.flush takes to persist a handful of changes
+to a large cache, and how long loading it takes, with the JSON
+backend (which rewrites the whole cache), the append-only log backend
+and the SQLite backend.
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_cache.py [entries ...]
+"""
+
+import sys
+import tempfile
+from time import perf_counter
+
+from heartbeat.multiprocessing import Cache, AppendLogBackend, JsonCacheBackend
+from heartbeat.multiprocessing import SqliteCacheBackend
+from heartbeat.platform import ConfigManager
+from heartbeat.security import Encryptor
+
+
+def measure(entries, backend_class, changes=10, samples=20):
+    settings = ConfigManager({'heartbeat': {'secret_key': 'benchmark'}})
+    settings.finalize()
+    encryptor = Encryptor('benchmark')
+
+    with tempfile.TemporaryDirectory() as path:
+        backend = make_backend(backend_class, path, encryptor)
+        cache = Cache('bench', True, settings, encryptor, path, backend)
+        for i in range(entries):
+            cache.write("%032x" % i, float(i))
+        cache.flush()
+
+        elapsed = 0
+        for sample in range(samples):
+            for i in range(changes):
+                cache.write("%032x" % (sample * changes + i), float(sample))
+            start = perf_counter()
+            cache.flush()
+            elapsed += perf_counter() - start
+
+        compacting = getattr(backend, 'compacting', None)
+        if compacting is not None:
+            compacting.join()
+
+        start = perf_counter()
+        Cache('bench', False, settings, encryptor, path,
+              make_backend(backend_class, path, encryptor))
+        load = perf_counter() - start
+
+    return elapsed / samples, load
+
+
+def make_backend(backend_class, path, encryptor):
+    if backend_class is SqliteCacheBackend:
+        return SqliteCacheBackend(path + '/bench.sqlite3', 'bench')
+
+    return backend_class(path + '/bench.log', encryptor)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 50000]
+
+    for entries in sizes:
+        for name, backend_class in (("json", JsonCacheBackend),
+                                    ("log", AppendLogBackend),
+                                    ("sqlite", SqliteCacheBackend)):
+            per_flush, load = measure(entries, backend_class)
+            print("%6d entries %-6s %8.2fms per flush of 10 changes, "
+                  "%8.2fms to load" % (entries, name, per_flush * 1e3, load * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures the cost of loading the shipped configuration files, from
+YAML and from the compiled snapshot, and of reading settings the way the histamine plugins
+do, per packet and per send, from a finalized ConfigManager and from
+one still being built (which wraps sections on every access, as
+finalized ones did before v3.16.0).
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_config.py [reads]
+"""
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+from heartbeat.platform import ConfigManager, _read_config_files
+
+CONFIG_DIR = os.path.join(
+    os.path.dirname(__file__), '..', 'src', 'heartbeat', 'resources', 'cfg')
+
+
+def make_settings():
+    return ConfigManager({
+        'heartbeat': {
+            'secret_key': 'benchmark',
+            'use_encryption': True,
+            'enc_password': 'benchmark',
+            'monitor_server': None,
+            },
+        'monitoring': {
+            'histamine': {
+                'enable_acking': True,
+                'topics': ['warning', 'info'],
+                },
+            },
+        })
+
+
+def receive(settings):
+    # The settings Listener.receive reads for every packet
+    settings.heartbeat.secret_key
+    settings.heartbeat.use_encryption
+    settings.heartbeat.enc_password
+
+
+def acking(settings):
+    'histamine' in settings.monitoring
+    settings.monitoring.histamine.enable_acking
+
+
+def measure(function, settings, count):
+    start = perf_counter()
+    for i in range(count):
+        function(settings)
+
+    return (perf_counter() - start) / count
+
+
+def measure_load(samples=20):
+    with tempfile.TemporaryDirectory() as path:
+        config_dir = os.path.join(path, 'cfg')
+        os.makedirs(config_dir)
+        for conffile in glob.glob(os.path.join(CONFIG_DIR, '*.conf')):
+            shutil.copy(conffile, config_dir)
+
+        start = perf_counter()
+        _read_config_files(config_dir, path)
+        parsed = perf_counter() - start
+
+        start = perf_counter()
+        for i in range(samples):
+            _read_config_files(config_dir, path)
+        snapshot = (perf_counter() - start) / samples
+
+    print("load     yaml        %8.2fms" % (parsed * 1e3))
+    print("load     snapshot    %8.2fms" % (snapshot * 1e3))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    measure_load()
+
+    building = make_settings()
+    finalized = make_settings()
+    finalized.finalize()
+
+    for name, function in (("receive", receive), ("acking", acking)):
+        for state, settings in (("unfinalized", building),
+                                ("finalized", finalized)):
+            per_read = measure(function, settings, count)
+            print("%-8s %-12s %8.3fus per call" % (
+                name, state, per_read * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Measures the cost of creating events, both directly from a plugin
+method and by decoding them as histamine does, from JSON and from
+the binary wire format, and of turning away malformed packets. The
+memory held by each event created is measured with tracemalloc.
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_event.py [events]
+"""
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+from heartbeat.platform import Event, EventTemplate, Topics
+
+
+class Producer(object):
+
+    """
+    Creates events from a method, as plugins do
+    """
+
+    def produce(self, count):
+        for i in range(count):
+            Event("Benchmark", "event %d" % i, type=Topics.INFO)
+
+    def keep(self, count):
+        return [Event("Benchmark", "event", type=Topics.INFO)
+                for i in range(count)]
+
+
+def measure(function, count):
+    start = perf_counter()
+    function(count)
+    return (perf_counter() - start) / count
+
+
+def allocated(function, count):
+    """
+    Returns the bytes held per event by the events a function
+    creates and keeps
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = function(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    event = Event("Benchmark", "event", type=Topics.INFO)
+    event.payload = {'histamine_attempt': 1}
+    data = event.to_json()
+    binary = event.to_bytes()
+
+    def decode(count):
+        for i in range(count):
+            Event.from_json(data)
+
+    def decode_bytes(count):
+        for i in range(count):
+            Event.from_bytes(binary)
+
+    def beat(count):
+        for i in range(count):
+            e = Event("Beat", "", "example.com", Topics.HEARTBEAT, "Pulse")
+            e.to_json()
+            e.__hash__()
+
+    hostile = '{"title": "x", "message": [' + '1,' * 2000 + '1], "type": "INFO"}'
+    junk = b'\x8f' * 1400
+
+    def reject(count):
+        for i in range(count):
+            for data in (hostile, junk):
+                try:
+                    Event.list_from_wire(
+                        data.encode("UTF-8") if isinstance(data, str) else data)
+                except Exception:
+                    pass
+
+    template = EventTemplate(
+        "Beat", "", "example.com", Topics.HEARTBEAT, "Pulse")
+
+    def beat_template(count):
+        for i in range(count):
+            e = template.create()
+            e.to_json()
+            e.__hash__()
+
+    print("Encoded sizes: JSON %d bytes, binary %d bytes" % (
+        len(data), len(binary)))
+
+    for name, function in (
+            ("Event(...)", Producer().produce),
+            ("Event.from_json(...)", decode),
+            ("Event.from_bytes(...)", decode_bytes),
+            ("Rejecting 2 packets", reject),
+            ("Beat, encoded", beat),
+            ("Beat from template", beat_template)):
+        per_event = measure(function, count)
+        print("%-22s %8.2fus per event, %9.0f events/sec" % (
+            name, per_event * 1e6, 1 / per_event))
+
+    print("%-22s %8.0f bytes held per event" % (
+        "Event(...)", allocated(Producer().keep, count)))
+
+
+if __name__ == "__main__":
+    main()
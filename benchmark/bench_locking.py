@@ -0,0 +1,70 @@
+"""
+Measures LockingDictionary under contention: many writer threads
+updating their own keys while a reader repeatedly iterates the
+items, as PulseMonitor.cleanup_hosts does while hosts are heard from.
+Iterations which fail because the dictionary changed underneath them
+are counted.
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_locking.py [writers ...]
+"""
+
+import sys
+import threading
+from time import perf_counter
+
+from heartbeat.multiprocessing import LockingDictionary
+
+
+def measure(writers, writes=20000, keys=1000):
+    dictionary = LockingDictionary()
+    for i in range(keys):
+        dictionary.write((0, i), 0.0)
+
+    done = threading.Event()
+    iterations = [0, 0]
+
+    def writer(n):
+        # Each writer has keys of its own, so removals can't race
+        for i in range(writes):
+            key = (n, i % (keys // writers + 1))
+            if i % 10 == 0 and dictionary.exists(key):
+                dictionary.remove(key)
+            else:
+                dictionary.write(key, float(i))
+
+    def reader():
+        while not done.is_set():
+            try:
+                for key, value in dictionary.items():
+                    pass
+                iterations[0] += 1
+            except RuntimeError:
+                iterations[1] += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    watcher = threading.Thread(target=reader)
+    watcher.start()
+
+    start = perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = perf_counter() - start
+
+    done.set()
+    watcher.join()
+
+    return writers * writes / elapsed, iterations[0], iterations[1]
+
+
+def main(counts):
+    for writers in counts:
+        rate, iterated, failed = measure(writers)
+        print("%3d writers %10.0f writes/s, %6d iterations, %6d failed" % (
+            writers, rate, iterated, failed))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1, 4, 16, 64])
@@ -0,0 +1,73 @@
+"""
+Measures RateLimitHandler.allow_event latency with large caches,
+comparing writing the caches on every event (flush_interval=0)
+with the coalesced background flush.
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_ratelimit.py [entries ...]
+"""
+
+import sys
+import tempfile
+from time import perf_counter, time
+
+from heartbeat.multiprocessing import Cache
+from heartbeat.platform import ConfigManager, Event
+from heartbeat.routing import RateLimitHandler
+
+
+def make_caches(path, entries):
+    settings = ConfigManager({'heartbeat': {'secret_key': 'benchmark'}})
+    settings.finalize()
+
+    time_cache = Cache('bench-time', True, settings, path=path)
+    event_cache = Cache('bench-previous', True, settings, path=path)
+    now = time()
+    for i in range(entries):
+        time_cache.write("%032x" % i, now - i)
+        event_cache.write("Source%d" % i, "%032x" % i)
+
+    return time_cache, event_cache
+
+
+def measure(entries, flush_interval, samples):
+    with tempfile.TemporaryDirectory() as path:
+        time_cache, event_cache = make_caches(path, entries)
+        limiter = RateLimitHandler(
+            None,
+            event_cache,
+            time_cache,
+            flush_interval=flush_interval,
+            max_entries=entries + samples
+        )
+        events = [Event("Benchmark", "event %d" % i) for i in range(samples)]
+        for e in events:
+            e.source = "Benchmark"
+
+        timings = []
+        for e in events:
+            start = perf_counter()
+            limiter.allow_event(e)
+            timings.append(perf_counter() - start)
+
+        limiter.halt()
+
+    timings.sort()
+    return (
+        sum(timings) / len(timings),
+        timings[int(len(timings) * 0.99) - 1]
+    )
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000]
+
+    for entries in sizes:
+        for flush_interval, samples in ((0, 20), (30, 2000)):
+            mean, p99 = measure(entries, flush_interval, samples)
+            print("%7d entries, flush_interval=%-2d: mean %9.1fus  p99 %9.1fus" % (
+                entries, flush_interval, mean * 1e6, p99 * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures EventRouter throughput, from put_event until every
+subscriber has received the event, using no-op subscribers.
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_router.py [events] [subscribers]
+"""
+
+import concurrent.futures
+import sys
+import threading
+from time import perf_counter
+
+from heartbeat.platform import Event, Topics
+from heartbeat.routing import EventRouter
+
+
+class AllowAll(object):
+
+    """
+    A limiter that allows every event through
+    """
+
+    def allow_event(self, event):
+        return True
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    expected = events * subscribers
+    received = [0]
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def subscriber(event):
+        with lock:
+            received[0] += 1
+            if received[0] == expected:
+                done.set()
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+    router = EventRouter(pool, AllowAll())
+    router.logger.disabled = True
+
+    for i in range(subscribers):
+        router.attach(Topics.INFO, lambda e, s=subscriber: s(e), queue_size=0)
+
+    batch = [Event("Benchmark", "event %d" % i) for i in range(events)]
+
+    start = perf_counter()
+    for e in batch:
+        router.put_event(e)
+    done.wait()
+    elapsed = perf_counter() - start
+
+    pool.shutdown()
+    print("%d events x %d subscribers in %.3fs: %.1f events/sec" % (
+        events, subscribers, elapsed, events / elapsed))
+
+
+if __name__ == "__main__":
+    main()
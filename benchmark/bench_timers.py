@@ -0,0 +1,65 @@
+"""
+Runs many repeating BackgroundTimers for a while, then reports how
+many threads ran their callbacks, the most threads alive at once, and
+how far each timer's ticks drifted from its fixed schedule by the end.
+
+Usage:
+    PYTHONPATH=src python benchmark/bench_timers.py [timers ...]
+"""
+
+import sys
+import threading
+from time import monotonic, process_time, sleep
+
+from heartbeat.multiprocessing import BackgroundTimer
+
+
+def measure(count, interval=0.01, duration=2.0):
+    ticks = [[] for i in range(count)]
+    threads = set()
+
+    def callback(n):
+        ticks[n].append(monotonic())
+        threads.add(threading.get_ident())
+
+    timers = [
+        BackgroundTimer(interval, True, (lambda n=n: callback(n)))
+        for n in range(count)
+        ]
+
+    peak = threading.active_count()
+    cpu = process_time()
+    started = monotonic()
+    for timer in timers:
+        timer.start()
+
+    while monotonic() - started < duration:
+        peak = max(peak, threading.active_count())
+        sleep(0.001)
+
+    for timer in timers:
+        timer.stop()
+    cpu = process_time() - cpu
+
+    # How late the last tick ran compared with when it was due on a
+    # fixed schedule from the start
+    drift = [
+        times[-1] - (started + interval * len(times))
+        for times in ticks if times
+        ]
+
+    return (sum(len(t) for t in ticks), len(threads), peak,
+            sum(drift) / len(drift), cpu)
+
+
+def main(counts):
+    for count in counts:
+        calls, threads, peak, drift, cpu = measure(count)
+        print("%4d timers %7d calls, %7d threads used, %4d alive at peak, "
+              "%7.1fms drift, %5.2fs cpu" % (
+                  count, calls, threads, peak, drift * 1e3, cpu))
+        sleep(0.5)
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10, 100])
@@ -61,6 +61,8 @@ setup(name='heartbeat',
         'heartbeat.security',
         'heartbeat.pluggable',
         'heartbeat.routing',
+        'heartbeat.metrics',
+        'heartbeat.events',
         # Heartbeat file resources
         'heartbeat.resources',
         'heartbeat.resources.cfg',
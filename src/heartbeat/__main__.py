@@ -4,8 +4,13 @@ import sys, os
 if (sys.version_info < (3, 3)):
     sys.path.append('/lib/python3.2/site-packages')
 
-from heartbeat.routing import EventRouter
-from heartbeat.platform import get_config_manager
+from heartbeat.routing import EventRouter, RateLimitHandler, TopicPriorityQueue
+from heartbeat.routing import get_subscriber_options, get_limiter_options
+from heartbeat.routing import get_queue_options, get_coalescer_options
+from heartbeat.routing import EventCoalescer
+from heartbeat.events import EventBuffer, get_buffer_options
+from heartbeat.platform import get_config_manager, reload_config_manager
+from heartbeat.platform import config_changed, get_cache_path
 from heartbeat.monitoring import MonitorType, MonitorHandler
 from heartbeat.plugin import PluginRegistry
 import time
@@ -44,6 +49,8 @@ termhandler = logging.StreamHandler(sys.stdout)
 termhandler.setLevel(logging.INFO)
 logger.addHandler(termhandler)
 
+dispatcher = None
+
 class SignalHandling(object):
     """
     Does graceful signal handling for heartbeat.
@@ -52,6 +59,9 @@ class SignalHandling(object):
         signal.signal(signal.SIGQUIT, exit_heartbeat)
         signal.signal(signal.SIGTERM, exit_heartbeat)
         signal.signal(signal.SIGINT, exit_heartbeat)
+        signal.signal(signal.SIGUSR1, dump_metrics)
+        signal.signal(signal.SIGUSR2, export_history)
+        signal.signal(signal.SIGHUP, reload_heartbeat)
 
     def __exit__(self, type, value, traceback):
         # Ideally this would restore the original
@@ -66,12 +76,238 @@ def exit_heartbeat(signal, frame):
         logger.debug("Calling halt() on %s", str(p))
         p.halt()
 
+    if dispatcher is not None:
+        logger.debug("Calling halt() on the event router")
+        dispatcher.halt()
+
     logger.info("Waiting 5 seconds for plugins to halt, then exiting...")
     time.sleep(5)
 
     os._exit(0)
 
+def dump_metrics(signal, frame):
+    """
+    Logs the event router's metrics, on receiving SIGUSR1
+    """
+    if dispatcher is not None:
+        logger.info("Event router metrics:\n%s", dispatcher.metrics.dump())
+
+def export_history(signal, frame):
+    """
+    Writes out the recent events, on receiving SIGUSR2
+    """
+    if dispatcher is None or dispatcher.history is None:
+        logger.info("No recent events are kept")
+        return
+
+    path = os.path.join(get_cache_path(), "recent-events.json")
+    try:
+        with open(path, "w") as f:
+            f.write(dispatcher.history.export())
+        logger.info("Wrote %d recent events to %s", len(dispatcher.history), path)
+    except OSError as err:
+        logger.error("Unable to write recent events to %s: %s", path, str(err))
+
+def reload_heartbeat(signal, frame, asynchronous=False):
+    """
+    Reads the configuration again on receiving SIGHUP, and applies
+    it to the plugins affected by the changes
+    """
+    logger.info("Received signal %i. Reloading configuration.", signal)
+    try:
+        settings, changed = reload_config_manager()
+    except Exception as err:
+        logger.error(
+            "Unable to reload configuration, keeping the current one: %s",
+            str(err)
+            )
+        return
+
+    if not changed:
+        logger.info("Configuration is unchanged")
+        return
+
+    logger.debug("Changed settings: %s", ", ".join(sorted(changed)))
+    if dispatcher is not None:
+        reload_plugins(dispatcher, settings, changed, asynchronous)
+
+def reload_plugins(dispatcher, settings, changed, asynchronous=False):
+    """
+    Reloads the plugins whose configuration changed, subscribing
+    them again so changes to their subscriptions and routing options
+    take effect. Changes nothing could apply are logged as needing
+    a restart.
+
+    Resubscribed plugins get new subscribers, so the notify threadpool
+    is replaced with one sized for them; deliveries already under way
+    finish in the old one.
+
+    Params:
+        EventRouter dispatcher
+        ConfigManager settings: the new configuration
+        set changed: the changed settings, from reload_config_manager
+        bool asynchronous: whether heartbeat runs on the event loop
+    """
+    applied = set()
+    resubscribed = False
+    routing = config_changed('notifying.routing', changed)
+    if routing:
+        applied.add('notifying.routing')
+
+    for plugin in PluginRegistry.get_active_plugins():
+        sections = [
+            s for s in plugin.get_config_sections()
+            if config_changed(s, changed)
+            ]
+        if not sections and not routing:
+            continue
+
+        unsubscribe_plugin(dispatcher, plugin, asynchronous)
+        if sections:
+            if plugin.reload(settings):
+                logger.info("Reloaded %s", str(plugin))
+                applied.update(sections)
+            else:
+                logger.warning(
+                    "%s needs a restart to apply changes to %s",
+                    str(plugin),
+                    ", ".join(sections)
+                    )
+        subscribe_plugin(dispatcher, plugin, settings, asynchronous)
+        resubscribed = True
+
+    if resubscribed:
+        # The old threadpool isn't shut down, as the router may still
+        # be submitting to it; its workers exit once it is dropped and
+        # the work given to it is done
+        dispatcher.threadpool = create_notify_threadpool(dispatcher)
+
+    pending = [
+        c for c in changed
+        if not any(config_changed(a, set([c])) for a in applied)
+        ]
+    if pending:
+        logger.warning(
+            "Changes to %s take effect when heartbeat restarts",
+            ", ".join(sorted(pending))
+            )
+
+def unsubscribe_plugin(dispatcher, plugin, asynchronous=False):
+    """
+    Detaches all of a plugin's subscriptions from the event router
+    """
+    callbacks = list(plugin.get_subscriptions().values())
+    callbacks += [c for c, size, latency in plugin.get_batch_subscriptions().values()]
+    if asynchronous:
+        callbacks += list(plugin.get_async_subscriptions().values())
+
+    for c in callbacks:
+        dispatcher.detach(c)
+
+def subscribe_plugin(dispatcher, plugin, settings, asynchronous=False):
+    """
+    Attaches a plugin's subscriptions to the event router, with
+    the routing options configured for it. Filters from the
+    configuration apply on top of those the plugin declares.
+    With the asyncio runtime, a plugin's coroutine subscriptions
+    replace its synchronous subscriptions to the same topics.
+    """
+    options = get_subscriber_options(plugin, settings)
+    configured_filter = options.pop('event_filter', None)
+    filters = plugin.get_subscription_filters()
+
+    def options_for(callback):
+        event_filter = filters.get(callback)
+        if configured_filter is not None:
+            if event_filter is None:
+                event_filter = configured_filter
+            else:
+                event_filter = event_filter.combine(configured_filter)
+        return dict(options, event_filter=event_filter)
+
+    async_subscriptions = {}
+    if asynchronous:
+        async_subscriptions = plugin.get_async_subscriptions()
+
+    for t, c in async_subscriptions.items():
+        dispatcher.attach_async(t, c, **options_for(c))
+    for t, c in plugin.get_subscriptions().items():
+        if t not in async_subscriptions:
+            dispatcher.attach(t, c, **options_for(c))
+    for t, (c, size, latency) in plugin.get_batch_subscriptions().items():
+        dispatcher.attach_batch(t, c, size, latency, **options_for(c))
+
+def add_producers(hwmon, plugin, asynchronous=False):
+    """
+    Adds a plugin's producers to the monitor handler. With the
+    asyncio runtime, a plugin's coroutine producers replace its
+    synchronous producers of the same type.
+
+    Returns:
+        int: the number of threadpool workers the producers need
+    """
+    async_producers = {}
+    if asynchronous:
+        async_producers = plugin.get_async_producers()
+
+    for t, c in async_producers.items():
+        if t == MonitorType.REALTIME:
+            hwmon.add_async_realtime_monitor(c)
+        elif t == MonitorType.PERIODIC:
+            hwmon.add_async_periodic_monitor(c)
+
+    workers = 0
+    for t, c in plugin.get_producers().items():
+        if t in async_producers:
+            continue
+        workers += 1
+        if t == MonitorType.REALTIME:
+            hwmon.add_realtime_monitor(c)
+        elif t == MonitorType.PERIODIC:
+            hwmon.add_periodic_monitor(c)
+
+    return workers
+
+def create_limiter(settings):
+    flush_interval = settings.heartbeat.cache_flush_interval
+    if flush_interval is None:
+        flush_interval = 30
+
+    return RateLimitHandler(
+        flush_interval=flush_interval,
+        **get_limiter_options(settings)
+    )
+
+def create_coalescer(settings):
+    options = get_coalescer_options(settings)
+    if options is None:
+        return None
+
+    return EventCoalescer(**options)
+
+def create_history(settings):
+    options = get_buffer_options(settings)
+    if options is None:
+        return None
+
+    return EventBuffer(**options)
+
+def create_notify_threadpool(dispatcher):
+    # One worker for the router's queue, plus enough for every
+    # subscriber to run at its concurrency limit so a stalled
+    # subscriber can't starve the others of workers.
+    notify_workers = 1
+    for s in dispatcher.subscribers.values():
+        if not s.asynchronous:
+            notify_workers += s.concurrency
+
+    return concurrent.futures.ThreadPoolExecutor(
+            max_workers = notify_workers
+            )
+
 def main():
+    global dispatcher
+
     if (sys.version_info < (3, 3)):
         logger.error("Your Python version is older than 3.3. It is no longer officially supported!")
 
@@ -82,10 +318,18 @@ def main():
     PluginRegistry.populate_from_settings(settings)
     PluginRegistry.activate_plugins()
 
-    logger.info("Bringing up notification/event handling")
-    notifyPool = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+    if settings.heartbeat.runtime == 'asyncio':
+        run_asyncio(settings)
+        return
 
-    dispatcher = EventRouter(notifyPool)
+    logger.info("Bringing up notification/event handling")
+    dispatcher = EventRouter(
+        None,
+        create_limiter(settings),
+        queue=TopicPriorityQueue(**get_queue_options(settings)),
+        coalescer=create_coalescer(settings),
+        history=create_history(settings)
+    )
 
     hwmon = MonitorHandler(
         event_callback=dispatcher.put_event,
@@ -97,23 +341,72 @@ def main():
     required_workers = 1
 
     for plugin in PluginRegistry.get_active_plugins():
-        for t, c in plugin.get_subscriptions().items():
-            dispatcher.attach(t, c)
-        for t, c in plugin.get_producers().items():
-            required_workers += 1
-            if t == MonitorType.REALTIME:
-                hwmon.add_realtime_monitor(c)
-            elif t == MonitorType.PERIODIC:
-                hwmon.add_periodic_monitor(c)
+        subscribe_plugin(dispatcher, plugin, settings)
+        required_workers += add_producers(hwmon, plugin)
 
     hwmon.threadpool = concurrent.futures.ThreadPoolExecutor(
             max_workers = required_workers
             )
+    dispatcher.threadpool = create_notify_threadpool(dispatcher)
 
     with SignalHandling() as sh:
         hwmon.start()
         while 1:
             time.sleep(1)
 
+def run_asyncio(settings):
+    """
+    Runs heartbeat on an event loop. Coroutine producers and
+    subscribers run on the loop, while plugins without them
+    run in threadpools as usual.
+    """
+    global dispatcher
+
+    import asyncio
+    from heartbeat.routing.asynchronous import AsyncEventRouter
+    from heartbeat.monitoring.asynchronous import AsyncMonitorHandler
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    logger.info("Bringing up notification/event handling on the event loop")
+    dispatcher = AsyncEventRouter(
+        None,
+        loop,
+        create_limiter(settings),
+        queue=TopicPriorityQueue(**get_queue_options(settings)),
+        coalescer=create_coalescer(settings),
+        history=create_history(settings)
+    )
+
+    hwmon = AsyncMonitorHandler(
+        event_callback=dispatcher.put_event,
+        threadpool=None,
+        loop=loop,
+        interval=settings.heartbeat.query_interval,
+        logger=logger
+    )
+
+    required_workers = 1
+
+    for plugin in PluginRegistry.get_active_plugins():
+        subscribe_plugin(dispatcher, plugin, settings, asynchronous=True)
+        required_workers += add_producers(hwmon, plugin, asynchronous=True)
+
+    hwmon.threadpool = concurrent.futures.ThreadPoolExecutor(
+            max_workers = required_workers
+            )
+    dispatcher.threadpool = create_notify_threadpool(dispatcher)
+
+    for s in (signal.SIGQUIT, signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(s, exit_heartbeat, s, None)
+    loop.add_signal_handler(signal.SIGUSR1, dump_metrics, signal.SIGUSR1, None)
+    loop.add_signal_handler(signal.SIGUSR2, export_history, signal.SIGUSR2, None)
+    loop.add_signal_handler(
+        signal.SIGHUP, reload_heartbeat, signal.SIGHUP, None, True)
+
+    hwmon.start()
+    loop.run_forever()
+
 if __name__ == "__main__":
     main()
@@ -1,30 +1,214 @@
+"""
+A record of recent events, for inspecting what a running heartbeat
+has seen
 
+@since v3.16.0
+"""
+import datetime
+import json
+import threading
+from collections import deque
 
-class EventRegistry(type):
+from heartbeat.platform import get_config_manager
+
+
+def get_buffer_options(settings=None):
     """
-    @since v3.13.0
+    Reads the recent event buffer's options from the event_history
+    section of heartbeat.conf:
+
+    event_history:
+        capacity: 500
+
+    Params:
+        ConfigManager settings: defaults to the global configuration
+
+    Returns:
+        dict: keyword arguments for EventBuffer, or None if the
+            buffer is disabled (a capacity of 0)
     """
+    if settings is None:
+        settings = get_config_manager()
+
+    options = {}
+    config = settings.heartbeat.event_history
+    if config is not None and config.capacity is not None:
+        if config.capacity <= 0:
+            return None
+        options['capacity'] = config.capacity
+
+    return options
+
+
+class EventBuffer(object):
+
+    """
+    A bounded, thread-safe ring of the most recent events. Once full,
+    each new event replaces the oldest. Events are indexed by topic,
+    host and source as they are added, so queries on those only look
+    at matching events.
+
+    @since v3.16.0
+    """
+
+    default_capacity = 500
+
+    # The indexes, in the order of the keys kept with each event
+    indexes = ('topic', 'host', 'source')
+
+    def __init__(self, capacity=None):
+        """
+        Constructor
+
+        Params:
+            int capacity: the most events to keep
+        """
+        if capacity is None:
+            capacity = self.default_capacity
+
+        if capacity < 1:
+            raise Exception("An event buffer must hold at least one event")
+
+        self.capacity = capacity
+        # Each slot holds an event with the keys it was indexed by,
+        # in case the event is changed afterwards
+        self._ring = [None] * capacity
+        # The sequence number the next event will have; an event's
+        # slot in the ring is its sequence number modulo the capacity
+        self._next = 0
+        self._indexes = tuple({} for i in self.indexes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._next, self.capacity)
+
+    def append(self, event):
+        """
+        Records an event, evicting the oldest if the buffer is full
+
+        Params:
+            Event event
+        """
+        keys = (event.type, event.host, event.source)
+
+        with self._lock:
+            sequence = self._next
+            slot = sequence % self.capacity
+            evicted = self._ring[slot]
+            if evicted is not None:
+                self._unindex(evicted[0])
+
+            self._ring[slot] = (keys, event)
+            for index, key in zip(self._indexes, keys):
+                entries = index.get(key)
+                if entries is None:
+                    entries = index[key] = deque()
+                entries.append(sequence)
+
+            self._next = sequence + 1
+
+    def _unindex(self, keys):
+        # The evicted event is the oldest there is, so it is first
+        # in each of its indexes
+        for index, key in zip(self._indexes, keys):
+            entries = index[key]
+            entries.popleft()
+            if not entries:
+                del index[key]
+
+    def latest(self):
+        """
+        Returns:
+            Event: the most recent event, or None if there are none
+        """
+        with self._lock:
+            if self._next == 0:
+                return None
+
+            return self._ring[(self._next - 1) % self.capacity][1]
+
+    def query(self, topic=None, host=None, source=None, limit=None):
+        """
+        Finds recent events matching all of the criteria given
+
+        Params:
+            Topics topic: the topic of the events
+            string host: the host the events came from
+            string source: the source of the events
+            int limit: the most events to return, keeping the most
+                recent
+
+        Returns:
+            Event[]: the matching events, oldest first
+        """
+        criteria = [
+            (position, key) for position, key in enumerate((topic, host, source))
+            if key is not None
+            ]
+
+        with self._lock:
+            if criteria:
+                candidates = None
+                for position, key in criteria:
+                    entries = self._indexes[position].get(key, ())
+                    if candidates is None or len(entries) < len(candidates):
+                        candidates = entries
+            else:
+                candidates = range(max(0, self._next - self.capacity), self._next)
+
+            matches = []
+            for sequence in reversed(candidates):
+                keys, event = self._ring[sequence % self.capacity]
+                if all(keys[position] == key for position, key in criteria):
+                    matches.append(event)
+                    if limit is not None and len(matches) >= limit:
+                        break
 
-    __buffer_end = 50
-    __buffer = [None] * (__buffer_end)
-    __buffer_pointer = 0
+        matches.reverse()
+        return matches
 
-    def __init__(cls, name, bases, attrs):
+    def counts(self, index='topic'):
+        """
+        Counts the events held, by topic, host or source
 
-        EventRegistry.__set_buffer_next(cls)
+        Params:
+            string index: one of topic, host or source
 
-    def __get_buffer_latest():
+        Returns:
+            dict: the number of events for each topic, host or source
+        """
+        with self._lock:
+            return dict(
+                (key, len(entries))
+                for key, entries in self._indexes[self.indexes.index(index)].items()
+                )
 
-        latest_index = EventRegistry.__buffer_pointer - 1
-        if latest_index < 0:
-            latest_index = EventRegistry.__buffer_end
+    def clear(self):
+        """
+        Discards every event
+        """
+        with self._lock:
+            self._ring = [None] * self.capacity
+            self._next = 0
+            for index in self._indexes:
+                index.clear()
 
-        return EventRegistry.__buffer[latest_index]
+    def export(self, **criteria):
+        """
+        Exports recent events for debugging
 
-    def __set_buffer_next(value):
+        Params:
+            criteria: topic, host, source and limit, as for query
 
-        EventRegistry.__buffer[EventRegistry.buffer_pointer] = value
+        Returns:
+            string: a JSON array of the events, oldest first, each
+                with the time it occurred
+        """
+        exported = []
+        for event in self.query(**criteria):
+            dictionary = event.to_dict()
+            dictionary['time'] = datetime.datetime.fromtimestamp(
+                event.when).isoformat()
+            exported.append(dictionary)
 
-        EventRegistry.__buffer_pointer += 1
-        if (EventRegistry.__buffer_pointer > EventRegistry.__buffer_end):
-            EventRegistry.__buffer_pointer = 0
+        return json.dumps(exported, indent=2, default=str)
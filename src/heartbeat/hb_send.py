@@ -33,7 +33,7 @@ def main():
         print_help()
         sys.exit(1)
     event.source = 'LocalSocket'
-    event.host = NetworkInfo().get_fqdn()
+    event.host = NetworkInfo(caching=False).get_fqdn()
     if len(sys.argv) > 2:
         try:
             event.payload = json.loads(sys.argv[2])
@@ -0,0 +1,298 @@
+"""
+Lightweight counters, gauges and histograms for watching heartbeat
+at runtime.
+
+@since v3.16.0
+"""
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class Counter(object):
+
+    """
+    A count which only goes up
+
+    @since v3.16.0
+    """
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """
+        Increases the count
+
+        Params:
+            int amount: how much to increase the count by
+        """
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(object):
+
+    """
+    A value read from the running system when it is sampled
+
+    @since v3.16.0
+    """
+
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        """
+        Constructor
+
+        Params:
+            Function function: returns the current value
+        """
+        self.function = function
+
+    def snapshot(self):
+        return self.function()
+
+
+class Histogram(object):
+
+    """
+    Counts observed values into buckets, keeping the count, sum,
+    minimum and maximum. Percentiles are estimated from the bucket
+    boundaries.
+
+    @since v3.16.0
+    """
+
+    # Seconds, for timing anything from a queue handoff to a slow
+    # network call
+    default_buckets = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+        0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+        )
+
+    # Lengths, for queue depths and worker counts
+    size_buckets = (
+        0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000
+        )
+
+    def __init__(self, buckets=None):
+        """
+        Constructor
+
+        Params:
+            list buckets: the upper bounds of the buckets
+        """
+        if buckets is None:
+            buckets = self.default_buckets
+
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Records a value
+
+        Params:
+            float value
+        """
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, percent):
+        """
+        Estimates a percentile of the observed values, as the upper
+        bound of the bucket it falls in
+
+        Params:
+            float percent: the percentile, from 0 to 100
+
+        Returns:
+            float: the estimate, or None if nothing was observed
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+
+            rank = self.count * percent / 100.0
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count > 0:
+                    break
+
+            if bucket >= len(self.buckets):
+                return self.max
+
+            return min(self.buckets[bucket], self.max)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: the count, sum, mean, min, max and estimated
+                50th, 90th and 99th percentiles
+        """
+        with self._lock:
+            count = self.count
+            total = self.sum
+            low = self.min
+            high = self.max
+
+        return OrderedDict((
+            ('count', count),
+            ('sum', total),
+            ('mean', total / count if count else None),
+            ('min', low),
+            ('max', high),
+            ('p50', self.percentile(50)),
+            ('p90', self.percentile(90)),
+            ('p99', self.percentile(99)),
+            ))
+
+
+class MetricsRegistry(object):
+
+    """
+    A named collection of metrics. Metrics are identified by a name
+    and optional labels, and are created the first time they are
+    asked for, so the same metric can be fetched from anywhere.
+
+    @since v3.16.0
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def counter(self, name, **labels):
+        """
+        Gets or creates a Counter
+
+        Params:
+            string name
+            labels: values further identifying the metric
+
+        Returns:
+            Counter
+        """
+        return self._get(name, labels, Counter)
+
+    def histogram(self, name, buckets=None, **labels):
+        """
+        Gets or creates a Histogram
+
+        Params:
+            string name
+            list buckets: the upper bounds of the buckets, if created
+            labels: values further identifying the metric
+
+        Returns:
+            Histogram
+        """
+        return self._get(name, labels, lambda: Histogram(buckets))
+
+    def gauge(self, name, function, **labels):
+        """
+        Registers a Gauge, replacing any of the same name and labels
+
+        Params:
+            string name
+            Function function: returns the current value
+            labels: values further identifying the metric
+
+        Returns:
+            Gauge
+        """
+        gauge = Gauge(function)
+        with self._lock:
+            self._metrics[self._key(name, labels)] = gauge
+
+        return gauge
+
+    def snapshot(self):
+        """
+        Samples every metric
+
+        Returns:
+            OrderedDict: the metric names, with their labels, mapped
+                to their current values
+        """
+        with self._lock:
+            metrics = list(self._metrics.items())
+
+        values = OrderedDict()
+        for key, metric in metrics:
+            try:
+                values[key] = metric.snapshot()
+            except Exception as error:
+                values[key] = "unavailable (%s)" % str(error)
+
+        return values
+
+    def dump(self):
+        """
+        Formats every metric for logging or display
+
+        Returns:
+            string: one line per metric
+        """
+        lines = []
+        for key, value in self.snapshot().items():
+            if isinstance(value, dict):
+                value = " ".join(
+                    "%s=%s" % (k, self._format(v)) for k, v in value.items()
+                    )
+            lines.append("%s %s" % (key, value))
+
+        return "\n".join(lines)
+
+    def _get(self, name, labels, factory):
+        key = self._key(name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = factory()
+                    self._metrics[key] = metric
+
+        return metric
+
+    def _key(self, name, labels):
+        if not labels:
+            return name
+
+        return "%s{%s}" % (
+            name,
+            ",".join("%s=%s" % (k, labels[k]) for k in sorted(labels))
+            )
+
+    def _format(self, value):
+        if isinstance(value, float):
+            return "%.6g" % value
+
+        return str(value)
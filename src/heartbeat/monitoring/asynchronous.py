@@ -0,0 +1,151 @@
+"""
+Monitoring for the asyncio runtime
+
+@since v3.16.0
+"""
+import asyncio
+
+from heartbeat.monitoring import MonitorHandler
+
+
+class LoopTimer(object):
+
+    """
+    A repeating timer run by an event loop rather than a thread,
+    with the same interface as BackgroundTimer
+
+    @since v3.16.0
+    """
+
+    def __init__(self, loop, interval, callback):
+        """
+        Constructor
+
+        Params:
+            AbstractEventLoop loop: the loop to run the callback on
+            float interval: the time between calls, in seconds
+            Function callback: the function to call
+        """
+        self.loop = loop
+        self.interval = interval
+        self.callback = callback
+        self.is_running = False
+        self._handle = None
+
+    def start(self):
+        """
+        Starts the timer, if it is not already running
+        """
+        if not self.is_running:
+            self.is_running = True
+            self.loop.call_soon_threadsafe(self._schedule)
+
+    def stop(self):
+        """
+        Stops the timer
+        """
+        self.is_running = False
+        if self._handle is not None:
+            self.loop.call_soon_threadsafe(self._handle.cancel)
+
+    def _schedule(self):
+        self._handle = self.loop.call_later(self.interval, self._run)
+
+    def _run(self):
+        if self.is_running:
+            self._schedule()
+            self.callback()
+
+
+class AsyncMonitorHandler(MonitorHandler):
+
+    """
+    A MonitorHandler which runs coroutine producers as tasks on an
+    event loop, alongside synchronous producers in the threadpool.
+    Periodic scans are scheduled by the loop.
+
+    @since v3.16.0
+    """
+
+    def __init__(self, event_callback, threadpool, loop, interval=60,
+                 logger=None, timer=None):
+        """
+        Constructor
+
+        Params:
+            Callable event_callback: method to call when a new Event is received
+            Threadpool threadpool: threadpool for synchronous producers
+            AbstractEventLoop loop: the loop to run coroutine producers on
+            Logger logger: logger
+            LoopTimer timer: Timer instance for running periodic queries
+        """
+        self.loop = loop
+        self.async_realtime_plugins = []
+        self.async_periodic_plugins = []
+
+        if timer is None:
+            timer = LoopTimer(loop, interval, self.scan)
+
+        super(AsyncMonitorHandler, self).__init__(
+            event_callback, threadpool, interval, logger, timer)
+
+    def add_async_realtime_monitor(self, call):
+        """
+        Adds a realtime monitoring plugin which runs on the loop
+
+        Params:
+            Callable call: a coroutine function taking the event
+                callback, which runs for the life of the plugin
+        """
+        if self.started:
+            raise Exception(
+                "Plugins cannot be added to a running handler"
+                )
+        self.async_realtime_plugins.append(call)
+
+    def add_async_periodic_monitor(self, call):
+        """
+        Adds a periodic monitoring plugin which runs on the loop
+
+        Params:
+            Callable call: a coroutine function taking the event
+                callback
+        """
+        if self.started:
+            raise Exception(
+                "Plugins cannot be added to a running handler"
+                )
+        self.async_periodic_plugins.append(call)
+
+    def start(self):
+        """
+        Overrides MonitorHandler.start
+        """
+        self.logger.debug("Starting asynchronous realtime monitors")
+        for m in self.async_realtime_plugins:
+            self._run_on_loop(m)
+
+        super(AsyncMonitorHandler, self).start()
+
+    def scan(self):
+        """
+        Overrides MonitorHandler.scan
+        """
+        super(AsyncMonitorHandler, self).scan()
+        for m in self.async_periodic_plugins:
+            self.logger.debug("Querying %s", str(m))
+            self._run_on_loop(m)
+
+    def _run_on_loop(self, call):
+        """
+        Schedules a coroutine producer on the loop. This is safe
+        to call whether or not the loop is running yet.
+
+        Params:
+            Callable call: the coroutine function of the producer
+        """
+        f = asyncio.run_coroutine_threadsafe(
+            call(self.event_callback),
+            self.loop
+            )
+        f.add_done_callback(self._check_call_status)
@@ -1,16 +1,39 @@
+import itertools
+import logging
 import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from heapq import heapify, heappop, heappush
+from random import random
+from time import monotonic
 from heartbeat.platform import get_config_manager, get_cache_path
 from heartbeat.security import Encryptor
 import os
 from hashlib import sha256
 import json
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
 
 class LockingDictionary(object):
 
     """
-    A thread-safe wrapper for a dictionary with locking
+    A thread-safe wrapper for a dictionary with locking.
+
+    Reads don't take a lock. Writers lock only the stripe their key
+    hashes to, so writers of different keys rarely wait on each other.
+    keys() and items() return snapshots which are safe to iterate
+    while the dictionary changes; a snapshot is kept until the next
+    write, so repeated iteration of a dictionary which isn't changing
+    costs nothing.
     """
-    __slots__ = ('_semaphore', '_dictionary')
+    __slots__ = ('_stripes', '_dictionary', '_versions', '_version', '_items')
+
+    # The number of locks writers are spread across (@since v3.16.0)
+    stripes = 16
 
     def __init__(self, initial_values=None):
         """
@@ -23,7 +46,37 @@ class LockingDictionary(object):
             self._dictionary = dict()
         else:
             self._dictionary = initial_values
-        self._semaphore = threading.Semaphore()
+        self._stripes = tuple(threading.Lock() for i in range(self.stripes))
+        # next() on a count is atomic, so writers on different
+        # stripes can bump the version without sharing a lock
+        self._versions = itertools.count(1)
+        self._version = 0
+        # The version and items of the last snapshot
+        self._items = (None, ())
+
+    def _lock_for(self, key):
+        """
+        Params:
+            mixed key
+
+        Returns:
+            Lock: the lock guarding writes to the key
+        """
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Holds every stripe, shutting out all writers. The stripes are
+        always taken in the same order so this can't deadlock.
+        """
+        for lock in self._stripes:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._stripes):
+                lock.release()
 
     def read(self, key):
         """
@@ -42,9 +95,9 @@ class LockingDictionary(object):
             mixed key: the key to add or update
             mixed value: the value to associate with the key
         """
-        self._semaphore.acquire()
-        self._dictionary[key] = value
-        self._semaphore.release()
+        with self._lock_for(key):
+            self._dictionary[key] = value
+            self._version = next(self._versions)
 
     def remove(self, key):
         """
@@ -53,21 +106,43 @@ class LockingDictionary(object):
         Params:
             mixed key: the key to delete
         """
-        self._semaphore.acquire()
-        del(self._dictionary[key])
-        self._semaphore.release()
+        with self._lock_for(key):
+            del(self._dictionary[key])
+            self._version = next(self._versions)
 
     def keys(self):
         """
-        Returns a list of the dictionary keys
+        Returns a snapshot of the dictionary keys
         """
-        return self._dictionary.keys()
+        return tuple(key for key, value in self.items())
 
     def items(self):
         """
-        Returns a list of the dictionary items
+        Returns a snapshot of the dictionary items, as (key, value)
+        tuples
+        """
+        version, items = self._items
+        if version == self._version:
+            return items
+
+        with self._exclusive():
+            version = self._version
+            items = tuple(self._dictionary.items())
+            self._items = (version, items)
+
+        return items
+
+    def snapshot(self):
+        """
+        Returns a copy of the dictionary, consistent as of a single
+        moment
+
+        @since v3.16.0
+
+        Returns:
+            dict
         """
-        return self._dictionary.items()
+        return dict(self.items())
 
     def exists(self, key):
         """
@@ -76,18 +151,408 @@ class LockingDictionary(object):
         return (key in self._dictionary)
 
 
+# Marks a key removed from a Cache since it was last written
+_REMOVED = object()
+
+
+def get_cache_backend(cache_name, settings=None, encryptor=None, path=None):
+    """
+    Creates the storage backend for a Cache, as configured by the
+    cache_backend setting in heartbeat.conf: json (the default),
+    which rewrites the whole cache each time it is written, log,
+    which appends the changes to a log, or sqlite, which keeps every
+    cache in a table of one SQLite database.
+
+    @since v3.16.0
+
+    Params:
+        string cache_name: the name of the cache
+        ConfigManager settings: defaults to the global configuration
+        Encryptor encryptor: defaults to one keyed by the secret key
+        string path: the directory to store the cache in, by default
+            the cache directory
+
+    Returns:
+        CacheBackend
+    """
+    if settings is None:
+        settings = get_config_manager()
+
+    if path is None:
+        path = get_cache_path(settings)
+
+    if encryptor is None:
+        encryptor = Encryptor(settings.heartbeat.secret_key)
+
+    filename = os.path.join(
+        path,
+        sha256(cache_name.encode("UTF-8")).hexdigest()
+        )
+
+    backend = settings.heartbeat.cache_backend
+    if backend is None or backend == 'json':
+        return JsonCacheBackend(filename, encryptor)
+    elif backend == 'log':
+        return AppendLogBackend(filename + '.log', encryptor)
+    elif backend == 'sqlite':
+        return SqliteCacheBackend(
+            os.path.join(path, SqliteCacheBackend.database_name),
+            cache_name
+            )
+
+    raise Exception("Unknown cache backend %s" % str(backend))
+
+
+class CacheBackend(object):
+
+    """
+    Stores the contents of a Cache
+
+    @since v3.16.0
+    """
+
+    def load(self):
+        """
+        Returns:
+            dict: the stored contents of the cache, empty if nothing
+                has been stored
+        """
+        return {}
+
+    def save(self, changes, snapshot):
+        """
+        Stores changes to the cache
+
+        Params:
+            dict changes: the keys changed since the cache was last
+                saved, mapped to their new values or _REMOVED
+            Callable snapshot: returns a copy of everything in the
+                cache, for backends which store it all
+        """
+        pass
+
+    def reset(self):
+        """
+        Discards what has been stored, when the cache is reset
+        """
+        pass
+
+
+class JsonCacheBackend(CacheBackend):
+
+    """
+    Stores a cache as a single encrypted JSON document, which is
+    rewritten in full every time it is saved
+
+    @since v3.16.0
+    """
+
+    def __init__(self, filename, encryptor):
+        """
+        Constructor
+
+        Params:
+            string filename: the file to store the cache in
+            Encryptor encryptor
+        """
+        self.filename = filename
+        self.encryptor = encryptor
+
+    def load(self):
+        """
+        Overrides CacheBackend.load
+        """
+        try:
+            with open(self.filename, "r") as cachefile:
+                fcontents = cachefile.read()
+                decrypted = self.encryptor.decrypt(fcontents)
+                return json.loads(decrypted)
+        except Exception:
+            return {}
+
+    def save(self, changes, snapshot):
+        """
+        Overrides CacheBackend.save
+        """
+        with open(self.filename, "wb") as cacheFile:
+            data = self.encryptor.encrypt(json.dumps(snapshot()))
+            cacheFile.write(data)
+
+
+class AppendLogBackend(CacheBackend):
+
+    """
+    Stores a cache as a log of encrypted records, one per save,
+    each holding only the keys which changed. Loading replays the
+    log. When the log has grown to compact_ratio times the size it
+    had when it was last compacted, it is rewritten in the
+    background as a single record of the cache's contents.
+
+    @since v3.16.0
+    """
+
+    # Logs smaller than this are never compacted
+    min_compact_size = 64 * 1024
+
+    def __init__(self, filename, encryptor, compact_ratio=4):
+        """
+        Constructor
+
+        Params:
+            string filename: the file to store the log in
+            Encryptor encryptor
+            float compact_ratio: how many times larger than the
+                compacted cache the log may grow
+        """
+        self.filename = filename
+        self.encryptor = encryptor
+        self.compact_ratio = compact_ratio
+        self.compacting = None
+        self._lock = threading.Lock()
+        self._size = 0
+        self._base_size = 0
+        self._rewrite = False
+
+    def load(self):
+        """
+        Overrides CacheBackend.load. A cache stored as JSON by
+        JsonCacheBackend is picked up if there is no log yet.
+        """
+        contents = {}
+        with self._lock:
+            try:
+                with open(self.filename, "rb") as log:
+                    records = log.read()
+            except IOError:
+                json_file = self.filename[:-len('.log')]
+                if self.filename.endswith('.log') and os.path.exists(json_file):
+                    self._rewrite = True
+                    return JsonCacheBackend(json_file, self.encryptor).load()
+                return contents
+
+            self._size = len(records)
+            for i, line in enumerate(records.splitlines()):
+                try:
+                    record = json.loads(self.encryptor.decrypt(line))
+                    contents.update(record['set'])
+                    for key in record['removed']:
+                        contents.pop(key, None)
+                except (ValueError, IndexError, KeyError, TypeError, AttributeError):
+                    # Most likely a record cut short by a crash
+                    continue
+
+                if i == 0:
+                    self._base_size = len(line) + 1
+
+        return contents
+
+    def save(self, changes, snapshot):
+        """
+        Overrides CacheBackend.save
+        """
+        if self._rewrite:
+            self._rewrite = False
+            # Let a background compaction finish, so it can't replace
+            # the log with an older snapshot afterwards
+            compacting = self.compacting
+            if compacting is not None:
+                compacting.join()
+            self._compact(snapshot)
+            return
+
+        record = {'set': {}, 'removed': []}
+        for key, value in changes.items():
+            if value is _REMOVED:
+                record['removed'].append(key)
+            else:
+                record['set'][key] = value
+
+        line = self.encryptor.encrypt(json.dumps(record)) + b"\n"
+
+        compacting = None
+        with self._lock:
+            with open(self.filename, "ab") as log:
+                log.write(line)
+            self._size += len(line)
+            grown = self._size > max(
+                self.min_compact_size,
+                self._base_size * self.compact_ratio
+                )
+
+            if grown and self.compacting is None:
+                compacting = threading.Thread(
+                    target=self._compact_in_background,
+                    args=(snapshot,),
+                    daemon=True
+                    )
+                self.compacting = compacting
+
+        if compacting is not None:
+            compacting.start()
+
+    def reset(self):
+        """
+        Overrides CacheBackend.reset. The log is replaced the next
+        time the cache is saved.
+        """
+        self._rewrite = True
+
+    def _compact(self, snapshot):
+        """
+        Rewrites the log as a single record of the cache's contents.
+        The snapshot is taken with the log locked, so no changes
+        can be appended in between; changes saved later repeat
+        some of what it holds, which replays harmlessly.
+        """
+        with self._lock:
+            line = self.encryptor.encrypt(
+                json.dumps({'set': snapshot(), 'removed': []})) + b"\n"
+            partial = self.filename + ".compacting"
+            with open(partial, "wb") as log:
+                log.write(line)
+            os.replace(partial, self.filename)
+            self._size = len(line)
+            self._base_size = len(line)
+
+    def _compact_in_background(self, snapshot):
+        """
+        Compacts the log in the thread started by save. Only this
+        thread clears compacting, so no other compaction can start
+        in the background until it is done.
+        """
+        try:
+            self._compact(snapshot)
+        finally:
+            self.compacting = None
+
+
+class SqliteCacheBackend(CacheBackend):
+
+    """
+    Stores a cache as a table in a SQLite database, with a row per
+    key. The database is in WAL mode, and each save changes just the
+    rows of the keys which changed, in a single transaction. Values
+    are stored as JSON and are not encrypted, so the caches can be
+    inspected with the sqlite3 shell.
+
+    @since v3.16.0
+    """
+
+    database_name = 'heartbeat-cache.sqlite3'
+
+    def __init__(self, database, cache_name):
+        """
+        Constructor
+
+        Params:
+            string database: the database file, shared by every cache
+            string cache_name: the name of the cache, and its table
+        """
+        if sqlite3 is None:
+            raise Exception("The sqlite cache backend requires Python's sqlite3 module")
+
+        self.database = database
+        self.table = '"%s"' % cache_name.replace('"', '""')
+        self._lock = threading.Lock()
+        # Saves come from flush timers, so the connection is shared
+        # between threads, one at a time
+        self._connection = sqlite3.connect(
+            database, timeout=10, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS %s "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)" % self.table
+                )
+
+    def load(self):
+        """
+        Overrides CacheBackend.load
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, value FROM %s" % self.table).fetchall()
+
+        return dict((key, json.loads(value)) for key, value in rows)
+
+    def save(self, changes, snapshot):
+        """
+        Overrides CacheBackend.save
+        """
+        written = []
+        removed = []
+        for key, value in changes.items():
+            if value is _REMOVED:
+                removed.append((key,))
+            else:
+                written.append((key, json.dumps(value)))
+
+        with self._lock:
+            with self._connection:
+                if written:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO %s (key, value) VALUES (?, ?)" % self.table,
+                        written
+                        )
+                if removed:
+                    self._connection.executemany(
+                        "DELETE FROM %s WHERE key = ?" % self.table,
+                        removed
+                        )
+
+    def reset(self):
+        """
+        Overrides CacheBackend.reset
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute("DELETE FROM %s" % self.table)
+
+    def close(self):
+        """
+        Closes the database connection
+        """
+        with self._lock:
+            self._connection.close()
+
+
 class Cache(LockingDictionary):
 
     """
     Handles a persistant cache for storing key-value
     pairs.
+
+    Entries can be given a time to live, after which they are treated
+    as gone, and the cache can be capped at a number of entries, past
+    which the least recently used are evicted. Expiry times are kept
+    in a heap, so finding the entries due to expire doesn't scan the
+    cache. Expired entries are evicted when they are looked up, when
+    a write finds any are due, or all at once by expire(). Expiry
+    times aren't stored, so entries loaded from disk get a full time
+    to live again.
     """
 
-    def __init__(self, cache_name, reset=False, settings=None, encryptor=None, path=None):
+    # The reasons given to on_evict (@since v3.16.0)
+    EXPIRED = 'expired'
+    EVICTED = 'evicted'
+
+    _logger = logging.getLogger(__name__ + ".Cache")
+
+    def __init__(self, cache_name, reset=False, settings=None, encryptor=None, path=None,
+                 backend=None, ttl=None, max_entries=None, on_evict=None):
         """
         Parameters:
             str name: The name of the cache
             bool reset: If the cache should be reset if its artifacts already exist
+            CacheBackend backend: how the cache is stored (@since v3.16.0),
+                by default as configured
+            float ttl: the default number of seconds entries are kept
+                (@since v3.16.0), or None to keep them until removed
+            int max_entries: the most entries to keep (@since v3.16.0),
+                evicting the least recently used, or None for no limit
+            Callable on_evict: called with the key, value and reason
+                (EXPIRED or EVICTED) of each entry evicted (@since v3.16.0)
         """
         if settings is None:
             settings = get_config_manager()
@@ -102,45 +567,312 @@ class Cache(LockingDictionary):
         else:
             self.encryptor = encryptor
 
+        if backend is None:
+            backend = get_cache_backend(cache_name, settings, self.encryptor, path)
+
+        self.backend = backend
+
+        if max_entries is not None and max_entries < 1:
+            raise Exception("A cache must be allowed at least one entry")
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        # Keys mapped to when they expire, by the monotonic clock
+        self._expiry = {}
+        # A heap of (expiry, sequence, key). Rewriting a key leaves its
+        # old entry behind, which is skipped when it comes up.
+        self._expiry_index = []
+        self._sequence = itertools.count()
+        # Keys from least to most recently used, if there's a limit
+        self._recency = OrderedDict()
+        # Guards the three above; taken after a key's stripe
+        self._index_lock = threading.Lock()
+
         super(Cache, self).__init__()
         self.cache_name = cache_name
+        self.dirty = False
+        self._changes = {}
         if not reset:
             self._load_from_disk()
+        else:
+            self.backend.reset()
+
+    def read(self, key):
+        """
+        Overrides LockingDictionary.read to leave out expired entries
+        and keep track of use
+        """
+        value = self._dictionary[key]
+        if self._expiry and self._expired(key, monotonic()):
+            self._evict(key, self.EXPIRED)
+            raise KeyError(key)
+
+        if self.max_entries is not None:
+            with self._index_lock:
+                if key in self._recency:
+                    self._recency.move_to_end(key)
+
+        return value
+
+    def exists(self, key):
+        """
+        Overrides LockingDictionary.exists to leave out expired entries
+        """
+        if key not in self._dictionary:
+            return False
+
+        if self._expiry and self._expired(key, monotonic()):
+            self._evict(key, self.EXPIRED)
+            return False
+
+        return True
+
+    def items(self):
+        """
+        Overrides LockingDictionary.items to evict expired entries
+        first
+        """
+        if self._expiry_index:
+            self.expire()
+
+        return super(Cache, self).items()
+
+    def write(self, key, value, ttl=None):
+        """
+        Overrides LockingDictionary.write to track unsaved changes
+
+        Params:
+            float ttl: the seconds to keep this entry (@since v3.16.0),
+                if not the cache's default
+        """
+        now = monotonic()
+        if ttl is None:
+            ttl = self.ttl
+
+        with self._lock_for(key):
+            self._dictionary[key] = value
+            self._changes[key] = value
+            self._version = next(self._versions)
+            self.dirty = True
+            if ttl is not None or self._expiry or self.max_entries is not None:
+                with self._index_lock:
+                    self._index(key, ttl, now)
+
+        if self._expiry_index and self._expiry_index[0][0] <= now:
+            self.expire()
+
+        if self.max_entries is not None and len(self._dictionary) > self.max_entries:
+            self._evict_least_recent()
+
+    def remove(self, key):
+        """
+        Overrides LockingDictionary.remove to track unsaved changes
+        """
+        with self._lock_for(key):
+            del(self._dictionary[key])
+            self._changes[key] = _REMOVED
+            self._version = next(self._versions)
+            self.dirty = True
+            with self._index_lock:
+                self._unindex(key)
+
+    def expire(self):
+        """
+        Evicts every entry whose time to live has run out
+
+        @since v3.16.0
+
+        Returns:
+            list: the (key, value) of each entry evicted
+        """
+        now = monotonic()
+        evicted = []
+        while True:
+            with self._index_lock:
+                if not self._expiry_index or self._expiry_index[0][0] > now:
+                    break
+                expiry, sequence, key = heappop(self._expiry_index)
+                if self._expiry.get(key) != expiry:
+                    continue
+
+            item = self._evict(key, self.EXPIRED)
+            if item is not None:
+                evicted.append(item)
+
+        return evicted
+
+    def _expired(self, key, now):
+        expiry = self._expiry.get(key)
+        return expiry is not None and expiry <= now
+
+    def _index(self, key, ttl, now):
+        """
+        Records when a key expires and that it was just used. The
+        caller holds the index lock.
+        """
+        if ttl is None:
+            self._expiry.pop(key, None)
+        else:
+            expiry = now + ttl
+            self._expiry[key] = expiry
+            heappush(self._expiry_index, (expiry, next(self._sequence), key))
+            # Rebuild the heap once it is mostly entries left behind
+            # by rewrites, which keeps it in proportion to the cache
+            if len(self._expiry_index) > 2 * len(self._expiry) + 64:
+                self._expiry_index = [
+                    (expiry, next(self._sequence), key)
+                    for key, expiry in self._expiry.items()
+                    ]
+                heapify(self._expiry_index)
+
+        if self.max_entries is not None:
+            self._recency[key] = None
+            self._recency.move_to_end(key)
+
+    def _unindex(self, key):
+        self._expiry.pop(key, None)
+        self._recency.pop(key, None)
+
+    def _evict(self, key, reason):
+        """
+        Evicts an entry, if it is still due to be: it may have been
+        written or used since it was picked
+
+        Params:
+            mixed key
+            string reason: EXPIRED or EVICTED
+
+        Returns:
+            tuple: the key and value evicted, or None
+        """
+        with self._lock_for(key):
+            with self._index_lock:
+                if key not in self._dictionary:
+                    return None
+
+                if reason == self.EXPIRED:
+                    if not self._expired(key, monotonic()):
+                        return None
+                elif (len(self._dictionary) <= self.max_entries
+                      or next(iter(self._recency), None) != key):
+                    return None
+
+                value = self._dictionary.pop(key)
+                self._unindex(key)
+
+            self._changes[key] = _REMOVED
+            self._version = next(self._versions)
+            self.dirty = True
+
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value, reason)
+            except Exception as err:
+                # The entry is gone either way; carry on evicting
+                Cache._logger.error(
+                    "on_evict failed for %s in cache %s: %s",
+                    str(key),
+                    self.cache_name,
+                    str(err)
+                    )
+
+        return (key, value)
+
+    def _evict_least_recent(self):
+        """
+        Evicts the least recently used entries until the cache is
+        back within max_entries
+        """
+        while len(self._dictionary) > self.max_entries:
+            with self._index_lock:
+                key = next(iter(self._recency), None)
+
+            if key is None:
+                return
+
+            if self._evict(key, self.EVICTED) is None:
+                # Drop the key if it was removed in the meantime, so
+                # it can't hold up the loop
+                with self._index_lock:
+                    if key not in self._dictionary:
+                        self._recency.pop(key, None)
 
     def resetValuesTo(self, value):
         """
         Resets all the cache values to a specified value
         """
-        self._semaphore.acquire()
-        for k in self._dictionary.keys():
-            self._dictionary[k] = value
-        self._semaphore.release()
+        with self._exclusive():
+            for k in self._dictionary.keys():
+                self._dictionary[k] = value
+                self._changes[k] = value
+            self._version = next(self._versions)
+            self.dirty = True
+
+    def flush(self):
+        """
+        Writes the cache out to disk if it has changed since
+        it was last written
+
+        @since v3.16.0
+
+        Returns:
+            bool: whether the cache was written
+        """
+        if not self.dirty:
+            return False
+
+        self.writeToDisk()
+        return True
 
     def writeToDisk(self):
         """
         Writes the cache out to disk
         """
+        with self._exclusive():
+            changes = self._changes
+            self._changes = {}
+            self.dirty = False
+
         try:
-            with open(self._get_filename(), "wb") as cacheFile:
-                data = self.encryptor.encrypt(json.dumps(self._dictionary))
-                cacheFile.write(data)
+            self.backend.save(changes, self._snapshot)
         except Exception:
-            pass
+            # Keep the changes for the next attempt, unless the
+            # keys have been changed again since
+            with self._exclusive():
+                changes.update(self._changes)
+                self._changes = changes
+                self.dirty = True
+
+    def _snapshot(self):
+        """
+        Returns:
+            dict: a copy of the cache's contents
+        """
+        return self.snapshot()
 
     def _load_from_disk(self):
         """
         Loads the cache from disk
         """
-        self._semaphore.acquire()
-        try:
-            with open(self._get_filename(), "r") as cachefile:
-                fcontents = cachefile.read()
-                decrypted = self.encryptor.decrypt(fcontents)
-                self._dictionary = json.loads(decrypted)
-        except Exception:
-            self._dictionary = {}
+        with self._exclusive():
+            try:
+                self._dictionary = self.backend.load()
+            except Exception:
+                self._dictionary = {}
+            self._version = next(self._versions)
 
-        self._semaphore.release()
+            with self._index_lock:
+                self._expiry.clear()
+                self._expiry_index = []
+                self._recency.clear()
+                if self.ttl is not None or self.max_entries is not None:
+                    now = monotonic()
+                    for key in self._dictionary:
+                        self._index(key, self.ttl, now)
+
+        if self.max_entries is not None and len(self._dictionary) > self.max_entries:
+            self._evict_least_recent()
 
     def _get_filename(self):
         """
@@ -152,56 +884,285 @@ class Cache(LockingDictionary):
             )
 
 
+class TimerScheduler(object):
+
+    """
+    Runs BackgroundTimers from a single thread. Due times are kept in
+    a heap, and each callback is handed to a threadpool when it is
+    due, so a slow callback doesn't hold up other timers and no
+    thread is started per tick.
+
+    @since v3.16.0
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        Constructor
+
+        Params:
+            int max_workers: the most callbacks to run at once, by
+                default five per CPU
+        """
+        if max_workers is None:
+            max_workers = (os.cpu_count() or 1) * 5
+
+        self.max_workers = max_workers
+        # A heap of (due, sequence, timer, generation). Stopping a
+        # timer leaves its entry behind, which is skipped when due.
+        self._heap = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._shutdown = False
+
+    def schedule(self, timer, due, generation):
+        """
+        Fires a timer at a time by the monotonic clock
+
+        Params:
+            BackgroundTimer timer
+            float due
+            int generation: the timer's generation when scheduled;
+                it isn't fired if it has been stopped since
+        """
+        with self._condition:
+            if self._shutdown:
+                raise Exception("The timer scheduler has been shut down")
+
+            heappush(self._heap, (due, next(self._sequence), timer, generation))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="heartbeat-timers", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancelled(self):
+        """
+        Notes that a scheduled timer was stopped, clearing out the
+        entries left behind once they make up most of the heap
+        """
+        with self._condition:
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+                self._heap = [
+                    entry for entry in self._heap
+                    if entry[2]._generation == entry[3]
+                    ]
+                heapify(self._heap)
+                self._cancelled = 0
+
+    def submit(self, function):
+        """
+        Runs a function in the threadpool
+
+        Params:
+            Callable function
+        """
+        if self._executor is None:
+            with self._condition:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers)
+
+        self._executor.submit(function)
+
+    def shutdown(self):
+        """
+        Stops the scheduler thread. Callbacks which are running are
+        left to finish.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._heap = []
+            self._condition.notify()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _run(self):
+        """
+        Waits for each timer to fall due and fires it
+        """
+        while True:
+            with self._condition:
+                while not self._shutdown:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+
+                    delay = self._heap[0][0] - monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+
+                if self._shutdown:
+                    return
+
+                due, sequence, timer, generation = heappop(self._heap)
+                if timer._generation != generation:
+                    self._cancelled = max(0, self._cancelled - 1)
+                    continue
+
+            timer._fire(generation)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_timer_scheduler():
+    """
+    Returns:
+        TimerScheduler: the scheduler shared by BackgroundTimers,
+            created the first time it is needed
+
+    @since v3.16.0
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TimerScheduler()
+
+    return _scheduler
+
+
 class BackgroundTimer(object):
 
     """
     A repeating timer that runs in the background
     and calls a provided callback each time the
     timer runs out.
+
+    Timers are run by a shared TimerScheduler. Repeating timers keep
+    a fixed rate: each tick is due an interval after the last was
+    due, not after it ran, and ticks missed entirely are skipped. A
+    repeating tick which comes round while the callback is still
+    running from the last one is skipped too, so calls never overlap.
     """
 
-    def __init__(self, interval=60, repeat=True, call=None):
+    def __init__(self, interval=60, repeat=True, call=None, jitter=0, scheduler=None):
         """
         Parameters:
             int interval: Timer interval, in seconds
             bool repeat: Whether the timer should repeat
             Callable call: A callback to call when the timer hits zero
+            float jitter: up to how many seconds to delay each tick by,
+                at random, so timers don't fire in lockstep (@since v3.16.0)
+            TimerScheduler scheduler: defaults to the shared scheduler
+                (@since v3.16.0)
         """
-        self._timer = None
         self.callback = call
         self.interval = interval
         self.repeat = repeat
+        self.jitter = jitter
         self.is_running = False
+        # The number of ticks skipped because the callback was
+        # still running
+        self.skipped = 0
         if call is None:
             self.callback = do_nothing
 
+        self._scheduler = scheduler
+        # Bumped whenever the timer is started or stopped, so ticks
+        # scheduled before then are ignored
+        self._generation = 0
+        self._due = None
+        self._calling = False
+        self._lock = threading.Lock()
+
     def start(self):
         """
         Starts the timer. This method is safe to call multiple
         times as it will check if the timer is already running.
         If it is, it does nothing, otherwise it starts the timer.
         """
-        if not self.is_running:
-            self._timer = threading.Timer(self.interval, self._run)
-            self._timer.start()
+        with self._lock:
+            if self.is_running:
+                return
+
+            if self._scheduler is None:
+                self._scheduler = get_timer_scheduler()
+
             self.is_running = True
+            self._generation += 1
+            self._due = monotonic() + self.interval
+            self._schedule()
 
-    def _run(self):
+    def _schedule(self):
         """
-        Private run method. This is called each time the timer
-        hits 0.
+        Schedules the next tick. The caller holds the timer's lock.
         """
-        self.is_running = False
-        if self.repeat:
-            self.start()
-        self.callback()
+        due = self._due
+        if self.jitter:
+            due += random() * self.jitter
+
+        self._scheduler.schedule(self, due, self._generation)
+
+    def _fire(self, generation):
+        """
+        Private run method. This is called by the scheduler each
+        time the timer hits 0.
+
+        Params:
+            int generation: the generation the tick was scheduled in
+        """
+        with self._lock:
+            if generation != self._generation or not self.is_running:
+                return
+
+            if self.repeat:
+                self._due += self.interval
+                now = monotonic()
+                if self._due <= now:
+                    if self.interval > 0:
+                        missed = (now - self._due) // self.interval + 1
+                        self._due += missed * self.interval
+                    else:
+                        self._due = now
+                self._schedule()
+            else:
+                # A one-shot timer is often started again from its own
+                # callback, so its tick always runs
+                self.is_running = False
+                self._scheduler.submit(self._call_once)
+                return
+
+            if self._calling:
+                self.skipped += 1
+                return
+            self._calling = True
+
+        self._scheduler.submit(self._call)
+
+    def _call(self):
+        try:
+            self._call_once()
+        finally:
+            self._calling = False
+
+    def _call_once(self):
+        try:
+            self.callback()
+        except Exception:
+            traceback.print_exc()
 
     def stop(self):
         """
         Stops and resets the timer.
         """
-        self._timer.cancel()
-        self.is_running = False
+        with self._lock:
+            if not self.is_running:
+                return
+
+            self.is_running = False
+            self._generation += 1
+
+        self._scheduler.cancelled()
 
 def do_nothing():
     """
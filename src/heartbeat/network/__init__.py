@@ -92,7 +92,7 @@ class SocketListener(threading.Thread):
     Extends threading.Thread
     """
 
-    def __init__(self, port, callback, daemon=True, timeout=None, sock=socket.socket):
+    def __init__(self, port, callback, daemon=True, timeout=None, sock=socket.socket, bufsize=65535):
         """
         Constructor
 
@@ -100,11 +100,13 @@ class SocketListener(threading.Thread):
             int      port:     The port to listen to
             Function callback: The function to call when data is received
             bool     daemon:   Whether to run as a daemon thread
+            int      bufsize:  The largest datagram to receive
         """
         super(SocketListener, self).__init__()
         self.daemon = daemon
         self.port = port
         self.callback = callback
+        self.bufsize = bufsize
 
         listen = sock(socket.AF_INET, socket.SOCK_DGRAM)
         if (timeout is not None):
@@ -119,7 +121,7 @@ class SocketListener(threading.Thread):
         Listens for data then calls back when data is received
         """
         try:
-            data, addr = self.listen_socket.recvfrom(1024)
+            data, addr = self.listen_socket.recvfrom(self.bufsize)
             self.callback(data, addr)
         except socket.timeout:
             pass
@@ -0,0 +1,120 @@
+"""
+Event loop counterparts to the socket helpers in heartbeat.network,
+used by plugins when heartbeat runs with the asyncio runtime. These
+are kept apart from heartbeat.network so that the threaded runtime
+does not depend on coroutine support.
+
+@since v3.16.0
+"""
+import asyncio
+import logging
+
+
+POLL_INTERVAL = 1
+
+logger = logging.getLogger(__name__)
+
+
+class DatagramHandler(asyncio.DatagramProtocol):
+
+    """
+    Calls back with each datagram received on an endpoint. The
+    callback runs in the loop's default executor, so that callbacks
+    which block (on name lookups, for instance) do not hold up the
+    event loop. Errors from the callback are logged.
+    """
+
+    def __init__(self, loop, callback):
+        """
+        Constructor
+
+        Params:
+            AbstractEventLoop loop: the loop the endpoint runs on
+            Function callback: the function to call with the data and
+                address of each datagram
+        """
+        self.loop = loop
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        f = self.loop.run_in_executor(None, self.callback, data, addr)
+        f.add_done_callback(lambda f: self._check_call_status(f, addr))
+
+    def _check_call_status(self, f, addr):
+        """
+        Logs the error from a callback which raised. This method is
+        intended to be called back when the callback's Future is done.
+
+        Params:
+            Future f
+            mixed addr: where the datagram came from
+        """
+        if f.cancelled():
+            return
+
+        error = f.exception()
+        if error is not None:
+            logger.exception(
+                "Unable to handle a datagram from %s",
+                str(addr),
+                exc_info=(type(error), error, error.__traceback__)
+                )
+
+
+async def listen_datagrams(sock, callback, shutdown):
+    """
+    Listens for datagrams on a bound socket until shutdown
+
+    Params:
+        socket sock: a bound datagram socket, such as the listen_socket
+            of a SocketListener that has not been started
+        Function callback: the function to call with the data and
+            address of each datagram
+        Function shutdown: returns whether to stop listening
+    """
+    loop = asyncio.get_event_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: DatagramHandler(loop, callback),
+        sock=sock
+        )
+
+    try:
+        while not shutdown():
+            await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        transport.close()
+
+
+async def serve_unix(path, callback, shutdown, bufsize=1024):
+    """
+    Accepts connections on a unix socket until shutdown, calling
+    back with the first chunk of data read from each connection.
+    As with DatagramHandler, the callback runs in the loop's
+    default executor.
+
+    Params:
+        string path: the address of the socket
+        Function callback: the function to call with the data
+            received and the address it came from
+        Function shutdown: returns whether to stop serving
+        int bufsize: the most data to read from a connection
+    """
+    loop = asyncio.get_event_loop()
+
+    async def handle(reader, writer):
+        try:
+            data = await reader.read(bufsize)
+            await loop.run_in_executor(None, callback, data, path)
+        except Exception:
+            logger.exception("Unable to handle a connection on %s", path)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(handle, path=path)
+
+    try:
+        while not shutdown():
+            await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        server.close()
+        await server.wait_closed()
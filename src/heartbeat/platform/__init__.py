@@ -1,17 +1,35 @@
+import binascii
 import datetime
 import json
 import inspect
 import os
+import struct
 import sys
 from enum import Enum
 import logging
 from time import time
 import hashlib
+import itertools
+import marshal
+import math
+try:
+    from hashlib import blake2b
+except ImportError:
+    blake2b = None
 import uuid
-import yaml
 from pathlib import Path
+# Decoding received events is faster with either of these, if
+# installed (@since v3.16.0)
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    try:
+        from ujson import loads as _json_loads
+    except ImportError:
+        _json_loads = json.loads
 
 __config_manager = None
+__config_path = None
 
 
 class Topics(Enum):
@@ -29,49 +47,140 @@ class Topics(Enum):
     ACK = "acknowledge"
 
 
+class EventDecodeError(Exception):
+
+    """
+    Raised when received data isn't a valid event. The reason is one
+    of the constants below, and field names the offending field, if
+    there is one.
+
+    @since v3.16.0
+    """
+
+    MALFORMED = 'malformed'
+    TOO_LARGE = 'too large'
+    MISSING_FIELD = 'missing field'
+    INVALID_FIELD = 'invalid field'
+    UNSUPPORTED = 'unsupported'
+
+    def __init__(self, message, reason, field=None):
+        super(EventDecodeError, self).__init__(message)
+        self.reason = reason
+        self.field = field
+
+
 class Event(object):
 
     """
     An event to notify of. Contains a title, message, and timestamp
     """
-    __slots__ = ('title', 'message', 'timestamp', 'host',
-                 'one_time', 'source', 'payload', 'type', 'when', 'id')
+    __slots__ = ('title', 'message', 'host',
+                 'one_time', 'source', 'payload', 'type', 'when', 'id',
+                 '_identity', '_digest', '_timestamp', '_timestamp_of',
+                 '_template')
+
+    # Limits on events decoded from received data (@since v3.16.0),
+    # so that malformed or hostile packets are turned away cheaply
+    max_wire_size = 65536
+    max_field_length = 8192
+    max_events = 1024
 
-    def __init__(self, title, message, host="localhost", type=None):
+    def __init__(self, title, message, host="localhost", type=None, source=None):
         """
         Constructor
 
         Params:
             string title:   the title of the event
             string message: the message describing the event
+            string source:  what produced the event (@since v3.16.0).
+                Defaults to the class name of the method creating it
         """
         self.title = title
         self.message = message
         self.when = time()
-        self.timestamp = datetime.datetime.fromtimestamp(self.when)
+        self._timestamp_of = None
         self.host = host
         self.payload = {}
         self.one_time = False
-        self.id = str(uuid.uuid4())
+        self.id = _next_event_id()
         if (type is None):
             self.type = Topics.INFO
         else:
             if (not isinstance(type, Topics)):
                 raise Exception("Topic received was not recognized")
             self.type = type
-        stack = inspect.stack()
+        if source is None:
+            source = _caller_class_name()
 
-        try:
-            self.source = str(stack[1][0].f_locals["self"].__class__.__name__)
-        except KeyError:
-            self.source = None
+        self.source = source
+        self._identity = None
+        self._digest = None
+        self._template = None
+
+    @property
+    def timestamp(self):
+        """
+        The time of the event as a datetime. As of v3.16.0 this is
+        worked out from `when` the first time it is needed, rather
+        than for every event.
+
+        Returns:
+            datetime
+        """
+        if self._timestamp_of != self.when:
+            self._timestamp = datetime.datetime.fromtimestamp(self.when)
+            self._timestamp_of = self.when
+
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self.when = value.timestamp()
+        self._timestamp = value
+        self._timestamp_of = self.when
 
     def __hash__(self):
-        as_bytes = (self.title + self.message + self.source + self.host + self.type.name).encode("UTF-8")
+        """
+        Returns a digest of what identifies the event: its title,
+        message, source, host and topic. The digest is kept until
+        one of those changes.
 
-        return hashlib.sha512(as_bytes).hexdigest()
+        As of v3.16.0 this is a 32 character digest, rather than a
+        128 character sha512 digest.
+
+        Returns:
+            string: the hex digest
+        """
+        identity = (self.title, self.message, self.source, self.host, self.type)
+        if identity != self._identity:
+            template = self._template
+            if template is not None and identity == template.identity:
+                self._digest = template.digest()
+            else:
+                self._digest = _identity_digest(
+                    "\x1f".join(identity[:4] + (self.type.name,)).encode("UTF-8")
+                    )
+            self._identity = identity
+
+        return self._digest
 
     def to_json(self):
+        template = self._matching_template()
+        if template is not None:
+            prefix, middle = template.json_parts()
+            return prefix + json.dumps(self.payload) + middle + json.dumps(self.id) + '}'
+
+        return json.dumps(self.to_dict())
+
+    def to_dict(self):
+        """
+        Returns the event as a dictionary, as encoded in JSON
+
+        @since v3.16.0
+
+        Returns:
+            dict
+        """
         dictionary = dict()
         dictionary['title'] = self.title
         dictionary['message'] = self.message
@@ -82,70 +191,682 @@ class Event(object):
         dictionary['type'] = self.type.name
         dictionary['id'] = self.id
 
-        return json.dumps(dictionary)
+        return dictionary
 
     def from_json(jsonString):
-        try:
-            dictionary = json.loads(jsonString)
-        except Exception:
-            raise Exception('Malformed event JSON')
+        return Event.from_dict(Event._load_json(jsonString))
+
+    def list_from_json(jsonString):
+        """
+        Loads one or more events from JSON, which may be either a
+        single event object or an array of event objects
+
+        @since v3.16.0
+
+        Returns:
+            Event[]
+        """
+        decoded = Event._load_json(jsonString)
+
+        if isinstance(decoded, list):
+            if len(decoded) > Event.max_events:
+                raise EventDecodeError(
+                    'Too many events', EventDecodeError.TOO_LARGE)
+            return [Event.from_dict(d) for d in decoded]
+
+        return [Event.from_dict(decoded)]
 
-        if not 'title' in dictionary or \
-            not 'message' in dictionary or \
-            not 'type' in dictionary:
-                raise Exception('Event missing required fields')
+    def _load_json(jsonString):
+        if len(jsonString) > Event.max_wire_size:
+            raise EventDecodeError(
+                'Event data too large', EventDecodeError.TOO_LARGE)
 
         try:
-            Topics[dictionary['type']]
-        except KeyError:
-            raise Exception('Unsupported event type')
-
-        e = Event(
-            title=dictionary['title'],
-            message=dictionary['message'],
-            host=dictionary['host'] if 'host' in dictionary else 'localhost',
-            type=Topics[dictionary['type']]
-            )
-        e.one_time = dictionary['one_time'] if 'one_time' in dictionary else False
-        e.source = dictionary['source'] if 'source' in dictionary else 'Unknown'
+            return _json_loads(jsonString)
+        except (ValueError, TypeError, RuntimeError):
+            raise EventDecodeError(
+                'Malformed event JSON', EventDecodeError.MALFORMED)
+
+    def from_dict(dictionary):
+        """
+        Loads an event from a decoded JSON dictionary. Each field is
+        read and checked once; as of v3.16.0 fields of the wrong type
+        or too long are rejected, rather than passed along.
+
+        @since v3.16.0
+
+        Raises:
+            EventDecodeError: if the dictionary isn't a valid event
+        """
+        if not isinstance(dictionary, dict):
+            raise EventDecodeError(
+                'Malformed event JSON', EventDecodeError.MALFORMED)
+
+        get = dictionary.get
+        title = get('title')
+        message = get('message')
+        topic = get('type')
+        if title is None or message is None or topic is None:
+            raise EventDecodeError(
+                'Event missing required fields',
+                EventDecodeError.MISSING_FIELD,
+                'title' if title is None else
+                'message' if message is None else 'type'
+                )
+
+        topic = Topics.__members__.get(topic) if isinstance(topic, str) else None
+        if topic is None:
+            raise EventDecodeError(
+                'Unsupported event type', EventDecodeError.UNSUPPORTED, 'type')
+
+        # to_json gives a null source for events created outside a
+        # method; it and a null host are read as empty, so that the
+        # event can still be hashed and logged. Only a missing source
+        # is Unknown.
+        host = get('host', 'localhost')
+        if host is None:
+            host = ''
+        source = get('source', 'Unknown')
+        if source is None:
+            source = ''
+        event_id = get('id')
+        if event_id is None:
+            # legacy support
+            event_id = _next_event_id()
+
+        limit = Event.max_field_length
+        for field, value in (('title', title), ('message', message),
+                             ('host', host), ('source', source),
+                             ('id', event_id)):
+            if type(value) is not str:
+                raise EventDecodeError(
+                    'Event %s is not a string' % field,
+                    EventDecodeError.INVALID_FIELD,
+                    field
+                    )
+            if len(value) > limit:
+                raise EventDecodeError(
+                    'Event %s is too long' % field,
+                    EventDecodeError.TOO_LARGE,
+                    field
+                    )
+
+        one_time = get('one_time', False)
+        if type(one_time) is not bool:
+            raise EventDecodeError(
+                'Event one_time is not a boolean',
+                EventDecodeError.INVALID_FIELD,
+                'one_time'
+                )
+
+        payload = get('payload')
+        if payload is None:
+            payload = {}
+        elif type(payload) is not dict:
+            raise EventDecodeError(
+                'Event payload is not an object',
+                EventDecodeError.INVALID_FIELD,
+                'payload'
+                )
+
+        return Event._assemble(
+            title, message, host, topic, source, time(), one_time,
+            event_id, payload)
+
+    def _assemble(title, message, host, type, source, when, one_time,
+                  event_id, payload):
+        """
+        Creates an event from decoded fields. Everything the
+        constructor would work out is already known, so it is
+        skipped.
+        """
+        e = Event.__new__(Event)
+        e.title = title
+        e.message = message
+        e.host = host
+        e.type = type
+        e.source = source
+        e.when = when
+        e._timestamp_of = None
+        e.one_time = one_time
+        e.id = event_id
+        e.payload = payload
+        e._identity = None
+        e._digest = None
+        e._template = None
+
+        return e
+
+    # Binary encoding (@since v3.16.0). Each event is a fixed header
+    # of magic, version, topic, flags and time, followed by the title,
+    # message, host and source as length-prefixed UTF-8, the id (raw
+    # when it is a uuid) and the payload as length-prefixed JSON.
+    # Topics are encoded by their position in wire_topics, so new
+    # topics must only ever be added to the end. As with JSON, a
+    # received event is stamped with the time it arrived; the
+    # sender's time is only checked, so that corrupt headers are
+    # turned away.
+    wire_magic = b'\x00HB'
+    wire_version = 1
+    wire_topics = list(Topics)
+    _wire_header = struct.Struct('!3sBBBd')
+    _wire_length = struct.Struct('!H')
+    _wire_payload_length = struct.Struct('!I')
+
+    _FLAG_ONE_TIME = 1
+    _FLAG_SOURCE = 2
+    _FLAG_UUID = 4
+
+    # Latest sender time accepted, the end of the year 9999, which
+    # is as far as datetime goes
+    _wire_max_when = 253402300799.0
+
+    def to_bytes(self):
+        """
+        Encodes the event in the compact binary wire format
 
-        if ('payload' in dictionary):
-            e.payload = dictionary['payload']
+        @since v3.16.0
+
+        Returns:
+            bytes
+        """
+        flags = self._FLAG_ONE_TIME if self.one_time else 0
+        if self.source is not None:
+            flags |= self._FLAG_SOURCE
+
+        raw_id = _uuid_bytes(self.id)
+        if raw_id is not None:
+            flags |= self._FLAG_UUID
+
+        parts = [self._wire_header.pack(
+            self.wire_magic,
+            self.wire_version,
+            Event.wire_topics.index(self.type),
+            flags,
+            self.when
+            )]
+
+        template = self._matching_template()
+        if template is not None:
+            parts.append(template.wire_strings())
         else:
-            e.payload = {}
+            parts.append(Event._encode_strings(
+                self.title, self.message, self.host))
+            parts.append(Event._encode_source(self.source))
 
-        # legacy support
-        if ('id' in dictionary):
-            e.id = dictionary['id']
+        if raw_id is None:
+            parts.append(Event._encode_strings(self.id))
         else:
-            e.id = str(uuid.uuid4())
+            parts.append(raw_id)
 
-        return e
+        payload = json.dumps(self.payload).encode("UTF-8") if self.payload else b''
+        parts.append(self._wire_payload_length.pack(len(payload)))
+        parts.append(payload)
+
+        return b''.join(parts)
+
+    def _encode_strings(*strings):
+        """
+        Encodes strings for the binary wire format. None is encoded
+        as an empty string, so the fields after it keep their place.
+        Strings longer than receivers accept are cut short, rather
+        than sent only to be turned away.
+
+        Returns:
+            bytes
+        """
+        parts = []
+        limit = Event.max_field_length
+        for s in strings:
+            encoded = str(s).encode("UTF-8") if s is not None else b''
+            if len(encoded) > limit:
+                logging.getLogger(__name__).warning(
+                    "Event field of %d bytes cut short to %d bytes",
+                    len(encoded),
+                    limit
+                    )
+                encoded = encoded[:limit].decode("UTF-8", "ignore").encode("UTF-8")
+            parts.append(Event._wire_length.pack(len(encoded)))
+            parts.append(encoded)
+
+        return b''.join(parts)
+
+    def _encode_source(source):
+        """
+        Encodes the source for the binary wire format. A source of
+        None is left out, and marked by the lack of _FLAG_SOURCE.
+
+        Returns:
+            bytes
+        """
+        return Event._encode_strings(source) if source is not None else b''
+
+    def _matching_template(self):
+        """
+        Returns the template the event was created from, if the
+        event still has the template's shape, so that its cached
+        encodings can be used
+
+        Returns:
+            EventTemplate: or None
+        """
+        template = self._template
+        if template is None or self.one_time != template.one_time:
+            return None
+
+        identity = (self.title, self.message, self.source, self.host, self.type)
+        if identity != template.identity:
+            return None
+
+        return template
+
+    def list_to_bytes(events):
+        """
+        Encodes several events in the binary wire format, one after
+        another, for sending together
+
+        @since v3.16.0
+
+        Returns:
+            bytes
+        """
+        return b''.join(e.to_bytes() for e in events)
+
+    def from_bytes(data):
+        """
+        Decodes a single event from the binary wire format
+
+        @since v3.16.0
+
+        Returns:
+            Event
+        """
+        events = Event.list_from_bytes(data)
+        if len(events) != 1:
+            raise EventDecodeError(
+                'Malformed event data', EventDecodeError.MALFORMED)
+
+        return events[0]
+
+    def list_from_bytes(data):
+        """
+        Decodes one or more events from the binary wire format
+
+        @since v3.16.0
+
+        Returns:
+            Event[]
+        """
+        if len(data) > Event.max_wire_size:
+            raise EventDecodeError(
+                'Event data too large', EventDecodeError.TOO_LARGE)
+
+        events = []
+        data = bytes(data)
+        offset = 0
+
+        try:
+            while offset < len(data):
+                if len(events) == Event.max_events:
+                    raise EventDecodeError(
+                        'Too many events', EventDecodeError.TOO_LARGE)
+                event, offset = Event._decode_bytes(data, offset)
+                events.append(event)
+        except (struct.error, IndexError, ValueError, TypeError, RuntimeError):
+            raise EventDecodeError(
+                'Malformed event data', EventDecodeError.MALFORMED)
+
+        return events
+
+    def _decode_bytes(data, offset):
+        """
+        Decodes the event starting at an offset
+
+        Returns:
+            tuple(Event, int): the event, and the offset following it
+        """
+        magic, version, topic, flags, when = Event._wire_header.unpack_from(data, offset)
+        if magic != Event.wire_magic or version != Event.wire_version:
+            raise EventDecodeError(
+                'Unsupported event data', EventDecodeError.UNSUPPORTED)
+
+        if not (math.isfinite(when) and 0 <= when <= Event._wire_max_when):
+            raise EventDecodeError(
+                'Event time is out of range',
+                EventDecodeError.INVALID_FIELD,
+                'when'
+                )
+
+        offset += Event._wire_header.size
+
+        count = 4 if flags & Event._FLAG_SOURCE else 3
+        if not flags & Event._FLAG_UUID:
+            count += 1
+
+        unpack_length = Event._wire_length.unpack_from
+        strings = []
+        for i in range(count):
+            length, = unpack_length(data, offset)
+            if length > Event.max_field_length:
+                raise EventDecodeError(
+                    'Event field is too long', EventDecodeError.TOO_LARGE)
+            offset += 2
+            end = offset + length
+            if end > len(data):
+                raise ValueError('Truncated string')
+            strings.append(data[offset:end].decode("UTF-8"))
+            offset = end
+
+        if flags & Event._FLAG_UUID:
+            if offset + 16 > len(data):
+                raise ValueError('Truncated id')
+            h = binascii.hexlify(data[offset:offset + 16]).decode('ascii')
+            event_id = '%s-%s-%s-%s-%s' % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+            offset += 16
+        else:
+            event_id = strings.pop()
+
+        length, = Event._wire_payload_length.unpack_from(data, offset)
+        offset += Event._wire_payload_length.size
+        end = offset + length
+        if end > len(data):
+            raise ValueError('Truncated payload')
+        payload = _json_loads(data[offset:end].decode("UTF-8")) if length else {}
+
+        if type(payload) is not dict:
+            raise EventDecodeError(
+                'Event payload is not an object',
+                EventDecodeError.INVALID_FIELD,
+                'payload'
+                )
+
+        e = Event._assemble(
+            strings[0],
+            strings[1],
+            strings[2],
+            Event.wire_topics[topic],
+            strings[3] if flags & Event._FLAG_SOURCE else '',
+            time(),
+            bool(flags & Event._FLAG_ONE_TIME),
+            event_id,
+            payload
+            )
+
+        return e, end
+
+    def list_from_wire(data):
+        """
+        Decodes one or more events received from the network,
+        in either the binary wire format or JSON
+
+        @since v3.16.0
+
+        Params:
+            bytes data
+
+        Returns:
+            Event[]
+        """
+        if data.startswith(Event.wire_magic):
+            return Event.list_from_bytes(data)
+
+        try:
+            text = data.decode("UTF-8")
+        except UnicodeDecodeError:
+            raise EventDecodeError(
+                'Malformed event JSON', EventDecodeError.MALFORMED)
+
+        return Event.list_from_json(text)
 
     def __str__(self):
         return (self.title + ": " + self.host) + ((": " + self.message) if self.message else "")
 
+class EventTemplate(object):
+
+    """
+    A fixed event shape, for producers which emit the same event
+    again and again, such as heartbeats. The parts of the event
+    which never change are worked out and encoded once, so each
+    event created from the template only costs its id, time and
+    payload.
+
+    @since v3.16.0
+    """
+
+    def __init__(self, title, message, host="localhost", type=None,
+                 source=None, payload=None, one_time=False):
+        """
+        Constructor
+
+        Params:
+            string title:   the title of the events
+            string message: the message describing the events
+            string host:    the host the events are about
+            Topics type:    the topic of the events
+            string source:  what produces the events. Defaults to the
+                class name of the method creating the template
+            dict payload:   payload copied into each event
+        """
+        if source is None:
+            source = _caller_class_name()
+
+        if type is None:
+            type = Topics.INFO
+        elif not isinstance(type, Topics):
+            raise Exception("Topic received was not recognized")
+
+        self.title = title
+        self.message = message
+        self.host = host
+        self.type = type
+        self.source = source
+        self.one_time = one_time
+        self.payload = payload if payload is not None else {}
+        self.identity = (title, message, source, host, type)
+        self._digest = None
+        self._json = None
+        self._wire = None
+
+    def digest(self):
+        """
+        Returns the identity digest shared by the template's events
+
+        Returns:
+            string: the hex digest
+        """
+        if self._digest is None:
+            prototype = Event(self.title, self.message, self.host, self.type, '')
+            prototype.source = self.source
+            self._digest = prototype.__hash__()
+
+        return self._digest
+
+    def json_parts(self):
+        """
+        Returns the JSON encoding of an event of the template's
+        shape, split around its payload and id
+
+        Returns:
+            tuple(string, string): the JSON up to the payload, and
+                between the payload and the id
+        """
+        if self._json is None:
+            fixed = json.dumps(dict((
+                ('title', self.title),
+                ('message', self.message),
+                ('host', self.host),
+                ('one_time', self.one_time),
+                ('source', self.source)
+                )))
+            self._json = (
+                fixed[:-1] + ', "payload": ',
+                ', "type": %s, "id": ' % json.dumps(self.type.name)
+                )
+
+        return self._json
+
+    def wire_strings(self):
+        """
+        Returns the binary encoding of the template's title,
+        message, host and source
+
+        Returns:
+            bytes
+        """
+        if self._wire is None:
+            self._wire = Event._encode_strings(
+                self.title, self.message, self.host
+                ) + Event._encode_source(self.source)
+
+        return self._wire
+
+    def create(self):
+        """
+        Creates an event of the template's shape, with a new id
+        and the current time
+
+        Returns:
+            Event
+        """
+        e = Event.__new__(Event)
+        e.title = self.title
+        e.message = self.message
+        e.host = self.host
+        e.type = self.type
+        e.source = self.source
+        e.one_time = self.one_time
+        e.payload = dict(self.payload)
+        e.when = time()
+        e.id = _next_event_id()
+        e._timestamp_of = None
+        e._identity = None
+        e._digest = None
+        e._template = self
+
+        return e
+
+def _new_event_id_prefix():
+    """
+    Starts a new sequence of event ids. Each process numbers its
+    events from a random prefix, so ids stay unique across every
+    host on the network while costing no more than a counter.
+    """
+    global _event_id_prefix, _event_id_counter
+
+    h = uuid.uuid4().hex
+    _event_id_prefix = '%s-%s-%s-%s-' % (h[:8], h[8:12], h[12:16], h[16:20])
+    _event_id_counter = itertools.count()
+
+def _next_event_id():
+    """
+    Returns a new event id. Ids have the form of a (version 4) uuid,
+    with the process' random prefix and a 48 bit sequence number,
+    so they pack into 16 bytes in the binary wire format.
+
+    Returns:
+        string
+    """
+    return _event_id_prefix + '%012x' % next(_event_id_counter)
+
+_new_event_id_prefix()
+if hasattr(os, 'register_at_fork'):
+    # A forked child would otherwise repeat its parent's ids
+    os.register_at_fork(after_in_child=_new_event_id_prefix)
+
+def _uuid_bytes(value):
+    """
+    Packs a uuid string into its 16 raw bytes, if it is in the
+    canonical lowercase form (so that it unpacks to the same string)
+
+    Returns:
+        bytes: the raw uuid, or None if the value isn't a uuid
+    """
+    if not isinstance(value, str) or len(value) != 36 or value != value.lower():
+        return None
+
+    if value[8] != '-' or value[13] != '-' or value[18] != '-' or value[23] != '-':
+        return None
+
+    try:
+        return bytes.fromhex(value.replace('-', ''))
+    except ValueError:
+        return None
+
+def _identity_digest(data):
+    """
+    Digests event identities into compact keys
+
+    Params:
+        bytes data
+
+    Returns:
+        string: a 32 character hex digest
+    """
+    if blake2b is not None:
+        return blake2b(data, digest_size=16).hexdigest()
+
+    return hashlib.sha256(data).hexdigest()[:32]
+
+def _caller_class_name():
+    """
+    Finds the class name of the method which created an Event, by
+    looking at its frame. Only the one frame is looked at, which is
+    far cheaper than inspect.stack() reading every frame's source.
+
+    Returns:
+        string: the class name, or None outside of a method
+    """
+    try:
+        frame = sys._getframe(2)
+    except AttributeError:
+        frame = inspect.currentframe().f_back.f_back
+
+    try:
+        return str(frame.f_locals["self"].__class__.__name__)
+    except KeyError:
+        return None
+
 class ConfigManager:
-    __slots__ = ('__config', '__finalized')
+
+    """
+    Configuration loaded from heartbeat's configuration files, with
+    each key available as an attribute. Missing keys are None, and
+    sections (dicts) are themselves ConfigManagers.
+
+    As of v3.16.0, finalizing a ConfigManager freezes it: its
+    sections are wrapped once, up front, and its settings become
+    ordinary attributes, so reading one is a plain attribute lookup
+    rather than wrapping the section again on every access.
+    """
+
+    __slots__ = ('__config', '__finalized', '__dict__')
 
     def __init__(self, entries):
-        self.__config = entries
-        self.__finalized = False
+        object.__setattr__(self, '_ConfigManager__config', entries)
+        object.__setattr__(self, '_ConfigManager__finalized', False)
+
+    def __setattr__(self, prop, value):
+        raise AttributeError("Configuration can only be changed with add_item")
 
     def __getattr__(self, prop):
-        try:
-            if isinstance(self.__config[prop], dict):
-                cfg_manager = ConfigManager(self.__config[prop])
-                cfg_manager.finalize()
-                return cfg_manager
-            else:
-                return self.__config[prop]
-        except:
+        # Only reached for settings which aren't attributes, which
+        # once finalized means they aren't set
+        if self.__finalized or not isinstance(self.__config, dict):
             return None
 
+        return self.__wrap(self.__config.get(prop))
+
     def __contains__(self, prop):
         return prop in self.__config
 
+    def items(self):
+        """
+        Returns the configuration keys and their raw values
+
+        @since v3.16.0
+        """
+        return self.__config.items()
+
     def add_item(self, prop, value):
         if self.__finalized:
             raise Exception("Adding items to a finalized configuration is not allowed")
@@ -153,7 +874,29 @@ class ConfigManager:
             self.__config[prop] = value
 
     def finalize(self):
-        self.__finalized = True
+        """
+        Prevents further changes to the configuration, and wraps
+        its sections ahead of time
+        """
+        if self.__finalized:
+            return
+
+        object.__setattr__(self, '_ConfigManager__finalized', True)
+        if not isinstance(self.__config, dict):
+            return
+
+        for prop, value in self.__config.items():
+            # Settings sharing a name with a method were never
+            # reachable as attributes, and still aren't
+            if isinstance(prop, str) and not hasattr(ConfigManager, prop):
+                self.__dict__[prop] = self.__wrap(value)
+
+    def __wrap(self, value):
+        if isinstance(value, dict):
+            value = ConfigManager(value)
+            value.finalize()
+
+        return value
 
 def _get_config_path(path = None):
     if (path is not None):
@@ -200,12 +943,55 @@ def get_cache_path(settings=None):
 def get_config_manager(path = None):
 
     global __config_manager
+    global __config_path
 
     if __config_manager is not None:
         return __config_manager
 
     print("Getting config manager")
     config_dir = _get_config_path(path)
+    cfg_manager = _load_config_manager(config_dir)
+    __config_path = config_dir
+    __config_manager = cfg_manager
+
+    return cfg_manager
+
+def reload_config_manager(path = None):
+    """
+    Reads the configuration again, replacing the configuration
+    returned by get_config_manager. If the configuration can't be
+    read, the current configuration is kept.
+
+    @since v3.16.0
+
+    Params:
+        string path: the configuration directory, by default the
+            one the current configuration was read from
+
+    Returns:
+        tuple(ConfigManager, set): the new configuration, and the
+            settings which changed, as "file.setting" (or just "file"
+            for a file added, removed or which isn't a dictionary)
+    """
+    global __config_manager
+    global __config_path
+
+    if path is None:
+        path = __config_path
+
+    config_dir = _get_config_path(path)
+    cfg_manager = _load_config_manager(config_dir)
+
+    previous = __config_manager
+    __config_path = config_dir
+    __config_manager = cfg_manager
+
+    if previous is None:
+        return cfg_manager, set(name for name, value in cfg_manager.items())
+
+    return cfg_manager, _diff_config(previous, cfg_manager)
+
+def _load_config_manager(config_dir):
     cfg_manager = ConfigManager({
         'heartbeat': {
             'monitor_server': None,
@@ -218,16 +1004,155 @@ def get_config_manager(path = None):
     if not os.path.exists(config_dir) or  not os.path.exists(os.path.join(config_dir, "heartbeat.conf")):
         raise Exception("Configuration data could not be found. You can install the base configuration for Heartbeat using `heartbeat-install --install-cfg`")
 
-    confdir = Path(config_dir)
-    conf_list = [f for f in confdir.resolve().glob('**/*') if f.is_file()]
-    for conffile in conf_list:
-        # In Python < 3.6, the Path objects need to be converted to str
-        # or Python gets upset.
-        with open(str(conffile)) as f:
-            conf_key = os.path.splitext(os.path.basename(str(conffile)))[0]
-            cfg_manager.add_item(conf_key, yaml.safe_load(f))
+    for conf_key, value in _read_config_files(config_dir).items():
+        cfg_manager.add_item(conf_key, value)
 
     cfg_manager.finalize()
-    __config_manager = cfg_manager
 
     return cfg_manager
+
+def _diff_config(previous, current):
+    """
+    Lists the settings which differ between two configurations
+
+    Params:
+        ConfigManager previous
+        ConfigManager current
+
+    Returns:
+        set: the changed settings, as "file.setting", or "file" where
+            the file isn't a dictionary on one side
+    """
+    before = dict(previous.items())
+    after = dict(current.items())
+    changed = set()
+
+    for name in set(before) | set(after):
+        if name not in before or name not in after:
+            changed.add(name)
+            continue
+
+        old = before[name]
+        new = after[name]
+        if old == new:
+            continue
+
+        if not isinstance(old, dict) or not isinstance(new, dict):
+            changed.add(name)
+            continue
+
+        for key in set(old) | set(new):
+            if key not in old or key not in new or old[key] != new[key]:
+                changed.add("%s.%s" % (name, key))
+
+    return changed
+
+def config_changed(section, changed):
+    """
+    Checks whether a section of the configuration is among those
+    changed, as reported by reload_config_manager
+
+    @since v3.16.0
+
+    Params:
+        string section: "file" or "file.setting"
+        set changed: the changed settings
+
+    Returns:
+        bool
+    """
+    if section in changed:
+        return True
+
+    name = section.split(".", 1)[0]
+    return name in changed or any(c.startswith(section + ".") for c in changed)
+
+def _read_config_files(config_dir, snapshot_dir=None):
+    """
+    Reads every configuration file in a directory. Parsing YAML is
+    most of the cost of starting heartbeat, so the parsed files are
+    kept in a compiled snapshot, which is used for as long as none
+    of the files have been added, removed or modified.
+
+    @since v3.16.0
+
+    Params:
+        string config_dir: the configuration directory
+        string snapshot_dir: where to keep the snapshot, by default
+            the user's cache directory
+
+    Returns:
+        dict: the contents of each file, keyed by its name without
+            the extension
+    """
+    confdir = Path(config_dir).resolve()
+    # In Python < 3.6, the Path objects need to be converted to str
+    # or Python gets upset.
+    conf_list = sorted(str(f) for f in confdir.glob('**/*') if f.is_file())
+
+    stamp = []
+    for conffile in conf_list:
+        stat = os.stat(conffile)
+        stamp.append((conffile, stat.st_mtime_ns, stat.st_size))
+    stamp = (tuple(sys.version_info[:2]), tuple(stamp))
+
+    if snapshot_dir is None:
+        snapshot_dir = os.path.join(
+            os.path.expanduser('~'), '.cache', 'heartbeat')
+    snapshot = os.path.join(
+        snapshot_dir,
+        'config-%s.snapshot' % hashlib.sha1(
+            str(confdir).encode("UTF-8")).hexdigest()[:16]
+        )
+
+    entries = _read_config_snapshot(snapshot, stamp)
+    if entries is not None:
+        return entries
+
+    import yaml
+
+    entries = {}
+    for conffile in conf_list:
+        with open(conffile) as f:
+            conf_key = os.path.splitext(os.path.basename(conffile))[0]
+            entries[conf_key] = yaml.safe_load(f)
+
+    _write_config_snapshot(snapshot, stamp, entries)
+
+    return entries
+
+def _read_config_snapshot(snapshot, stamp):
+    """
+    Returns:
+        dict: the configuration from a snapshot, or None if there
+            is no usable snapshot for the files
+    """
+    try:
+        with open(snapshot, 'rb') as f:
+            saved_stamp, entries = marshal.load(f)
+    except Exception:
+        return None
+
+    if saved_stamp != stamp:
+        return None
+
+    return entries
+
+def _write_config_snapshot(snapshot, stamp, entries):
+    try:
+        data = marshal.dumps((stamp, entries))
+    except ValueError:
+        # YAML can produce values marshal can't store, such as dates
+        logging.getLogger(__name__).debug(
+            "Configuration can't be snapshotted, it will be parsed each time")
+        return
+
+    try:
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        partial = "%s.%d" % (snapshot, os.getpid())
+        with open(os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(data)
+        os.replace(partial, snapshot)
+    except OSError as err:
+        logging.getLogger(__name__).debug(
+            "Unable to write configuration snapshot: %s", str(err))
@@ -2,12 +2,19 @@
 Heartbeat plugin for interacting with the dweet.io service.
 This plugin will send dweets for events received from heartbeat.
 
-This module does not have any configurable options.
+Events can optionally be combined into a single dweet
+by adding the following section to notifying.conf. A batch
+is sent once it is full or its oldest event has waited
+batch_latency seconds.
+
+dweetio:
+    batch_size: 10
+    batch_latency: 30
 """
 
 from heartbeat.network import NetworkInfo
 from heartbeat.plugin import Plugin
-from heartbeat.platform import Topics
+from heartbeat.platform import Topics, get_config_manager
 import urllib.parse
 import urllib.request
 
@@ -18,13 +25,22 @@ class Dweet(Plugin):
     Class that sends a single public dweet
     """
 
-    __slots__ = ('community_name', 'local_hostname')
+    __slots__ = ('community_name', 'local_hostname', 'batch_size',
+                 'batch_latency')
 
     def __init__(self):
 
         net = NetworkInfo()
         self.community_name = net.ip_wan
         self.local_hostname = net.hostname
+        self.batch_size = None
+        self.batch_latency = 30
+
+        config = get_config_manager()
+        if config.notifying is not None and 'dweetio' in config.notifying:
+            self.batch_size = config.notifying.dweetio.batch_size
+            if config.notifying.dweetio.batch_latency is not None:
+                self.batch_latency = config.notifying.dweetio.batch_latency
 
         super(Dweet, self).__init__()
 
@@ -32,6 +48,8 @@ class Dweet(Plugin):
         """
         Overrides Plugin.get_subscriptions
         """
+        if self.batch_size:
+            return {}
 
         subs = {
             Topics.INFO: self._push_dweet,
@@ -42,15 +60,50 @@ class Dweet(Plugin):
 
         return subs
 
+    def get_batch_subscriptions(self):
+        """
+        Overrides Plugin.get_batch_subscriptions
+        """
+        if not self.batch_size:
+            return {}
+
+        batch = (self._push_dweets, self.batch_size, self.batch_latency)
+        subs = {
+            Topics.INFO: batch,
+            Topics.WARNING: batch,
+            Topics.DEBUG: batch,
+            Topics.STARTUP: batch
+            }
+
+        return subs
+
     def _push_dweet(self, event):
         """
         Pushes a public dweet to dweet.io
         """
-        payload = {
+        self._send({
                 'title': event.title + ": " + event.host,
-                'message': event.host + ": " + event.message + " at " + \
-                        event.timestamp.strftime("%H:%M:%S %m/%d/%y")
-                }
+                'message': self._describe(event)
+                })
+
+    def _push_dweets(self, events):
+        """
+        Pushes a single public dweet for a batch of events
+        """
+        if len(events) == 1:
+            self._push_dweet(events[0])
+            return
+
+        self._send({
+                'title': "{:d} events: {:s}".format(len(events), events[-1].title),
+                'message': "\n".join(self._describe(e) for e in events)
+                })
+
+    def _describe(self, event):
+        return event.host + ": " + event.message + " at " + \
+                event.timestamp.strftime("%H:%M:%S %m/%d/%y")
+
+    def _send(self, payload):
         payload_url = urllib.parse.urlencode(payload)
         name = self.community_name + "." + self.local_hostname
 
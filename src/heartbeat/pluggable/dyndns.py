@@ -8,6 +8,7 @@ each plugin is in the plugin's class.
 
 from heartbeat.platform import get_config_manager, Topics
 from heartbeat.plugin import Plugin
+from heartbeat.routing import EventFilter
 import urllib.parse
 import urllib.request
 
@@ -47,6 +48,17 @@ class UrlPull(Plugin):
 
         return subs
 
+    def get_subscription_filters(self):
+        """
+        Overrides Plugin.get_subscription_filters
+        """
+
+        filters = {
+            self.update_dyndns: EventFilter(payload={'ip_type': 'WAN'})
+            }
+
+        return filters
+
     def get_required_services(self):
         """
         Overrides Plugin.get_required_services
@@ -2,12 +2,12 @@
 Heartbeat's Heartbeat plugins
 """
 
-import datetime
 import operator
+import threading
 from time import sleep, time
 from random import randint
 from heartbeat.network import SocketListener, NetworkInfo
-from heartbeat.platform import get_config_manager, Event, Topics
+from heartbeat.platform import get_config_manager, Event, EventTemplate, Topics
 from heartbeat.multiprocessing import BackgroundTimer, Cache
 from heartbeat.plugin import Plugin
 from heartbeat.monitoring import MonitorType
@@ -87,6 +87,12 @@ class Pulse(Plugin):
 
         self.fqdn = netinfo.get_hostname()
         self.callback = None
+        self.template = EventTemplate(
+                title="System heartbeat",
+                message="",
+                type=Topics.HEARTBEAT,
+                host=self.fqdn
+            )
 
     def get_producers(self):
         """
@@ -109,12 +115,7 @@ class Pulse(Plugin):
 
     def _beat(self):
         """ Sends a heartbeat """
-        e = Event(
-                title="System heartbeat",
-                message="",
-                type=Topics.HEARTBEAT,
-                host=self.fqdn
-            )
+        e = self.template.create()
 
         if self.callback is not None:
             self.callback(e)
@@ -141,19 +142,38 @@ class PulseMonitor(Plugin):
     (non-event) system. This class listens to Pulses.
     """
 
+    # Seconds without a heartbeat before a host is considered flatlined
+    flatline_after = 300
+
     def __init__(self, cache=None):
         """
         constructor
 
         Params:
-            Cache cache (optional)
+            Cache cache (optional): given flatline_after as its time
+                to live if it has none, as hosts are only found to have
+                flatlined when they expire
         """
         if cache is None:
-            self.cache = Cache('known-pulses')
+            cache = Cache('known-pulses', ttl=self.flatline_after)
+
+        self.cache = cache
+
+        # Set by set_callback or cleanup_hosts
+        self.callback = None
+        # Flatlined hosts found before there was a callback to notify
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self.cache.on_evict = self._flatlined
+        if getattr(self.cache, 'ttl', None) is None:
+            self.cache.ttl = self.flatline_after
+            # Rewrite the hosts already known, so they expire too
+            now = time()
+            for host in self.cache.keys():
+                self.cache.write(host, now)
         else:
-            self.cache = cache
+            self.cache.resetValuesTo(time())
 
-        self.cache.resetValuesTo(time())
         self.shutdown = False
 
         super(PulseMonitor, self).__init__()
@@ -189,7 +209,20 @@ class PulseMonitor(Plugin):
         # we can keep for a realtime monitor. This is just a method
         # to capture the callback, since PulseMonitor doesn't
         # need to run continuously.
-        self.callback = callback
+        self._attach(callback)
+
+    def _attach(self, callback):
+        """
+        Keeps the callback to notify with, and sends it any
+        notifications held back until there was one
+        """
+        with self._pending_lock:
+            self.callback = callback
+            pending = self._pending
+            self._pending = []
+
+        for event in pending:
+            callback(event)
 
     def get_required_services(self):
         """ Overrides Plugin.get_required_services """
@@ -241,7 +274,7 @@ class PulseMonitor(Plugin):
         Params:
             string host: the host the broadcast originated from
         """
-        if (host not in self.cache.keys()):
+        if not self.cache.exists(host) and self.callback is not None:
             event = Event("New Heartbeat", "New heartbeat discovered", host)
             self.callback(event)
 
@@ -249,29 +282,43 @@ class PulseMonitor(Plugin):
 
     def cleanup_hosts(self, callback):
         """
-        Cleans up the known heartbeats and notifies of any that haven't
-        been heard for a while, then dumps them.
+        Notifies of the known heartbeats that haven't been heard for a
+        while and forgets them, then writes the rest out to disk. The
+        cache expires hosts as it comes across them, so this only
+        makes sure it happens when nothing else is heard.
         """
-        logged_hosts = self.cache.items()
-        remove_hosts = []
+        self._attach(callback)
+        self.cache.expire()
+        self.cache.writeToDisk()
 
-        for host, logged_time in logged_hosts:
-            difference = datetime.datetime.now() - datetime.datetime.fromtimestamp(logged_time)
+    def _flatlined(self, host, logged_time, reason):
+        """
+        Notifies of a host whose heartbeat was lost. This is the
+        cache's on_evict callback.
 
-            if difference > datetime.timedelta(seconds=300):
-                event = Event(
-                    "Flatlined Host",
-                    "Host flatlined (heartbeat lost)",
-                    host,
-                )
+        Params:
+            string host: the host evicted
+            float logged_time: when it was last heard from
+            string reason: why it was evicted
+        """
+        if reason != Cache.EXPIRED:
+            return
 
-                callback(event)
-                remove_hosts.append(host)
+        event = Event(
+            "Flatlined Host",
+            "Host flatlined (heartbeat lost)",
+            host,
+        )
 
-        for host in remove_hosts:
-            self.cache.remove(host)
+        with self._pending_lock:
+            callback = self.callback
+            if callback is None:
+                # The host is gone from the cache already, so hold on
+                # to the notification until there's a callback
+                self._pending.append(event)
+                return
 
-        self.cache.writeToDisk()
+        callback(event)
 
 
 class Heartbeat(Pulse):
@@ -345,12 +392,37 @@ class Monitor(PulseMonitor):
                 MonitorType.PERIODIC: self.cleanup_hosts
             }
 
+    def get_async_producers(self):
+        """
+        Overrides Plugin.get_async_producers
+        """
+
+        return {
+                MonitorType.REALTIME: self.run_legacy_async
+            }
+
+    def run_legacy_async(self, callback):
+        """
+        Listens for heartbeats on the event loop, rather than
+        in a thread of its own
+
+        @since v3.16.0
+        """
+        from heartbeat.network.asynchronous import listen_datagrams
+
+        self._attach(callback)
+        return listen_datagrams(
+            self.listener.listen_socket,
+            self.receive_legacy,
+            lambda: self.shutdown
+            )
+
     def run_legacy(self, callback):
         """
         Runs the monitor. Usually called by the parent start()
         """
         self.listener.start()
-        self.callback = callback
+        self._attach(callback)
 
         while not self.shutdown:
             sleep(5)
@@ -8,7 +8,7 @@ in the Plugin it pertains to.
 """
 
 from heartbeat.plugin import Plugin
-from heartbeat.platform import get_config_manager, Topics, Event
+from heartbeat.platform import get_config_manager, Topics, Event, EventDecodeError
 from heartbeat.network import SocketBroadcaster, SocketListener, NetworkInfo
 from heartbeat.security import Encryptor
 from heartbeat.monitoring import MonitorType
@@ -23,22 +23,63 @@ class Sender(Plugin):
 
     """
     Calls up and sends hardware events to a monitoring server
+
+    Events can optionally be sent in batches, packing several
+    events into each datagram, by setting a batch size in the
+    histamine section of notifying.conf. A batch is sent once
+    it is full or its oldest event has waited batch_latency
+    seconds. Batches are only understood by Listeners running
+    v3.16.0 or newer.
+
+    Events are sent as JSON by default. Setting wire_format to
+    binary sends them in Event's compact binary encoding instead,
+    which is smaller and cheaper to decode, but is likewise only
+    understood by Listeners running v3.16.0 or newer. Listeners
+    accept either format.
+
+    histamine:
+        batch_size: 20
+        batch_latency: 2
+        wire_format: binary
     """
 
     __slots__ = ('monitor_server', 'secret_key', 'use_encryption'
             'enc_password')
 
+    # Upper bound on the event JSON packed into a single datagram
+    max_datagram = 8192
+
     def __init__(self):
 
         settings = get_config_manager()
         self.unacked = {}
-        self.monitor_server = settings.heartbeat.monitor_server
-        self.secret_key = settings.heartbeat.secret_key
-        self.use_encryption = settings.heartbeat.use_encryption
-        self.enc_password = settings.heartbeat.enc_password
-        self.acking = False
+        self.acking = self._acking(settings)
+        self._configure(settings)
 
-        self.topics = {
+        super(Sender, self).__init__()
+
+    def _configure(self, settings):
+        """
+        Reads the settings which can change while running. Acking
+        is read once, as its producer is set up at start. Events
+        may be sent while settings are reloaded, so the new ones are
+        worked out first and only then put in place.
+        """
+        monitor_server = settings.heartbeat.monitor_server
+        broadcaster = getattr(self, 'broadcaster', None)
+        if broadcaster is None or monitor_server != self.monitor_server:
+            broadcaster = SocketBroadcaster(22000, monitor_server)
+
+        use_encryption = settings.heartbeat.use_encryption
+        enc_password = settings.heartbeat.enc_password
+        encryptor = None
+        if use_encryption:
+            encryptor = Encryptor(enc_password)
+        batch_size = None
+        batch_latency = 2
+        binary = False
+
+        topics = {
             Topics.INFO: self.send_event,
             Topics.WARNING: self.send_event,
             Topics.DEBUG: self.send_event,
@@ -48,27 +89,86 @@ class Sender(Plugin):
             }
 
         if 'histamine' in settings.notifying:
-            if 'enable_acking' in settings.notifying.histamine:
-                self.acking = settings.notifying.histamine.enable_acking
-
             if 'topics' in settings.notifying.histamine:
-                self.topics = {}
+                topics = {}
                 for s in settings.notifying.histamine.topics:
                     if s.upper() in Topics.__members__.keys():
-                        self.topics[Topics[s.upper()]] = self.send_event
+                        topics[Topics[s.upper()]] = self.send_event
+
+            if 'batch_size' in settings.notifying.histamine:
+                batch_size = settings.notifying.histamine.batch_size
+
+            if 'batch_latency' in settings.notifying.histamine:
+                batch_latency = settings.notifying.histamine.batch_latency
+
+            if 'wire_format' in settings.notifying.histamine:
+                binary = settings.notifying.histamine.wire_format == 'binary'
 
         if self.acking:
-            self.topics[Topics.ACK] = self.handle_ack
+            topics[Topics.ACK] = self.handle_ack
 
-        super(Sender, self).__init__()
+        self.broadcaster = broadcaster
+        self.monitor_server = monitor_server
+        self.secret_key = settings.heartbeat.secret_key
+        self.encryptor = encryptor
+        self.use_encryption = use_encryption
+        self.enc_password = enc_password
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+        self.binary = binary
+        self.topics = topics
+
+    def get_config_sections(self):
+        """
+        Overrides Plugin.get_config_sections
+        """
+        return [
+            'heartbeat.monitor_server',
+            'heartbeat.secret_key',
+            'heartbeat.use_encryption',
+            'heartbeat.enc_password',
+            'notifying.histamine',
+            ]
+
+    def reload(self, settings):
+        """
+        Overrides Plugin.reload. Everything but acking can be
+        changed without a restart.
+        """
+        self._configure(settings)
+
+        return self._acking(settings) == self.acking
+
+    def _acking(self, settings):
+        if 'histamine' in settings.notifying:
+            if 'enable_acking' in settings.notifying.histamine:
+                return settings.notifying.histamine.enable_acking
+
+        return False
 
     def get_subscriptions(self):
         """
         Overrides Plugin.get_subcriptions
         """
+        if self.batch_size:
+            # ACKs are addressed to individual hosts, so they
+            # are never batched
+            if Topics.ACK in self.topics:
+                return {Topics.ACK: self.topics[Topics.ACK]}
+            return {}
 
         return self.topics
 
+    def get_batch_subscriptions(self):
+        """
+        Overrides Plugin.get_batch_subscriptions
+        """
+        if not self.batch_size:
+            return {}
+
+        batch = (self.send_events, self.batch_size, self.batch_latency)
+        return {t: batch for t in self.topics if t != Topics.ACK}
+
     def get_producers(self):
         """
         Overrides Plugin.get_producers
@@ -101,25 +201,84 @@ class Sender(Plugin):
             broadcaster = SocketBroadcaster(
                     22000, event.payload['dest'])
         else:
-            if (event.id not in self.unacked):
-                event.payload["histamine_attempt"] = 1
-            else:
-                event.payload["histamine_attempt"] += 1
+            self._track(event)
+            broadcaster = self.broadcaster
 
-            self.unacked[event.id] = event
+        self._push(broadcaster, self._encode(event))
 
-            broadcaster = SocketBroadcaster(
-                    22000, self.monitor_server)
+    def send_events(self, events):
+        """
+        Sends a batch of events, packing as many as will fit
+        into each datagram, as a JSON array or as consecutive
+        binary encoded events
+        """
+        broadcaster = self.broadcaster
+        packed = []
+        size = 0
+
+        for event in events:
+            if ("histamine_rxtime" in event.payload):
+                continue
+
+            self._track(event)
+            data = self._encode(event)
+
+            if packed and size + len(data) > self.max_datagram:
+                self._push(broadcaster, self._pack(packed))
+                packed = []
+                size = 0
+
+            packed.append(data)
+            size += len(data) + 1
+
+        if packed:
+            self._push(broadcaster, self._pack(packed))
+
+    def _encode(self, event):
+        """
+        Encodes an event in the configured wire format
+        """
+        if self.binary:
+            return event.to_bytes()
+
+        return event.to_json()
+
+    def _pack(self, encoded):
+        """
+        Joins encoded events to be sent in a single datagram
+        """
+        if self.binary:
+            return b''.join(encoded)
+
+        return "[" + ",".join(encoded) + "]"
 
-        if (self.use_encryption):
-            data = bytes(self.secret_key.encode("UTF-8"))
-            encryptor = Encryptor(self.enc_password)
-            data += encryptor.encrypt(event.to_json())
-            broadcaster.push(data)
+    def _track(self, event):
+        """
+        Records a send attempt for an event awaiting an ACK
+        """
+        if (event.id not in self.unacked):
+            event.payload["histamine_attempt"] = 1
         else:
-            data = self.secret_key
-            data += event.to_json()
-            broadcaster.push(bytes(data.encode("UTF-8")))
+            event.payload["histamine_attempt"] += 1
+
+        self.unacked[event.id] = event
+
+    def _push(self, broadcaster, event_data):
+        """
+        Prefixes, encrypts if configured, and sends event data,
+        which is either JSON text or binary encoded events
+        """
+        data = bytes(self.secret_key.encode("UTF-8"))
+        # Read once, as a reload may replace it meanwhile
+        encryptor = self.encryptor
+        if (encryptor is not None):
+            data += encryptor.encrypt(event_data)
+        elif (isinstance(event_data, bytes)):
+            data += event_data
+        else:
+            data += event_data.encode("UTF-8")
+
+        broadcaster.push(data)
 
     def resend_unacked(self):
         """
@@ -163,17 +322,29 @@ class Listener(Plugin):
                match that of the heartbeats this is intended to watch
             Notificationhandler notifyHandler: notification handler
         """
-        self.settings = get_config_manager()
-        secret = self.settings.heartbeat.secret_key
-
-        self.secret = bytes(secret.encode("UTF-8"))
         self.callback = None
         super(Listener, self).__init__()
         self.realtime = True
         self.shutdown = False
-        self.acking = False
+        self._configure(get_config_manager())
+
+    def _configure(self, settings):
+        """
+        Reads the Listener's settings. Events are received while
+        settings are reloaded, so the new ones are worked out first
+        and only then put in place.
+        """
+        secret = settings.heartbeat.secret_key
 
-        self.topics = [
+        encryptor = None
+        accept_plaintext = True
+        if settings.heartbeat.use_encryption:
+            encryptor = Encryptor(settings.heartbeat.enc_password)
+            accept_plaintext = bool(settings.heartbeat.accept_plaintext)
+
+        acking = False
+
+        topics = [
                 Topics.INFO,
                 Topics.WARNING,
                 Topics.DEBUG,
@@ -182,20 +353,48 @@ class Listener(Plugin):
                 Topics.STARTUP,
                 ]
 
-        if 'histamine' in self.settings.monitoring:
-            if 'enable_acking' in self.settings.monitoring.histamine:
-                self.acking = self.settings.monitoring.histamine.enable_acking
+        if 'histamine' in settings.monitoring:
+            if 'enable_acking' in settings.monitoring.histamine:
+                acking = settings.monitoring.histamine.enable_acking
 
-            if 'topics' in self.settings.monitoring.histamine:
-                self.topics = []
-                for r in self.settings.monitoring.histamine.topics:
+            if 'topics' in settings.monitoring.histamine:
+                topics = []
+                for r in settings.monitoring.histamine.topics:
                     try:
-                        self.topics.append(Topics[r.upper()])
+                        topics.append(Topics[r.upper()])
                     except KeyError:
                         print("Unrecognized topic %s, skipping" % r)
 
-        if self.acking:
-            self.topics.append(Topics.ACK)
+        if acking:
+            topics.append(Topics.ACK)
+
+        self.settings = settings
+        self.secret = bytes(secret.encode("UTF-8"))
+        # In this order, a packet received in between is at worst
+        # turned away when plaintext stops being accepted
+        self.accept_plaintext = accept_plaintext
+        self.encryptor = encryptor
+        self.acking = acking
+        self.topics = topics
+
+    def get_config_sections(self):
+        """
+        Overrides Plugin.get_config_sections
+        """
+        return [
+            'heartbeat.secret_key',
+            'heartbeat.use_encryption',
+            'heartbeat.enc_password',
+            'heartbeat.accept_plaintext',
+            'monitoring.histamine',
+            ]
+
+    def reload(self, settings):
+        """
+        Overrides Plugin.reload
+        """
+        self._configure(settings)
+        return True
 
     def get_producers(self):
         """
@@ -208,6 +407,15 @@ class Listener(Plugin):
 
         return prods
 
+    def get_async_producers(self):
+        """
+        Overrides Plugin.get_async_producers
+        """
+
+        return {
+            MonitorType.REALTIME: self.run_async
+            }
+
     def get_services(self):
         """ Overrides Plugin.get_services """
         return ['dbb651d2-bce4-466b-9c01-2c5df2ead863']
@@ -243,44 +451,59 @@ class Listener(Plugin):
             binary addr:
         """
         if data.startswith(self.secret):
-            eventData = data[len(self.secret):].decode("UTF-8")
-            event = None
+            eventData = data[len(self.secret):]
+            events = None
+            encryptor = self.encryptor
 
-            if self.settings.heartbeat.use_encryption:
+            if encryptor is not None:
                 try:
-                    encryptor = Encryptor(self.settings.heartbeat.enc_password)
-                    event = Event.from_json(encryptor.decrypt(eventData))
-                except:
+                    events = Event.list_from_wire(
+                        encryptor.decrypt(eventData, decode=False))
+                except (ValueError, IndexError, EventDecodeError):
+                    # Not encrypted with our password, or not
+                    # encrypted at all
                     pass
 
-            if event is None and self.settings.accept_plaintext:
+            if events is None and self.accept_plaintext:
                 try:
-                    event = Event.from_json(eventData)
-                except Exception:
+                    events = Event.list_from_wire(eventData)
+                except EventDecodeError:
                     pass
 
-            if (event is not None and event.type in self.topics):
-                try:
-                    # Sanitize the source to an IP. Using a hostname is
-                    # sketchy because in some network environments or VPS
-                    # setups, gethostbyaddr to get a hostname doesn't
-                    # provide stable information (sometimes IP, sometimes hostname)
-                    # This should also prevent the exception below.
-                    event.host = str(socket.gethostbyname(addr[0])) + "-" + str(event.host)
-                except socket.herror:
-                    event.host = str(addr[0]) + "-" + str(event.host)
-
-                if (self._bcastIsOwn(event.host)):
-                    return
-
-                event.payload['histamine_rxtime'] = time()
-                self.callback(event)
-
-                if (self.acking and 'histamine_acking' not in event.payload):
-                    ack_e = Event('ACKing ' + event.id + "/" + event.host, 'ACK', type=Topics.ACK)
-                    ack_e.payload['histamine_acking'] = event.id
-                    ack_e.payload['dest'] = event.host
-                    self.callback(ack_e)
+            if events is not None:
+                for event in events:
+                    self._handle_event(event, addr)
+
+    def _handle_event(self, event, addr):
+        """
+        Handles a single event received from the network
+
+        Params:
+            Event event: the received event
+            binary addr: the address the event was received from
+        """
+        if (event.type in self.topics):
+            try:
+                # Sanitize the source to an IP. Using a hostname is
+                # sketchy because in some network environments or VPS
+                # setups, gethostbyaddr to get a hostname doesn't
+                # provide stable information (sometimes IP, sometimes hostname)
+                # This should also prevent the exception below.
+                event.host = str(socket.gethostbyname(addr[0])) + "-" + str(event.host)
+            except socket.herror:
+                event.host = str(addr[0]) + "-" + str(event.host)
+
+            if (self._bcastIsOwn(event.host)):
+                return
+
+            event.payload['histamine_rxtime'] = time()
+            self.callback(event)
+
+            if (self.acking and 'histamine_acking' not in event.payload):
+                ack_e = Event('ACKing ' + event.id + "/" + event.host, 'ACK', type=Topics.ACK)
+                ack_e.payload['histamine_acking'] = event.id
+                ack_e.payload['dest'] = event.host
+                self.callback(ack_e)
 
     def terminate(self):
         """
@@ -301,6 +524,23 @@ class Listener(Plugin):
 
         self.terminate()
 
+    def run_async(self, callback):
+        """
+        Listens for events on the event loop, rather than in a
+        thread of its own
+
+        @since v3.16.0
+        """
+        from heartbeat.network.asynchronous import listen_datagrams
+
+        self.callback = callback
+        self.listener = SocketListener(22000, self.receive)
+        return listen_datagrams(
+            self.listener.listen_socket,
+            self.receive,
+            lambda: self.shutdown
+            )
+
 class LocalSocket(Plugin):
 
     def __init__(self, settings=None):
@@ -332,6 +572,15 @@ class LocalSocket(Plugin):
 
         return prods
 
+    def get_async_producers(self):
+        """
+        Overrides Plugin.get_async_producers
+        """
+
+        return {
+            MonitorType.REALTIME: self.run_async
+            }
+
     def get_services(self):
         """ Overrides Plugin.get_services """
         return []
@@ -343,12 +592,13 @@ class LocalSocket(Plugin):
         os.unlink(self.sock_address)
 
     def receive(self, data, from_addr):
-        eventData = data.decode("UTF-8")
         try:
-            event = Event.from_json(eventData)
+            events = Event.list_from_wire(data)
+        except EventDecodeError:
+            return
+
+        for event in events:
             self.callback(event)
-        except:
-            pass
 
     def run(self, callback):
         self.socket.bind(self.sock_address)
@@ -365,3 +615,20 @@ class LocalSocket(Plugin):
                 pass
             finally:
                 connection.close()
+
+    def run_async(self, callback):
+        """
+        Serves the socket on the event loop, rather than in a
+        thread of its own
+
+        @since v3.16.0
+        """
+        from heartbeat.network.asynchronous import serve_unix
+
+        self.callback = callback
+        self.socket.close()
+        return serve_unix(
+            self.sock_address,
+            self.receive,
+            lambda: self.shutdown
+            )
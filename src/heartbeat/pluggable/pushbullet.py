@@ -11,6 +11,14 @@ pushbullet:
     api_keys:
         - YOUR_FIRST_API_KEY
         - YOUR_SECOND_API_KEY
+
+Events can optionally be combined into a single note
+by setting a batch size. A batch is pushed once it is
+full or its oldest event has waited batch_latency seconds.
+
+pushbullet:
+    batch_size: 10
+    batch_latency: 30
 """
 
 from pushbullet import PushBullet
@@ -24,17 +32,23 @@ class NotePush(Plugin):
     Makes a note push to Pushbullet
     """
 
-    __slots__ = ('api_keys')
+    __slots__ = ('api_keys', 'batch_size', 'batch_latency')
 
     def __init__(self):
         config = get_config_manager()
         self.api_keys = config.notifying.pushbullet.api_keys
+        self.batch_size = config.notifying.pushbullet.batch_size
+        self.batch_latency = config.notifying.pushbullet.batch_latency
+        if self.batch_latency is None:
+            self.batch_latency = 30
         super(NotePush, self).__init__()
 
     def get_subscriptions(self):
         """
         Overrides Plugin.get_subscriptions
         """
+        if self.batch_size:
+            return {}
 
         subs = {
             Topics.INFO: self.push_note,
@@ -44,16 +58,48 @@ class NotePush(Plugin):
 
         return subs
 
+    def get_batch_subscriptions(self):
+        """
+        Overrides Plugin.get_batch_subscriptions
+        """
+        if not self.batch_size:
+            return {}
+
+        batch = (self.push_notes, self.batch_size, self.batch_latency)
+        subs = {
+            Topics.INFO: batch,
+            Topics.WARNING: batch,
+            Topics.STARTUP: batch
+            }
+
+        return subs
+
     def push_note(self, event):
         """
         Pushes a note to the configured pushbullet accounts
         """
 
-        host = event.host
-        title = event.title + ": " + host
-        message = host + ": " + event.message + " at " + \
+        title = event.title + ": " + event.host
+        self._push(title, self._describe(event))
+
+    def push_notes(self, events):
+        """
+        Pushes a single note for a batch of events to the
+        configured pushbullet accounts
+        """
+        if len(events) == 1:
+            self.push_note(events[0])
+            return
+
+        title = "{:d} events: {:s}".format(len(events), events[-1].title)
+        message = "\n".join(self._describe(e) for e in events)
+        self._push(title, message)
+
+    def _describe(self, event):
+        return event.host + ": " + event.message + " at " + \
                 event.timestamp.strftime("%H:%M:%S %m/%d/%y")
 
+    def _push(self, title, message):
         for key in self.api_keys:
             pb = PushBullet(key)
             pb.push_note(title, message)
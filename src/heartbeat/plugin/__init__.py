@@ -172,6 +172,38 @@ class Plugin(object, metaclass=PluginRegistry):
         """
         return {}
 
+    def get_batch_subscriptions(self):
+        """
+        Returns a dictionary of topics mapped to callbacks
+        which receive events in batches (as a list) rather
+        than one at a time, along with the largest batch size
+        and the longest time (in seconds) an event may wait
+        for its batch to fill. The default at this level is
+        an empty dictionary.
+
+        @since v3.16.0
+
+        Returns:
+            dict(Topic: (Callback, int max_size, float max_latency))
+        """
+        return {}
+
+    def get_subscription_filters(self):
+        """
+        Returns a dictionary of subscription callbacks
+        mapped to filters that events must pass to be
+        delivered to them. Filtering in the router avoids
+        the cost of calling a subscriber only for it to
+        discard the event. The default at this level is
+        an empty dictionary.
+
+        @since v3.16.0
+
+        Returns:
+            dict(Callback: EventFilter)
+        """
+        return {}
+
     def get_producers(self):
         """
         Returns a dictionary of producers and types
@@ -186,6 +218,37 @@ class Plugin(object, metaclass=PluginRegistry):
         """
         return {}
 
+    def get_async_subscriptions(self):
+        """
+        Returns a dictionary of topics mapped to coroutine
+        functions which receive events on the event loop when
+        heartbeat runs with the asyncio runtime. These take the
+        place of the plugin's synchronous subscriptions to the
+        same topics. The default at this level is an empty
+        dictionary.
+
+        @since v3.16.0
+
+        Returns:
+            dict(Topic: Callback)
+        """
+        return {}
+
+    def get_async_producers(self):
+        """
+        Returns a dictionary of coroutine function producers
+        and types which run on the event loop when heartbeat
+        runs with the asyncio runtime. These take the place of
+        the plugin's synchronous producers of the same type.
+        The default at this level is an empty dictionary.
+
+        @since v3.16.0
+
+        Returns:
+            dict(MonitorType: Callback)
+        """
+        return {}
+
     def get_services(self):
         """
         Returns a list of services provided by the plugin.
@@ -257,6 +320,43 @@ class Plugin(object, metaclass=PluginRegistry):
         """
         return []
 
+    def get_config_sections(self):
+        """
+        Returns the sections of the configuration the plugin
+        reads, as "file" or "file.setting" (for instance
+        "notifying.histamine" or "heartbeat.monitor_server").
+        When any of them change while heartbeat is running,
+        the plugin's reload method is called. The default at
+        this level is an empty list.
+
+        @since v3.16.0
+
+        Returns:
+            String[] sections
+        """
+        return []
+
+    def reload(self, settings):
+        """
+        Applies a changed configuration to the running plugin.
+        Heartbeat unsubscribes the plugin beforehand and
+        subscribes it again afterwards, so its subscriptions may
+        change. Its producers keep running as they are.
+
+        The default implementation applies nothing, leaving the
+        changes to take effect when heartbeat restarts.
+
+        @since v3.16.0
+
+        Params:
+            ConfigManager settings: the new configuration
+
+        Returns:
+            bool: whether the changes were applied, rather than
+                needing a restart
+        """
+        return False
+
     def halt(self):
         """
         Signal the plugin to shut down immediately. This is intended
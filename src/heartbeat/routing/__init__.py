@@ -1,11 +1,582 @@
-import datetime
-from heartbeat.platform import Topics
-from heartbeat.multiprocessing import Cache
+from heartbeat.platform import Event, Topics, get_config_manager
+from heartbeat.multiprocessing import Cache, BackgroundTimer
+from heartbeat.metrics import Histogram, MetricsRegistry
+import fnmatch
 import logging
+import re
+import threading
 import traceback
+from collections import deque, OrderedDict
 from enum import Enum
-from queue import Queue
-from time import sleep
+from queue import Empty
+from time import sleep, monotonic, time
+
+
+class TokenBucket(object):
+
+    """
+    Paces calls to a subscriber that is subject to an external
+    rate limit. Tokens refill continuously at the configured rate
+    up to the burst size, and each delivery takes one token.
+    """
+
+    def __init__(self, rate, burst=1, clock=monotonic, sleeper=sleep):
+        """
+        Constructor
+
+        Params:
+            float rate: tokens added to the bucket per second
+            int burst: maximum number of tokens the bucket can hold
+            Callable clock: monotonic time source
+            Callable sleeper: method to call to wait for a token
+        """
+        if rate <= 0:
+            raise Exception("Token bucket rate must be greater than zero")
+
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self._clock = clock
+        self._sleep = sleeper
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token from the bucket. The bucket may go into debt,
+        in which case the caller must wait before using the token.
+        Callers waiting on the same bucket are served in order.
+
+        Returns:
+            float: seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self._updated) * self.rate
+                )
+            self._updated = now
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.rate
+
+    def consume(self):
+        """
+        Takes a token from the bucket, waiting until it is usable
+        """
+        delay = self.reserve()
+        if delay > 0:
+            self._sleep(delay)
+
+
+class EventBatch(object):
+
+    """
+    Accumulates events for a batch subscriber and hands them off
+    as a list once the batch is full or the oldest event in it
+    has waited for the maximum latency.
+
+    @since v3.16.0
+    """
+
+    def __init__(self, callback, submit, max_size=10, max_latency=5):
+        """
+        Constructor
+
+        Params:
+            Callable callback: method to call with a list of events
+            Callable submit: method to call with the callback and the
+                list of events when the batch is flushed
+            int max_size: number of events that triggers a flush
+            float max_latency: seconds the oldest event may wait for
+                the batch to fill before it is flushed anyway
+        """
+        self.callback = callback
+        self.max_size = max(1, int(max_size))
+        self.max_latency = max_latency
+        self.events = []
+        self._submit = submit
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        """
+        Adds an event to the batch, flushing it if it is full
+
+        Params:
+            Event event
+        """
+        events = None
+        with self._lock:
+            self.events.append(event)
+            if len(self.events) >= self.max_size:
+                events = self._take()
+            elif self._timer is None:
+                self._timer = BackgroundTimer(self.max_latency, False, self.flush)
+                self._timer.start()
+
+        if events:
+            self._submit(self.callback, events)
+
+    def flush(self):
+        """
+        Hands off any events waiting in the batch
+        """
+        with self._lock:
+            events = self._take()
+
+        if events:
+            self._submit(self.callback, events)
+
+    def _take(self):
+        """
+        Empties the batch, returning the events that were in it.
+        The caller must hold the batch lock.
+        """
+        events = self.events
+        self.events = []
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+        return events
+
+
+class EventFilter(object):
+
+    """
+    A declarative filter for the events delivered to a subscriber,
+    compiled once when it is created so the router can cheaply skip
+    events the subscriber would discard anyway.
+
+    Host, source and title are matched against shell-style patterns
+    (as in fnmatch), and match if any of the patterns given match.
+    Payload keys are matched against either a value, which must be
+    equal, or a predicate to call with the payload value. An event
+    must match every part of the filter to be delivered. A predicate
+    which raises is logged and taken as not matching.
+
+    @since v3.16.0
+    """
+
+    _logger = logging.getLogger(__name__ + ".EventFilter")
+
+    def __init__(self, host=None, source=None, title=None, payload=None):
+        """
+        Constructor
+
+        Params:
+            str|str[] host: pattern(s) for the event host
+            str|str[] source: pattern(s) for the event source
+            str|str[] title: pattern(s) for the event title
+            dict payload: payload keys mapped to a value or a predicate
+        """
+        self._checks = []
+
+        for field, patterns in (('host', host), ('source', source), ('title', title)):
+            if patterns is not None:
+                self._checks.append(self._field_check(field, patterns))
+
+        if payload is not None:
+            for key, expected in payload.items():
+                self._checks.append(self._payload_check(key, expected))
+
+    def _field_check(self, field, patterns):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+
+        match = re.compile(
+            "|".join("(?:" + fnmatch.translate(p) + ")" for p in patterns)
+            ).match
+
+        def check(event):
+            value = getattr(event, field)
+            return value is not None and match(value) is not None
+
+        return check
+
+    def _payload_check(self, key, expected):
+        if callable(expected):
+            predicate = expected
+        else:
+            predicate = lambda value: value == expected
+
+        def check(event):
+            return key in event.payload and predicate(event.payload[key])
+
+        return check
+
+    def matches(self, event):
+        """
+        Whether an event passes the filter
+
+        Params:
+            Event event
+
+        Returns:
+            bool
+        """
+        for check in self._checks:
+            try:
+                if not check(event):
+                    return False
+            except Exception as err:
+                EventFilter._logger.error(
+                    "Filter failed on %s, not delivering it: %s",
+                    str(event),
+                    str(err)
+                    )
+                return False
+
+        return True
+
+    def combine(self, other):
+        """
+        Returns a filter that requires both this filter
+        and another to match
+
+        Params:
+            EventFilter other
+
+        Returns:
+            EventFilter
+        """
+        combined = EventFilter()
+        combined._checks = self._checks + other._checks
+        return combined
+
+
+class Overflow(Enum):
+
+    """
+    What a subscriber's queue does with a new item when it is full
+
+    @since v3.16.0
+    """
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    BLOCK = 'block'
+
+
+class Subscriber(object):
+
+    """
+    Delivery state for a subscribed callback. Each subscriber has
+    its own bounded queue of pending items and a limit on how many
+    of them may be handled at once, so a slow subscriber can only
+    hold up its own deliveries.
+
+    @since v3.16.0
+    """
+
+    def __init__(self, callback, queue_size=1000, overflow=Overflow.DROP_OLDEST,
+                 concurrency=1, pacing=None, event_filter=None, asynchronous=False):
+        """
+        Constructor
+
+        Params:
+            Callable callback: the subscribed callback
+            int queue_size: the most items that may wait for delivery,
+                or 0 for no limit
+            Overflow overflow: what to do with new items when the
+                queue is full
+            int concurrency: the most deliveries that may run at once
+            TokenBucket pacing: optional rate limit for deliveries
+            EventFilter event_filter: optional filter events must pass
+                to be delivered
+            bool asynchronous: whether the callback returns an awaitable
+                to be run on an event loop
+        """
+        self.callback = callback
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.concurrency = max(1, int(concurrency))
+        self.pacing = pacing
+        self.event_filter = event_filter
+        self.asynchronous = asynchronous
+        self.pending = deque()
+        self.active = 0
+        self.dropped = 0
+        self._lock = threading.Condition()
+
+    def offer(self, item, block=True):
+        """
+        Queues an item for delivery, applying the overflow policy
+        if the queue is full. With Overflow.BLOCK, this waits until
+        there is space in the queue, unless waiting is not allowed,
+        in which case the item is dropped.
+
+        Params:
+            mixed item: the Event (or list of Events) to deliver
+            bool block: whether the caller may wait for space
+
+        Returns:
+            bool: whether a new drain of the queue should be started
+        """
+        with self._lock:
+            while self.queue_size > 0 and len(self.pending) >= self.queue_size:
+                if self.overflow == Overflow.BLOCK and block:
+                    self._lock.wait()
+                elif self.overflow != Overflow.DROP_OLDEST:
+                    self.dropped += 1
+                    return False
+                else:
+                    self.pending.popleft()
+                    self.dropped += 1
+
+            self.pending.append(item)
+
+            if self.active < self.concurrency:
+                self.active += 1
+                return True
+
+            return False
+
+    def accepts(self, event):
+        """
+        Whether an event passes the subscriber's filter
+
+        Params:
+            Event event
+
+        Returns:
+            bool
+        """
+        return self.event_filter is None or self.event_filter.matches(event)
+
+    def take(self):
+        """
+        Takes the next item to deliver. When the queue is empty,
+        the caller's drain ends and its concurrency slot is released.
+
+        Returns:
+            mixed: the next item, or None if the queue is empty
+        """
+        with self._lock:
+            if self.pending:
+                item = self.pending.popleft()
+                self._lock.notify()
+                return item
+
+            self.active -= 1
+            return None
+
+
+def get_subscriber_options(plugin, settings=None):
+    """
+    Reads the routing options for a plugin's subscriptions from the
+    routing section of notifying.conf, which is keyed by the full
+    classpath of the plugin:
+
+    routing:
+        heartbeat.pluggable.pushbullet.NotePush:
+            rate: 0.5
+            burst: 5
+            queue_size: 100
+            overflow: drop-oldest
+            concurrency: 1
+            filter:
+                host: "web*"
+                payload:
+                    ip_type: WAN
+
+    Params:
+        Plugin plugin: the plugin to read the options of
+        ConfigManager settings: defaults to the global configuration
+
+    Returns:
+        dict: keyword arguments for EventRouter.attach
+    """
+    if settings is None:
+        settings = get_config_manager()
+
+    options = {}
+    classpath = plugin.__class__.__module__ + "." + plugin.__class__.__name__
+
+    if settings.notifying is None or settings.notifying.routing is None:
+        return options
+
+    if classpath not in settings.notifying.routing:
+        return options
+
+    config = getattr(settings.notifying.routing, classpath)
+    if config.rate is not None:
+        options['pacing'] = TokenBucket(
+            config.rate,
+            config.burst if config.burst is not None else 1
+            )
+
+    if config.queue_size is not None:
+        options['queue_size'] = config.queue_size
+
+    if config.overflow is not None:
+        options['overflow'] = Overflow(config.overflow)
+
+    if config.concurrency is not None:
+        options['concurrency'] = config.concurrency
+
+    if config.filter is not None:
+        payload = config.filter.payload
+        options['event_filter'] = EventFilter(
+            host=config.filter.host,
+            source=config.filter.source,
+            title=config.filter.title,
+            payload=dict(payload.items()) if payload is not None else None
+            )
+
+    return options
+
+
+class EventWindow(object):
+
+    """
+    A bounded index of when events were last seen, for suppressing
+    repeats of an event within a time window. Entries are kept in
+    the order they were last seen, so expired entries and, past the
+    size limit, the least recently seen entries are evicted from the
+    front of the index in constant time.
+
+    @since v3.16.0
+    """
+
+    def __init__(self, ttl=7200, max_entries=10000):
+        """
+        Constructor
+
+        Params:
+            float ttl: seconds an entry is kept after it was last seen
+            int max_entries: the most entries the index may hold
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def last_seen(self, key):
+        """
+        Returns when an event was last seen
+
+        Params:
+            str key: the event's hash
+
+        Returns:
+            float: timestamp, or None if the event is not in the index
+        """
+        return self._entries.get(key)
+
+    def touch(self, key, when=None):
+        """
+        Records that an event was seen, evicting entries that have
+        expired or no longer fit. Entries are kept in the order they
+        were touched and expire oldest first, so when must come from
+        the local clock rather than from the event, whose time may be
+        skewed or invalid.
+
+        Params:
+            str key: the event's hash
+            float when: the local time the event was seen at,
+                defaulting to now
+
+        Returns:
+            str[]: the keys of evicted entries
+        """
+        if when is None:
+            when = time()
+
+        with self._lock:
+            self._entries[key] = when
+            self._entries.move_to_end(key)
+            return self._evict(when)
+
+    def evict(self, now=None):
+        """
+        Evicts expired entries
+
+        Params:
+            float now: the current timestamp
+
+        Returns:
+            str[]: the keys of evicted entries
+        """
+        if now is None:
+            now = time()
+
+        with self._lock:
+            return self._evict(now)
+
+    def _evict(self, now):
+        evicted = []
+        entries = self._entries
+
+        while len(entries) > self.max_entries:
+            evicted.append(entries.popitem(last=False)[0])
+
+        oldest = now - self.ttl
+        while entries:
+            key = next(iter(entries))
+            if entries[key] > oldest:
+                break
+            del(entries[key])
+            evicted.append(key)
+
+        return evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_limiter_options(settings=None):
+    """
+    Reads the rate limiting options from the rate_limiting section
+    of heartbeat.conf:
+
+    rate_limiting:
+        strategies:
+            warning: window
+        windows:
+            warning: 3600
+        max_entries: 10000
+
+    Params:
+        ConfigManager settings: defaults to the global configuration
+
+    Returns:
+        dict: keyword arguments for RateLimitHandler
+    """
+    if settings is None:
+        settings = get_config_manager()
+
+    options = {}
+    config = settings.heartbeat.rate_limiting
+    if config is None:
+        return options
+
+    if config.strategies is not None:
+        strategies = dict(RateLimitHandler.default_strategies)
+        for t in Topics:
+            name = t.name.lower()
+            if name in config.strategies:
+                strategies[t] = getattr(config.strategies, name)
+        options['topic_strategies'] = strategies
+
+    if config.windows is not None:
+        options['windows'] = {}
+        for t in Topics:
+            name = t.name.lower()
+            if name in config.windows:
+                options['windows'][t] = getattr(config.windows, name)
+
+    if config.default_window is not None:
+        options['default_window'] = config.default_window
+
+    if config.max_entries is not None:
+        options['max_entries'] = config.max_entries
+
+    return options
 
 
 class RateLimitHandler(object):
@@ -14,28 +585,55 @@ class RateLimitHandler(object):
     Handles rate limiting events
     """
 
-    def __init__(self, topic_strategies=None, event_cache=None, time_cache=None):
+    # Strategies which may be selected by name in topic_strategies
+    strategy_names = {
+        'always': 'always_allow',
+        'different': 'event_different_from_previous',
+        'window': 'event_outside_window'
+    }
+
+    # Length of the sha512 event digests cached before v3.16.0
+    legacy_digest_length = 128
+
+    default_strategies = {
+        Topics.WARNING: 'different',
+        Topics.INFO: 'different',
+        Topics.DEBUG: 'different',
+        Topics.VIRT: 'different',
+        Topics.HEARTBEAT: 'always',
+        Topics.STARTUP: 'always',
+        Topics.ACK: 'always'
+    }
+
+    def __init__(self, topic_strategies=None, event_cache=None, time_cache=None,
+                 flush_interval=30, timer=None, windows=None, default_window=7200,
+                 max_entries=10000):
         """
         Constructor
 
         Params:
-            dict() strategies: mapping of event types to limit strategies
+            dict() strategies: mapping of event types to limit strategies,
+                either as methods or as names from strategy_names
             Cache event_cache
             Cache time_cache
+            int flush_interval: seconds between writes of changed caches
+                to disk, or 0 to write them on every logged event
+            BackgroundTimer timer: Timer instance for flushing the caches
+            dict(Topic: float) windows: seconds within which a repeat of an
+                event is suppressed by the window strategy, per topic
+            float default_window: window for topics not in windows
+            int max_entries: the most events the window strategy (and the
+                time cache) remembers
         """
 
         if topic_strategies is None:
-            topic_strategies = {
-                Topics.WARNING: self.event_different_from_previous,
-                Topics.INFO: self.event_different_from_previous,
-                Topics.DEBUG: self.event_different_from_previous,
-                Topics.VIRT: self.event_different_from_previous,
-                Topics.HEARTBEAT: self.always_allow,
-                Topics.STARTUP: self.always_allow,
-                Topics.ACK: self.always_allow
-            }
+            topic_strategies = self.default_strategies
 
-        self.topic_strategies = topic_strategies
+        self.topic_strategies = {}
+        for topic, strategy in topic_strategies.items():
+            if isinstance(strategy, str):
+                strategy = getattr(self, self.strategy_names[strategy])
+            self.topic_strategies[topic] = strategy
 
         if event_cache is None:
             event_cache = Cache('EventServerevent-previous-cache')
@@ -47,6 +645,20 @@ class RateLimitHandler(object):
 
         self.time_cache = time_cache
 
+        self.windows = windows if windows is not None else {}
+        self.default_window = default_window
+        self.window = EventWindow(
+            max([default_window] + list(self.windows.values())),
+            max_entries
+            )
+        self._drop_legacy_digests()
+        self._load_window()
+
+        if timer is None and flush_interval > 0:
+            timer = BackgroundTimer(flush_interval, True, self.flush)
+
+        self.timer = timer
+
     def always_allow(self, event):
         return True
 
@@ -70,14 +682,25 @@ class RateLimitHandler(object):
         delay_passed = True
 
         if (self.time_cache.exists(event.__hash__())):
-            lastSeen = datetime.datetime.fromtimestamp(
-                self.time_cache.read(event.__hash__())
-                )
-            two_hours_ago = datetime.timedelta(hours=2)
-            delay_passed = (datetime.datetime.now() - lastSeen) > two_hours_ago
+            last_seen = self.time_cache.read(event.__hash__())
+            delay_passed = (time() - last_seen) > 7200
 
         return delay_passed
 
+    def event_outside_window(self, event):
+        """
+        Checks that the same event was not seen within the window
+        configured for its topic
+
+        @since v3.16.0
+        """
+        last_seen = self.window.last_seen(event.__hash__())
+        if last_seen is None:
+            return True
+
+        window = self.windows.get(event.type, self.default_window)
+        return (time() - last_seen) >= window
+
     def allow_event(self, event):
         """
         Whether an event should be allowed to be pushed
@@ -102,12 +725,471 @@ class RateLimitHandler(object):
     def log_event(self, event):
         """
         Stores the event time and logs the event as the latest
-        from the particular monitor (no duplicate events in a row)
+        from the particular monitor (no duplicate events in a row).
+        As of v3.16.0 the time stored is when the event was seen
+        here, as the event's own time may come from another clock.
+        """
+        event_hash = event.__hash__()
+        now = time()
+        self.time_cache.write(event_hash, now)
+        self.event_cache.write(event.source, event_hash)
+
+        for key in self.window.touch(event_hash, now):
+            self._forget(key)
+
+        if self.timer is None:
+            self.flush()
+        else:
+            self.timer.start()
+
+    def _drop_legacy_digests(self):
+        """
+        Removes events cached under their old sha512 digests, which
+        current events can never match. At worst, this lets through
+        one repeat of an event seen before upgrading.
+        """
+        for source, digest in list(self.event_cache.items()):
+            if isinstance(digest, str) and len(digest) == self.legacy_digest_length:
+                self.event_cache.remove(source)
+
+        for key in list(self.time_cache.keys()):
+            if len(key) == self.legacy_digest_length:
+                self._forget(key)
+
+    def _load_window(self):
         """
-        self.time_cache.write(event.__hash__(), event.when)
-        self.event_cache.write(event.source, event.__hash__())
-        self.time_cache.writeToDisk()
-        self.event_cache.writeToDisk()
+        Loads the event window from the time cache, dropping
+        cached times which have expired, no longer fit or aren't
+        valid. Times ahead of the local clock are taken as now.
+        """
+        now = time()
+        entries = []
+        for key, when in self.time_cache.items():
+            try:
+                when = float(when)
+            except (TypeError, ValueError):
+                when = None
+
+            if when is None or when != when:
+                self._forget(key)
+            else:
+                entries.append((min(when, now), key))
+
+        entries.sort()
+        for when, key in entries:
+            self.window.touch(key, when)
+
+        self.window.evict(now)
+        for when, key in entries:
+            if self.window.last_seen(key) is None:
+                self._forget(key)
+
+    def _forget(self, key):
+        """
+        Removes an event's time from the time cache
+        """
+        if self.time_cache.exists(key):
+            self.time_cache.remove(key)
+
+    def flush(self):
+        """
+        Writes any changes to the caches out to disk
+        """
+        for key in self.window.evict():
+            self._forget(key)
+
+        self.time_cache.flush()
+        self.event_cache.flush()
+
+    def halt(self):
+        """
+        Stops the background flush and writes out any
+        remaining changes
+        """
+        if self.timer is not None:
+            self.timer.stop()
+        self.flush()
+
+
+class EventCoalescer(object):
+
+    """
+    Groups repeats of an event within a window into a single
+    summary, so that a flapping host produces notifications in
+    proportion to its problems rather than to its raw event count.
+
+    The first event of a group is dispatched straight away. Repeats
+    within the window are absorbed, and when the window closes a
+    summary event is emitted carrying how many times the event was
+    seen, when it was first and last seen and the hosts affected.
+    Events repeat one another when they have the same title,
+    message, source and topic (and host, when grouping by host).
+
+    @since v3.16.0
+    """
+
+    default_topics = (Topics.WARNING, Topics.INFO, Topics.DEBUG, Topics.VIRT)
+
+    def __init__(self, window=60, topics=None, by_host=False, emit=None,
+                 clock=time, timer=None):
+        """
+        Constructor
+
+        Params:
+            float window: seconds from an event's first occurrence
+                during which repeats are absorbed
+            list topics: the topics to coalesce. Heartbeats and acks
+                are left alone by default, as other plugins count them
+            bool by_host: whether to group events from each host
+                separately rather than summarizing hosts together
+            Function emit: called with each summary event
+            Function clock: returns the current time, in seconds
+            BackgroundTimer timer: timer for closing windows
+        """
+        if topics is None:
+            topics = self.default_topics
+
+        self.window = window
+        self.topics = frozenset(topics)
+        self.by_host = by_host
+        self.emit = emit
+        self.clock = clock
+        self.groups = OrderedDict()
+        self._lock = threading.Lock()
+
+        if timer is None:
+            timer = BackgroundTimer(window / 2.0, False, self.sweep)
+
+        self.timer = timer
+
+    def add(self, event):
+        """
+        Offers an event to the coalescer
+
+        Params:
+            Event event
+
+        Returns:
+            bool: whether the event should be dispatched now, rather
+                than being absorbed into a summary
+        """
+        if event.type not in self.topics or 'coalesced' in event.payload:
+            return True
+
+        key = self._key(event)
+        now = self.clock()
+
+        with self._lock:
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = {
+                    'event': event,
+                    'count': 1,
+                    'first_seen': now,
+                    'last_seen': now,
+                    'hosts': OrderedDict(((event.host, True),))
+                    }
+                self.timer.start()
+                return True
+
+            group['count'] += 1
+            group['last_seen'] = now
+            group['hosts'][event.host] = True
+            return False
+
+    def sweep(self, everything=False):
+        """
+        Closes the windows which have run out, emitting a summary
+        for each group that had repeats
+
+        Params:
+            bool everything: close every window, regardless of age
+        """
+        closed = []
+        cutoff = self.clock() - self.window
+        with self._lock:
+            while self.groups:
+                key, group = next(iter(self.groups.items()))
+                if not everything and group['first_seen'] > cutoff:
+                    break
+                del self.groups[key]
+                closed.append(group)
+
+            if self.groups:
+                self.timer.start()
+
+        for group in closed:
+            if group['count'] > 1:
+                self.emit(self.summarize(group))
+
+    def summarize(self, group):
+        """
+        Builds the summary event for a group of repeats
+
+        Params:
+            dict group
+
+        Returns:
+            Event
+        """
+        first = group['event']
+        hosts = list(group['hosts'])
+
+        summary = Event(
+            first.title,
+            "%s (seen %d times)" % (first.message, group['count']),
+            first.host if len(hosts) == 1 else "%d hosts" % len(hosts),
+            first.type,
+            first.source
+            )
+        summary.payload = dict(first.payload)
+        summary.payload['coalesced'] = {
+            'count': group['count'],
+            'first_seen': group['first_seen'],
+            'last_seen': group['last_seen'],
+            'hosts': hosts
+            }
+
+        return summary
+
+    def halt(self):
+        """
+        Stops the timer and emits summaries for every open window
+        """
+        self.timer.stop()
+        self.sweep(everything=True)
+
+    def _key(self, event):
+        key = (event.title, event.message, event.source, event.type)
+        if self.by_host:
+            key += (event.host,)
+
+        return key
+
+
+def get_coalescer_options(settings=None):
+    """
+    Reads the event coalescing options from the coalescing section
+    of heartbeat.conf:
+
+    coalescing:
+        window: 60
+        topics:
+            - warning
+        by_host: no
+
+    Params:
+        ConfigManager settings: defaults to the global configuration
+
+    Returns:
+        dict: keyword arguments for EventCoalescer, or None if
+            coalescing is not configured
+    """
+    if settings is None:
+        settings = get_config_manager()
+
+    config = settings.heartbeat.coalescing
+    if config is None:
+        return None
+
+    options = {}
+    if config.window is not None:
+        options['window'] = config.window
+
+    if config.topics is not None:
+        options['topics'] = [Topics[name.upper()] for name in config.topics]
+
+    if config.by_host is not None:
+        options['by_host'] = config.by_host
+
+    return options
+
+
+class TopicPriorityQueue(object):
+
+    """
+    The router's event queue, ordered by topic so that a WARNING
+    isn't stuck behind a backlog of HEARTBEAT and DEBUG events.
+    Events of the same topic stay in the order they were put.
+
+    To keep low priority topics from starving while higher ones
+    are busy, an event gains one level of priority for every
+    `aging` seconds it has waited.
+
+    Provides the parts of the queue.Queue interface the router uses.
+
+    @since v3.16.0
+    """
+
+    default_order = (
+        Topics.WARNING,
+        Topics.STARTUP,
+        Topics.ACK,
+        Topics.INFO,
+        Topics.VIRT,
+        Topics.HEARTBEAT,
+        Topics.DEBUG
+        )
+
+    def __init__(self, order=None, aging=2, clock=monotonic):
+        """
+        Constructor
+
+        Params:
+            list order: topics, highest priority first. Topics which
+                are left out follow in their default order
+            float aging: seconds an event waits to gain one level of
+                priority. 0 disables aging
+            Function clock: returns the current time, in seconds
+        """
+        if order is None:
+            order = self.default_order
+
+        order = list(order)
+        order += [t for t in self.default_order if t not in order]
+        order += [t for t in Topics if t not in order]
+
+        self.order = order
+        self.aging = aging
+        self.clock = clock
+        self._queues = [deque() for t in order]
+        self._rank = dict((t, i) for i, t in enumerate(order))
+        self._size = 0
+        self._unfinished = 0
+        self._lock = threading.Condition()
+
+    def put(self, event):
+        """
+        Queues an event
+
+        Params:
+            Event event
+        """
+        with self._lock:
+            self._queues[self._rank[event.type]].append((self.clock(), event))
+            self._size += 1
+            self._unfinished += 1
+            self._lock.notify()
+
+    def get(self, block=True, timeout=None):
+        """
+        Takes the event with the highest priority, counting the
+        priority it has gained by waiting
+
+        Params:
+            bool block: whether to wait for an event if there is none
+            float timeout: the longest to wait, in seconds
+
+        Returns:
+            Event
+
+        Raises:
+            queue.Empty: if no event became available
+        """
+        return self.get_timed(block, timeout)[1]
+
+    def get_timed(self, block=True, timeout=None):
+        """
+        Takes the event with the highest priority, along with how
+        long it waited in the queue
+
+        Params:
+            bool block: whether to wait for an event if there is none
+            float timeout: the longest to wait, in seconds
+
+        Returns:
+            tuple(float, Event): the seconds waited, and the event
+
+        Raises:
+            queue.Empty: if no event became available
+        """
+        with self._lock:
+            if not self._lock.wait_for(lambda: self._size > 0,
+                                       timeout if block else 0):
+                raise Empty
+
+            selected = self._select()
+            self._size -= 1
+            queued, event = self._queues[selected].popleft()
+            return self.clock() - queued, event
+
+    def _select(self):
+        """
+        Finds the queue whose first event has the highest priority
+        """
+        now = self.clock()
+        selected = None
+        best = None
+        for rank, q in enumerate(self._queues):
+            if not q:
+                continue
+
+            if not self.aging:
+                return rank
+
+            priority = rank - (now - q[0][0]) / self.aging
+            if best is None or priority < best:
+                selected = rank
+                best = priority
+
+        return selected
+
+    def task_done(self):
+        """
+        Marks a taken event as handled
+        """
+        with self._lock:
+            if self._unfinished <= 0:
+                raise ValueError("task_done() called too many times")
+            self._unfinished -= 1
+            self._lock.notify_all()
+
+    def join(self):
+        """
+        Waits until every queued event has been handled
+        """
+        with self._lock:
+            self._lock.wait_for(lambda: self._unfinished == 0)
+
+    def qsize(self):
+        return self._size
+
+    def empty(self):
+        return self._size == 0
+
+
+def get_queue_options(settings=None):
+    """
+    Reads the event queue options from the event_priority section
+    of heartbeat.conf:
+
+    event_priority:
+        order:
+            - warning
+            - startup
+        aging: 2
+
+    Params:
+        ConfigManager settings: defaults to the global configuration
+
+    Returns:
+        dict: keyword arguments for TopicPriorityQueue
+    """
+    if settings is None:
+        settings = get_config_manager()
+
+    options = {}
+    config = settings.heartbeat.event_priority
+    if config is None:
+        return options
+
+    if config.order is not None:
+        options['order'] = [Topics[name.upper()] for name in config.order]
+
+    if config.aging is not None:
+        options['aging'] = config.aging
+
+    return options
 
 
 class EventRouter(object):
@@ -117,7 +1199,12 @@ class EventRouter(object):
     of the event.
     """
 
-    def __init__(self, threadpool, limiter=None, logger=None):
+    # Whether routing may wait for space in a full subscriber queue
+    # with the block overflow policy (@since v3.16.0)
+    block_on_full = True
+
+    def __init__(self, threadpool, limiter=None, logger=None, queue=None,
+                 metrics=None, coalescer=None, history=None):
         """
         Constructor
 
@@ -126,6 +1213,16 @@ class EventRouter(object):
             Func limit_strategy: the function to call when checking if an event
                 should be thrown or not. None defaults to monitor-based
                 (doesn't throw the same event twice in a row from a monitor)
+            TopicPriorityQueue queue: the queue of events waiting to be
+                dispatched. Defaults to the default topic priorities.
+                Other queues (such as queue.Queue) work too, though
+                how long events waited is then not measured
+            MetricsRegistry metrics: where to record the router's
+                metrics. Defaults to a registry of its own
+            EventCoalescer coalescer: optionally groups repeated events
+                into summaries, after rate limiting
+            EventBuffer history: optionally records each event as it
+                is dispatched
         """
         if (logger is None):
             self.logger = logging.getLogger(
@@ -138,16 +1235,81 @@ class EventRouter(object):
         for t in Topics:
             self.topics[t] = []
 
+        self.subscribers = {}
+        self.batches = {}
+        self.batch_topics = {}
+        for t in Topics:
+            self.batch_topics[t] = []
+
         if (limiter is None):
             limiter = RateLimitHandler()
 
         self.limiter = limiter
-        self.queue = Queue()
+
+        if (queue is None):
+            queue = TopicPriorityQueue()
+
+        self.queue = queue
         self.worker_running = False
+        self._worker_lock = threading.Lock()
 
         self.threadpool = threadpool
 
-    def attach(self, topic, callback):
+        if (metrics is None):
+            metrics = MetricsRegistry()
+
+        self.metrics = metrics
+        self._setup_metrics()
+
+        self.coalescer = coalescer
+        if (coalescer is not None):
+            coalescer.emit = self._enqueue
+
+        self.history = history
+
+    def _setup_metrics(self):
+        """
+        Creates the router's metrics, keeping those recorded for
+        every event at hand so they aren't looked up each time
+        """
+        metrics = self.metrics
+        self._accepted = {}
+        self._rejected = {}
+        for t in Topics:
+            self._accepted[t] = metrics.counter('limiter_accepted', topic=t.name)
+            self._rejected[t] = metrics.counter('limiter_rejected', topic=t.name)
+
+        self._dispatch_latency = metrics.histogram('dispatch_latency_seconds')
+        self._depth = metrics.histogram(
+            'queue_depth_on_put', Histogram.size_buckets)
+        self._pool_wait = metrics.histogram('threadpool_wait_seconds')
+        self._coalesced = metrics.counter('events_coalesced')
+        self._handler_time = {}
+        # Callbacks mapped to the names their metrics are kept under
+        self._names = {}
+        self._names_lock = threading.Lock()
+
+        metrics.gauge('queue_depth', lambda: self.queue.qsize())
+        metrics.gauge('threadpool_busy', self._busy_workers)
+        metrics.gauge(
+            'threadpool_workers',
+            lambda: getattr(self.threadpool, '_max_workers', None)
+            )
+
+    def _busy_workers(self):
+        """
+        Returns:
+            int: the threadpool workers delivering to subscribers or
+                running the router's worker
+        """
+        busy = int(self.worker_running)
+        for s in list(self.subscribers.values()):
+            if not s.asynchronous:
+                busy += s.active
+
+        return busy
+
+    def attach(self, topic, callback, pacing=None, **options):
         """
         Allows other systems to subscribe to events
         of different topics.
@@ -156,9 +1318,136 @@ class EventRouter(object):
             Topic topic: topic to subscribe to
             Callable callback: Method to call when a new event of the topic
                 is received
+            TokenBucket pacing: optional rate limit for calls to the
+                callback, which may be shared between callbacks
+            options: queue_size, overflow, concurrency and event_filter
+                for the callback's Subscriber
         """
         self.logger.debug("%s has subscribed to %s", str(callback), str(topic))
         self.topics[topic].append(callback)
+        self._add_subscriber(callback, pacing, options)
+
+    def _add_subscriber(self, callback, pacing, options):
+        """
+        Sets up delivery to a callback, the first time it is attached
+        """
+        if callback not in self.subscribers:
+            self.subscribers[callback] = Subscriber(
+                callback,
+                pacing=pacing,
+                **options
+                )
+            self._handler_time[callback] = self.metrics.histogram(
+                'handler_seconds',
+                subscriber=self._describe(callback)
+                )
+
+    def _describe(self, callback):
+        """
+        Names a callback for its metrics, as Class.method for
+        plugin methods. Callbacks which would share a name, such as
+        the same method of two instances of a plugin, are numbered
+        in the order they were first described (Class.method#2).
+        """
+        with self._names_lock:
+            name = self._names.get(callback)
+            if name is not None:
+                return name
+
+            base = getattr(callback, '__name__', str(callback))
+            owner = getattr(callback, '__self__', None)
+            if owner is not None:
+                base = owner.__class__.__name__ + "." + base
+
+            taken = set(self._names.values())
+            name = base
+            n = 1
+            while name in taken:
+                n += 1
+                name = "%s#%d" % (base, n)
+
+            self._names[callback] = name
+
+        return name
+
+    def attach_batch(self, topic, callback, max_size=10, max_latency=5,
+                     pacing=None, **options):
+        """
+        Subscribes a callback to receive events of a topic in batches.
+        The callback is called with a list of events when max_size
+        events have accumulated or the oldest has waited max_latency
+        seconds, whichever comes first. A callback attached to several
+        topics shares a single batch between them.
+
+        @since v3.16.0
+
+        Params:
+            Topic topic: topic to subscribe to
+            Callable callback: method to call with a list of events
+            int max_size: the largest number of events in a batch
+            float max_latency: the longest an event may wait, in seconds
+            TokenBucket pacing: optional rate limit for calls to the
+                callback
+            options: queue_size, overflow, concurrency and event_filter
+                for the callback's Subscriber
+        """
+        self.logger.debug(
+            "%s has subscribed to batches of %s", str(callback), str(topic))
+
+        if callback not in self.batches:
+            self.batches[callback] = EventBatch(
+                callback,
+                self._submit,
+                max_size,
+                max_latency
+                )
+
+        self.batch_topics[topic].append(self.batches[callback])
+        self._add_subscriber(callback, pacing, options)
+
+    def detach(self, callback):
+        """
+        Unsubscribes a callback from every topic it is subscribed to,
+        one at a time or in batches. Events already waiting in its
+        batch are handed off first, and any already queued for it
+        are still delivered.
+
+        @since v3.16.0
+
+        Params:
+            Callable callback: the callback to unsubscribe
+        """
+        self.logger.debug("%s has unsubscribed", str(callback))
+
+        # The lists are replaced rather than changed, as the worker
+        # may be part way through one
+        for t in Topics:
+            if callback in self.topics[t]:
+                self.topics[t] = [c for c in self.topics[t] if c != callback]
+
+        batch = self.batches.pop(callback, None)
+        if batch is not None:
+            for t in Topics:
+                if batch in self.batch_topics[t]:
+                    self.batch_topics[t] = [
+                        b for b in self.batch_topics[t] if b is not batch
+                        ]
+            batch.flush()
+
+        self.subscribers.pop(callback, None)
+
+    def halt(self):
+        """
+        Hands off any events waiting in batches and writes out
+        the rate limiter's state
+        """
+        if self.coalescer is not None:
+            self.coalescer.halt()
+
+        for b in self.batches.values():
+            b.flush()
+
+        self.limiter.halt()
 
     def put_event(self, event):
         """
@@ -170,38 +1459,184 @@ class EventRouter(object):
         self.logger.info("Event Generated: %s", event.__str__())
         if (self.limiter.allow_event(event)):
             self.logger.debug("Dispatching Event")
-            self.queue.put(event)
-            self._start_worker()
+            self._accepted[event.type].inc()
+            if self.coalescer is not None and not self.coalescer.add(event):
+                self._coalesced.inc()
+                self.logger.debug("Coalescing repeated event")
+                return
+
+            self._enqueue(event)
         else:
+            self._rejected[event.type].inc()
             self.logger.debug(
                 "Skipping dispatch per limit strategy")
 
+    def _enqueue(self, event):
+        """
+        Queues an event for dispatch, starting the worker if needed
+
+        Params:
+            Event event
+        """
+        self._depth.observe(self.queue.qsize())
+        self.queue.put(event)
+        self._start_worker()
+
     def _forward_event(self, event):
         """
         Forwards an event to all the handlers subscribed to
         the topic the event is categorized as
         """
+        if self.history is not None:
+            self.history.append(event)
+
+        subscribers = self.subscribers
         for t in self.topics[event.type]:
-            f = self.threadpool.submit(t, event)
+            subscriber = subscribers.get(t)
+            if subscriber is not None and subscriber.accepts(event):
+                self._submit(t, event)
+
+        for b in self.batch_topics[event.type]:
+            subscriber = subscribers.get(b.callback)
+            if subscriber is not None and subscriber.accepts(event):
+                b.add(event)
+
+    def _submit(self, callback, item):
+        """
+        Queues an item for a subscriber, starting a drain of its
+        queue in the threadpool if it is below its concurrency limit
+
+        Params:
+            Callable callback: the subscriber
+            mixed item: the Event (or list of Events) to pass to it
+        """
+        subscriber = self.subscribers.get(callback)
+        if subscriber is None:
+            # Detached since the item was routed to it
+            return
+
+        dropped = subscriber.dropped
+
+        if subscriber.offer(item, self.block_on_full):
+            f = self.threadpool.submit(self._drain, subscriber, monotonic())
+            f.add_done_callback(self._check_call_status)
+
+        if subscriber.dropped != dropped:
+            self._count_dropped(callback, subscriber.dropped - dropped)
+            self.logger.debug(
+                "Queue for %s is full, %d dropped so far",
+                str(callback),
+                subscriber.dropped
+                )
+
+    def _count_dropped(self, callback, count):
+        self.metrics.counter(
+            'subscriber_dropped',
+            subscriber=self._describe(callback)
+            ).inc(count)
+
+    def _drain(self, subscriber, submitted=None, item=None):
+        """
+        Delivers items from a subscriber's queue until it is empty.
+        When a paced subscriber has to wait for a token, the drain
+        is rescheduled on a timer rather than holding a worker.
+
+        Params:
+            Subscriber subscriber
+            float submitted: when the drain was submitted to the
+                threadpool, to measure how long it waited for a worker
+            mixed item: an item already taken from the queue, whose
+                token has been reserved, to deliver first
+        """
+        if submitted is not None:
+            self._pool_wait.observe(monotonic() - submitted)
+
+        handler_time = self._handler_time[subscriber.callback]
+        reserved = item is not None
+        if item is None:
+            item = subscriber.take()
+        while item is not None:
+            if subscriber.pacing is not None and not reserved:
+                delay = subscriber.pacing.reserve()
+                if delay > 0:
+                    self._defer_drain(subscriber, item, delay)
+                    return
+            reserved = False
+
+            started = monotonic()
+            try:
+                subscriber.callback(item)
+            except Exception as error:
+                self._log_handler_error(error)
+
+            handler_time.observe(monotonic() - started)
+            item = subscriber.take()
+
+    def _defer_drain(self, subscriber, item, delay):
+        """
+        Resumes a subscriber's drain in the threadpool once its
+        token is usable. The drain keeps its concurrency slot in
+        the meantime, so deliveries stay in order.
+
+        Params:
+            Subscriber subscriber
+            mixed item: the item to deliver first
+            float delay: seconds until the item may be delivered
+        """
+        def resume():
+            try:
+                f = self.threadpool.submit(self._drain, subscriber, None, item)
+            except RuntimeError:
+                # The threadpool has been shut down
+                return
             f.add_done_callback(self._check_call_status)
 
+        BackgroundTimer(delay, False, resume).start()
+
     def _event_queue_worker(self):
         """
-        Worker method to be run in a thread to process the event queue
+        Worker method to be run in a thread to process the event queue.
+        The queue is drained as fast as events can be handed off to the
+        threadpool; subscribers needing a slower pace are paced
+        individually.
         """
-        while not self.queue.empty():
-            item = self.queue.get()
-            self._forward_event(item)
-            self.queue.task_done()
-            sleep(3)
+        get_timed = getattr(self.queue, 'get_timed', None)
+        try:
+            while True:
+                with self._worker_lock:
+                    if self.queue.empty():
+                        self.worker_running = False
+                        break
+
+                if get_timed is None:
+                    item = self.queue.get()
+                else:
+                    waited, item = get_timed()
+                    self._dispatch_latency.observe(waited)
+                try:
+                    self._forward_event(item)
+                except Exception as error:
+                    # Carry on with the rest of the queue
+                    self._log_handler_error(error)
+                finally:
+                    self.queue.task_done()
+        except BaseException:
+            # Let the next event start a worker again
+            with self._worker_lock:
+                self.worker_running = False
+            raise
+
         self.logger.debug("Event queue is empty, router worker shutting down")
-        self.worker_running = False
 
     def _start_worker(self):
-        if self.worker_running is not True:
+        with self._worker_lock:
+            if self.worker_running:
+                return
             self.worker_running = True
-            self.logger.debug("Starting event router worker")
-            self.threadpool.submit(self._event_queue_worker)
+
+        self.logger.debug("Starting event router worker")
+        f = self.threadpool.submit(self._event_queue_worker)
+        f.add_done_callback(self._check_call_status)
 
     def _check_call_status(self, f):
         """
@@ -218,12 +1653,21 @@ class EventRouter(object):
         if error is None:
             return
         else:
-            try:
-                framesummary = traceback.extract_tb(error.__traceback__)[-1]
-                location = "{:s}:{:d}".format(framesummary.filename, framesummary.lineno)
-            except (AttributeError, IndexError):
-                location = " -- "
-            self.logger.error("Handler: %s at %s", str(error), location)
+            self._log_handler_error(error)
+
+    def _log_handler_error(self, error):
+        """
+        Logs an exception raised by a handler
+
+        Params:
+            Exception error
+        """
+        try:
+            framesummary = traceback.extract_tb(error.__traceback__)[-1]
+            location = "{:s}:{:d}".format(framesummary.filename, framesummary.lineno)
+        except (AttributeError, IndexError):
+            location = " -- "
+        self.logger.error("Handler: %s at %s", str(error), location)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+"""
+Event routing for the asyncio runtime
+
+@since v3.16.0
+"""
+import asyncio
+from time import monotonic
+
+from heartbeat.routing import EventRouter
+
+
+class AsyncEventRouter(EventRouter):
+
+    """
+    An EventRouter which runs on an event loop. The event queue is
+    drained on the loop and coroutine subscribers run as tasks on
+    it, so a subscriber waiting on the network does not hold a
+    thread. Synchronous subscribers still run in the threadpool.
+
+    Routing runs on the loop, so it never waits for space in a full
+    subscriber queue: the block overflow policy drops new events
+    instead, for synchronous and coroutine subscribers alike.
+
+    @since v3.16.0
+    """
+
+    block_on_full = False
+
+    def __init__(self, threadpool, loop, limiter=None, logger=None, queue=None,
+                 metrics=None, coalescer=None, history=None):
+        """
+        Constructor
+
+        Params:
+            Executor threadpool: threadpool for synchronous subscribers
+            AbstractEventLoop loop: the loop to route events on
+            RateLimitHandler limiter: decides which events are dispatched
+            Logger logger: logger
+            TopicPriorityQueue queue: the queue of events waiting to be
+                dispatched
+            MetricsRegistry metrics: where to record the router's metrics
+            EventCoalescer coalescer: optionally groups repeated events
+                into summaries
+            EventBuffer history: optionally records each event as it
+                is dispatched
+        """
+        super(AsyncEventRouter, self).__init__(
+            threadpool, limiter, logger, queue, metrics, coalescer, history)
+        self.loop = loop
+
+    def attach_async(self, topic, callback, pacing=None, **options):
+        """
+        Subscribes a coroutine function (or any callable returning
+        an awaitable) to events of a topic. Its concurrency limit
+        bounds the number of tasks delivering to it at once.
+
+        Params:
+            Topic topic: topic to subscribe to
+            Callable callback: the coroutine function to call with
+                each event of the topic
+            TokenBucket pacing: optional rate limit for calls to the
+                callback
+            options: queue_size, overflow, concurrency and event_filter
+                for the callback's Subscriber
+        """
+        self.attach(topic, callback, pacing, asynchronous=True, **options)
+
+    def _submit(self, callback, item):
+        """
+        Overrides EventRouter._submit to start coroutine subscribers'
+        drains on the loop. Like every queue in this router, theirs
+        can't block the loop waiting for space, so the block overflow
+        policy drops new items instead.
+        """
+        subscriber = self.subscribers.get(callback)
+        if subscriber is None or not subscriber.asynchronous:
+            return super(AsyncEventRouter, self)._submit(callback, item)
+
+        dropped = subscriber.dropped
+
+        if subscriber.offer(item, block=False):
+            # Batches are handed off from timer threads, so this
+            # may not be running on the loop
+            self.loop.call_soon_threadsafe(self._start_drain, subscriber)
+
+        if subscriber.dropped != dropped:
+            self._count_dropped(callback, subscriber.dropped - dropped)
+            self.logger.debug(
+                "Queue for %s is full, %d dropped so far",
+                str(callback),
+                subscriber.dropped
+                )
+
+    def _start_drain(self, subscriber):
+        task = self.loop.create_task(self._drain_async(subscriber))
+        task.add_done_callback(self._check_task_status)
+
+    async def _drain_async(self, subscriber):
+        """
+        Delivers items from a coroutine subscriber's queue until
+        it is empty
+
+        Params:
+            Subscriber subscriber
+        """
+        handler_time = self._handler_time[subscriber.callback]
+        item = subscriber.take()
+        while item is not None:
+            if subscriber.pacing is not None:
+                delay = subscriber.pacing.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            started = monotonic()
+            try:
+                await subscriber.callback(item)
+            except Exception as error:
+                self._log_handler_error(error)
+
+            handler_time.observe(monotonic() - started)
+
+            item = subscriber.take()
+
+    def _start_worker(self):
+        """
+        Overrides EventRouter._start_worker to drain the event
+        queue on the loop rather than in the threadpool
+        """
+        with self._worker_lock:
+            if self.worker_running:
+                return
+            self.worker_running = True
+
+        self.logger.debug("Starting event router worker")
+        self.loop.call_soon_threadsafe(self._event_queue_worker)
+
+    def _check_task_status(self, task):
+        """
+        Logs the error from a task which crashed. This method is
+        intended to be submitted to the Task via add_done_callback.
+
+        Params:
+            Task task
+        """
+        if task.cancelled():
+            return
+
+        error = task.exception()
+        if error is not None:
+            self._log_handler_error(error)
@@ -31,7 +31,8 @@ class Encryptor(object):
         Encrypts a plaintext string and returns it
 
         Parameters:
-            string plaintext: A plaintext string to encrypt
+            string plaintext: A plaintext string (or, @since v3.16.0,
+                        bytes) to encrypt
             bool   base64_encode: whether to return the encrypted
                         string in base64 encoding. Default true.
             bytes  salt: A salt. Generated randomly if unspecified or None
@@ -47,7 +48,10 @@ class Encryptor(object):
         cipher = AES.new(key, AES.MODE_ECB)
         padded_plaintext = self._pad_text(plaintext)
 
-        ciphertext = cipher.encrypt(padded_plaintext.encode("UTF-8"))
+        if (isinstance(padded_plaintext, str)):
+            padded_plaintext = padded_plaintext.encode("UTF-8")
+
+        ciphertext = cipher.encrypt(padded_plaintext)
         ciphertext_with_salt = salt + ciphertext
 
         if (base64_encode):
@@ -55,7 +59,7 @@ class Encryptor(object):
         else:
             return ciphertext_with_salt
 
-    def decrypt(self, ciphertext, base64_encoded=True):
+    def decrypt(self, ciphertext, base64_encoded=True, decode=True):
         """
         Decrypts an encrypted string to plaintext and returns it
 
@@ -63,9 +67,11 @@ class Encryptor(object):
             bytes ciphertext: an encrypted string
             bool  base64_encoded: whether the ciphertext is base64 encoded.
                     Defaults to true.
+            bool  decode: whether to decode the plaintext as UTF-8
+                    (@since v3.16.0). Defaults to true.
 
         Returns:
-            string: The decrypted string
+            string: The decrypted string, or bytes if not decoded
         """
 
         if (base64_encoded):
@@ -80,6 +86,9 @@ class Encryptor(object):
 
         plaintext = self._unpad_text(padded_plaintext)
 
+        if (not decode):
+            return plaintext
+
         return plaintext.decode("UTF-8")
 
     def _pad_text(self, text):
@@ -89,16 +98,19 @@ class Encryptor(object):
         based on how much padding is necessary.
 
         Parameters:
-            string text: the plaintext string to pad
+            string text: the plaintext string (or bytes) to pad
 
         Returns:
-            string: the padded string
+            string: the padded string, or bytes if given bytes
         """
 
         extra_bytes = len(text) % self.aes_multiple
         padding_size = self.aes_multiple - extra_bytes
 
         padding = chr((padding_size + 33) % 122) * padding_size
+        if (isinstance(text, bytes)):
+            padding = padding.encode("UTF-8")
+
         padded_text = text + padding
 
         return padded_text
@@ -0,0 +1,118 @@
+import unittest
+import json
+import threading
+
+from heartbeat.events import EventBuffer, get_buffer_options
+from heartbeat.platform import ConfigManager, Event, Topics
+
+
+class EventBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = EventBuffer(3)
+
+    def event(self, title, host='cobalt', type=Topics.INFO, source='Test'):
+        return Event(title, '', host, type, source)
+
+    def titles(self, events):
+        return [e.title for e in events]
+
+    def test_append(self):
+        self.assertIsNone(self.buffer.latest())
+
+        self.buffer.append(self.event('a'))
+        self.buffer.append(self.event('b'))
+
+        self.assertEqual(2, len(self.buffer))
+        self.assertEqual('b', self.buffer.latest().title)
+        self.assertEqual(['a', 'b'], self.titles(self.buffer.query()))
+
+    def test_evicts_oldest(self):
+        for title in 'abcde':
+            self.buffer.append(self.event(title))
+
+        self.assertEqual(3, len(self.buffer))
+        self.assertEqual(['c', 'd', 'e'], self.titles(self.buffer.query()))
+        self.assertEqual({Topics.INFO: 3}, self.buffer.counts())
+
+    def test_query(self):
+        self.buffer.append(self.event('a', type=Topics.WARNING))
+        self.buffer.append(self.event('b', host='nickel'))
+        self.buffer.append(self.event('c', type=Topics.WARNING, source='Other'))
+
+        self.assertEqual(['a', 'c'], self.titles(self.buffer.query(topic=Topics.WARNING)))
+        self.assertEqual(['b'], self.titles(self.buffer.query(host='nickel')))
+        self.assertEqual(
+            ['a'],
+            self.titles(self.buffer.query(topic=Topics.WARNING, source='Test'))
+            )
+        self.assertEqual(['c'], self.titles(self.buffer.query(topic=Topics.WARNING, limit=1)))
+        self.assertEqual([], self.buffer.query(host='missing'))
+
+    def test_index_evicted(self):
+        self.buffer.append(self.event('a', host='nickel'))
+        for title in 'bcd':
+            self.buffer.append(self.event(title))
+
+        self.assertEqual([], self.buffer.query(host='nickel'))
+        self.assertNotIn('nickel', self.buffer.counts('host'))
+
+    def test_changed_event(self):
+        event = self.event('a', host='nickel')
+        self.buffer.append(event)
+        event.host = 'cobalt'
+
+        self.assertEqual([event], self.buffer.query(host='nickel'))
+        for title in 'bcd':
+            self.buffer.append(self.event(title))
+        self.assertEqual({'cobalt': 3}, self.buffer.counts('host'))
+
+    def test_clear(self):
+        self.buffer.append(self.event('a'))
+        self.buffer.clear()
+
+        self.assertEqual(0, len(self.buffer))
+        self.assertEqual([], self.buffer.query(topic=Topics.INFO))
+
+    def test_export(self):
+        self.buffer.append(self.event('a'))
+        self.buffer.append(self.event('b', type=Topics.WARNING))
+
+        exported = json.loads(self.buffer.export(topic=Topics.WARNING))
+
+        self.assertEqual(1, len(exported))
+        self.assertEqual('b', exported[0]['title'])
+        self.assertEqual('WARNING', exported[0]['type'])
+        self.assertIn('time', exported[0])
+
+    def test_concurrent_appends(self):
+        buffer = EventBuffer(100)
+        event = self.event('a')
+
+        def append():
+            for i in range(1000):
+                buffer.append(event)
+
+        threads = [threading.Thread(target=append) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(100, len(buffer))
+        self.assertEqual({Topics.INFO: 100}, buffer.counts())
+
+    def test_invalid_capacity(self):
+        self.assertRaises(Exception, EventBuffer, 0)
+
+    def test_options(self):
+        settings = ConfigManager({'heartbeat': {'event_history': {'capacity': 50}}})
+        settings.finalize()
+        disabled = ConfigManager({'heartbeat': {'event_history': {'capacity': 0}}})
+        disabled.finalize()
+        default = ConfigManager({'heartbeat': {}})
+        default.finalize()
+
+        self.assertEqual({'capacity': 50}, get_buffer_options(settings))
+        self.assertIsNone(get_buffer_options(disabled))
+        self.assertEqual({}, get_buffer_options(default))
@@ -0,0 +1,90 @@
+import unittest
+
+from heartbeat.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+class CounterTest(unittest.TestCase):
+
+    def test_inc(self):
+        c = Counter()
+        c.inc()
+        c.inc(4)
+        self.assertEqual(5, c.snapshot())
+
+
+class HistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.histogram = Histogram([1, 2, 5, 10])
+
+    def test_snapshot_empty(self):
+        snapshot = self.histogram.snapshot()
+        self.assertEqual(0, snapshot['count'])
+        self.assertIsNone(snapshot['mean'])
+        self.assertIsNone(snapshot['p50'])
+
+    def test_observe(self):
+        for v in (0.5, 1.5, 3, 4, 20):
+            self.histogram.observe(v)
+
+        snapshot = self.histogram.snapshot()
+        self.assertEqual(5, snapshot['count'])
+        self.assertEqual(29, snapshot['sum'])
+        self.assertEqual(0.5, snapshot['min'])
+        self.assertEqual(20, snapshot['max'])
+        self.assertEqual([1, 1, 2, 0, 1], self.histogram.counts)
+
+    def test_percentile(self):
+        for v in range(1, 11):
+            self.histogram.observe(v)
+
+        self.assertEqual(5, self.histogram.percentile(50))
+        self.assertEqual(10, self.histogram.percentile(99))
+
+    def test_percentile_beyond_buckets(self):
+        self.histogram.observe(50)
+        self.assertEqual(50, self.histogram.percentile(99))
+
+    def test_percentile_capped_at_max(self):
+        self.histogram.observe(3)
+        self.assertEqual(3, self.histogram.percentile(50))
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_is_shared(self):
+        self.registry.counter('events', topic='INFO').inc()
+        self.registry.counter('events', topic='INFO').inc()
+        self.registry.counter('events', topic='DEBUG').inc()
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual(2, snapshot['events{topic=INFO}'])
+        self.assertEqual(1, snapshot['events{topic=DEBUG}'])
+
+    def test_histogram_is_shared(self):
+        h = self.registry.histogram('latency')
+        self.assertIs(h, self.registry.histogram('latency'))
+        self.assertIsInstance(h, Histogram)
+
+    def test_gauge(self):
+        depth = [3]
+        self.registry.gauge('depth', lambda: depth[0])
+        depth[0] = 7
+
+        self.assertEqual(7, self.registry.snapshot()['depth'])
+
+    def test_failing_gauge(self):
+        self.registry.gauge('broken', lambda: 1 / 0)
+        self.assertTrue(
+            self.registry.snapshot()['broken'].startswith('unavailable'))
+
+    def test_dump(self):
+        self.registry.counter('events', topic='INFO').inc(3)
+        self.registry.histogram('latency', [1]).observe(0.25)
+
+        lines = self.registry.dump().split("\n")
+        self.assertEqual('events{topic=INFO} 3', lines[0])
+        self.assertTrue(lines[1].startswith('latency count=1 sum=0.25'))
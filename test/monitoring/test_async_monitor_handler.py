@@ -0,0 +1,79 @@
+import unittest
+import sys
+if (sys.version_info < (3, 3)):
+    from mock import Mock
+else:
+    from unittest.mock import Mock
+
+import asyncio
+import concurrent.futures
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "requires coroutine support")
+class TestAsyncMonitorHandler(unittest.TestCase):
+
+    def setUp(self):
+        from heartbeat.monitoring.asynchronous import AsyncMonitorHandler
+
+        self.loop = asyncio.new_event_loop()
+        self.threadpool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.callback = Mock()
+        self.timer = Mock()
+        self.handler = AsyncMonitorHandler(
+            self.callback,
+            self.threadpool,
+            self.loop,
+            timer=self.timer
+            )
+
+    def tearDown(self):
+        self.threadpool.shutdown()
+        self.loop.close()
+
+    def run_loop_briefly(self):
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+    def test_start_runs_coroutine_and_sync_producers(self):
+        async def realtime(callback):
+            callback("realtime")
+
+        async def periodic(callback):
+            callback("periodic")
+
+        sync_periodic = Mock()
+
+        self.handler.add_async_realtime_monitor(realtime)
+        self.handler.add_async_periodic_monitor(periodic)
+        self.handler.add_periodic_monitor(sync_periodic)
+        self.handler.start()
+        self.run_loop_briefly()
+
+        self.callback.assert_any_call("realtime")
+        self.callback.assert_any_call("periodic")
+        sync_periodic.assert_called_once_with(self.callback)
+        self.timer.start.assert_called_once_with()
+
+    def test_cannot_add_to_running_handler(self):
+        async def producer(callback):
+            pass
+
+        self.handler.start()
+        self.assertRaises(Exception, self.handler.add_async_realtime_monitor, producer)
+        self.assertRaises(Exception, self.handler.add_async_periodic_monitor, producer)
+        self.run_loop_briefly()
+
+    def test_loop_timer_repeats_until_stopped(self):
+        from heartbeat.monitoring.asynchronous import LoopTimer
+
+        calls = []
+        timer = LoopTimer(self.loop, 0.01, lambda: calls.append(1))
+        timer.start()
+        self.run_loop_briefly()
+        timer.stop()
+        self.run_loop_briefly()
+        count = len(calls)
+        self.run_loop_briefly()
+
+        self.assertTrue(count >= 2)
+        self.assertEqual(count, len(calls))
+        self.assertFalse(timer.is_running)
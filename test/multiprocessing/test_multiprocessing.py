@@ -11,9 +11,18 @@ else:
     from unittest.mock import mock_open
     from unittest.mock import patch
 from heartbeat.multiprocessing import LockingDictionary, Cache
+from heartbeat.multiprocessing import AppendLogBackend, JsonCacheBackend
+from heartbeat.multiprocessing import SqliteCacheBackend, get_cache_backend
+from heartbeat.multiprocessing import CacheBackend
+from heartbeat.multiprocessing import BackgroundTimer, TimerScheduler
 from heartbeat.security import Encryptor
 from heartbeat.platform import ConfigManager
 from queue import Queue
+import os
+import sqlite3
+import tempfile
+import threading
+from time import monotonic, sleep
 
 patch('__main__.open', mock_open)
 
@@ -61,6 +70,42 @@ class LockingDictionaryTest(unittest.TestCase):
         self.assertTrue(self.ld.exists('foo'))
         self.assertTrue(self.ld.exists('heart'))
 
+    def test_items_is_a_snapshot(self):
+        self.ld.write('foo', 'bar')
+        self.ld.write('heart', 'beat')
+
+        for key, value in self.ld.items():
+            self.ld.remove(key)
+            self.ld.write(key + '2', value)
+
+        self.assertEqual({'foo2': 'bar', 'heart2': 'beat'}, self.ld.snapshot())
+
+    def test_snapshot_kept_until_write(self):
+        self.ld.write('foo', 'bar')
+        items = self.ld.items()
+
+        self.assertIs(items, self.ld.items())
+
+        self.ld.write('foo', 'baz')
+
+        self.assertEqual((('foo', 'baz'),), self.ld.items())
+
+    def test_concurrent_writers(self):
+        def writer(n):
+            for i in range(200):
+                self.ld.write((n, i), i)
+                if i % 2:
+                    self.ld.remove((n, i - 1))
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(8 * 100, len(self.ld.keys()))
+        self.assertTrue(all(i % 2 for (n, i) in self.ld.keys()))
+
 class TestCache(unittest.TestCase):
 
     """
@@ -74,6 +119,7 @@ class TestCache(unittest.TestCase):
         self.settings.heartbeat = Mock(name="hbnamespace", spec=ConfigManager)
         self.settings.heartbeat.secret_key = "heartbeat3477"
         self.settings.heartbeat.cache_dir = "/foo"
+        self.settings.heartbeat.cache_backend = None
         self.encryptor = Mock(name='enc', spec=Encryptor)
         self.c = Cache('test-cache', False, self.settings, self.encryptor)
 
@@ -92,3 +138,475 @@ class TestCache(unittest.TestCase):
         self.assertEqual('nada', self.c.read('key'))
         self.assertEqual('nada', self.c.read('foo'))
 
+
+    def test_flush(self):
+        self.c.writeToDisk = MagicMock(return_value=None)
+        self.assertFalse(self.c.flush())
+
+        self.c.write("key", "value")
+        self.assertTrue(self.c.dirty)
+        self.assertTrue(self.c.flush())
+        self.c.writeToDisk.assert_called_once_with()
+
+    def test_writeToDisk_failure_stays_dirty(self):
+        self.c.write("key", "value")
+        with patch('builtins.open', side_effect=IOError()):
+            self.c.writeToDisk()
+
+        self.assertTrue(self.c.dirty)
+
+    def test_writeToDisk(self):
+        self.c.write("key", "value")
+        self.encryptor.encrypt.return_value = b'encrypted'
+        with patch('builtins.open', mock_open()) as m:
+            self.c.writeToDisk()
+
+        self.encryptor.encrypt.assert_called_once_with('{"key": "value"}')
+        m().write.assert_called_once_with(b'encrypted')
+        self.assertFalse(self.c.dirty)
+
+
+class CacheEvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch('heartbeat.multiprocessing.monotonic', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.settings = Mock(name="settings", spec=ConfigManager)
+        self.encryptor = Mock(name='enc', spec=Encryptor)
+        self.evicted = []
+
+    def cache(self, **options):
+        return Cache('test', False, self.settings, self.encryptor, '/foo',
+                     CacheBackend(), on_evict=self.on_evict, **options)
+
+    def on_evict(self, key, value, reason):
+        self.evicted.append((key, value, reason))
+
+    def test_ttl(self):
+        c = self.cache(ttl=10)
+        c.write('foo', 'bar')
+        self.now += 5
+        self.assertEqual('bar', c.read('foo'))
+
+        self.now += 5
+        self.assertRaises(KeyError, c.read, 'foo')
+        self.assertFalse(c.exists('foo'))
+        self.assertEqual([('foo', 'bar', Cache.EXPIRED)], self.evicted)
+        self.assertTrue(c.dirty)
+
+    def test_per_entry_ttl(self):
+        c = self.cache()
+        c.write('short', 1, ttl=1)
+        c.write('long', 2, ttl=100)
+        c.write('forever', 3)
+        self.now += 50
+
+        self.assertEqual([('short', 1)], c.expire())
+        self.assertEqual({'long': 2, 'forever': 3}, dict(c.items()))
+
+    def test_rewrite_extends_ttl(self):
+        c = self.cache(ttl=10)
+        c.write('foo', 1)
+        self.now += 8
+        c.write('foo', 2)
+        self.now += 8
+
+        self.assertEqual([], c.expire())
+        self.assertEqual(2, c.read('foo'))
+
+    def test_write_evicts_due_entries(self):
+        c = self.cache(ttl=10)
+        c.write('foo', 1)
+        self.now += 10
+        c.write('bar', 2)
+
+        self.assertEqual([('foo', 1, Cache.EXPIRED)], self.evicted)
+        self.assertEqual(('bar',), c.keys())
+
+    def test_expiry_index_stays_bounded(self):
+        c = self.cache(ttl=10)
+        for i in range(1000):
+            c.write('foo', i)
+
+        self.assertTrue(len(c._expiry_index) <= 2 * len(c._expiry) + 65)
+
+    def test_max_entries(self):
+        c = self.cache(max_entries=2)
+        c.write('a', 1)
+        c.write('b', 2)
+        c.read('a')
+        c.write('c', 3)
+
+        self.assertEqual([('b', 2, Cache.EVICTED)], self.evicted)
+        self.assertEqual({'a': 1, 'c': 3}, c.snapshot())
+
+    def test_removed_entries_forgotten(self):
+        c = self.cache(ttl=10, max_entries=2)
+        c.write('a', 1)
+        c.remove('a')
+        c.write('b', 2)
+        c.write('c', 3)
+        self.now += 10
+
+        self.assertEqual([('b', 2), ('c', 3)], sorted(c.expire()))
+        self.assertEqual([], [e for e in self.evicted if e[0] == 'a'])
+
+    def test_on_evict_errors_dont_stop_eviction(self):
+        c = self.cache(ttl=10)
+        c.on_evict = Mock(side_effect=Exception("failed"))
+        c.write('foo', 1)
+        c.write('bar', 2)
+        self.now += 10
+
+        with patch.object(Cache, '_logger') as logger:
+            self.assertEqual([('bar', 2), ('foo', 1)], sorted(c.expire()))
+
+        self.assertEqual(2, logger.error.call_count)
+        self.assertEqual({}, c.snapshot())
+
+    def test_loaded_entries_get_ttl(self):
+        backend = CacheBackend()
+        backend.load = Mock(return_value={'foo': 1, 'bar': 2, 'baz': 3})
+        c = Cache('test', False, self.settings, self.encryptor, '/foo',
+                  backend, ttl=10, max_entries=2, on_evict=self.on_evict)
+
+        self.assertEqual(2, len(c.keys()))
+        self.now += 10
+        self.assertEqual(2, len(c.expire()))
+
+
+class AppendLogBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, 'cache.log')
+        self.encryptor = Encryptor('heartbeat3477')
+        self.settings = Mock(name="settings", spec=ConfigManager)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cache(self, reset=False, **options):
+        backend = AppendLogBackend(self.filename, self.encryptor, **options)
+        return Cache('test', reset, self.settings, self.encryptor, self.tmp.name, backend)
+
+    def test_replay(self):
+        c = self.cache()
+        c.write('foo', 'bar')
+        c.write('heart', 'beat')
+        c.flush()
+        c.remove('foo')
+        c.write('heart', 'beats')
+        c.flush()
+
+        self.assertEqual({'heart': 'beats'}, self.cache()._dictionary)
+
+    def test_appends_changes(self):
+        c = self.cache()
+        for i in range(100):
+            c.write(str(i), i)
+        c.flush()
+        size = os.path.getsize(self.filename)
+
+        c.write('0', 'changed')
+        c.flush()
+
+        self.assertLess(os.path.getsize(self.filename) - size, size / 10)
+
+    def test_compaction(self):
+        backend = AppendLogBackend(self.filename, self.encryptor)
+        backend.min_compact_size = 0
+        c = Cache('test', False, self.settings, self.encryptor, self.tmp.name, backend)
+        for i in range(20):
+            c.write('key', i)
+            c.flush()
+            if backend.compacting is not None:
+                backend.compacting.join()
+
+        with open(self.filename, 'rb') as log:
+            self.assertLess(len(log.read().splitlines()), 20)
+        self.assertEqual({'key': 19}, self.cache()._dictionary)
+
+    def test_rewrite_waits_for_compaction(self):
+        backend = AppendLogBackend(self.filename, self.encryptor)
+        backend.min_compact_size = 0
+        c = Cache('test', False, self.settings, self.encryptor, self.tmp.name, backend)
+        started = threading.Event()
+        release = threading.Event()
+
+        def stale_snapshot():
+            started.set()
+            release.wait(5)
+            return {'key': 'stale'}
+
+        c.write('key', 'first')
+        backend.save({'key': 'first'}, stale_snapshot)
+        started.wait(5)
+        compacting = backend.compacting
+
+        backend.reset()
+        c.write('key', 'fresh')
+        rewrite = threading.Thread(target=c.flush)
+        rewrite.start()
+        rewrite.join(0.1)
+
+        self.assertTrue(rewrite.is_alive())
+        self.assertIs(compacting, backend.compacting)
+
+        release.set()
+        rewrite.join(5)
+
+        self.assertIsNone(backend.compacting)
+        self.assertEqual({'key': 'fresh'}, self.cache()._dictionary)
+
+    def test_torn_record(self):
+        c = self.cache()
+        c.write('foo', 'bar')
+        c.flush()
+        with open(self.filename, 'ab') as log:
+            log.write(b'truncat')
+
+        self.assertEqual({'foo': 'bar'}, self.cache()._dictionary)
+
+    def test_reset(self):
+        c = self.cache()
+        c.write('foo', 'bar')
+        c.flush()
+
+        c = self.cache(reset=True)
+        c.write('heart', 'beat')
+        c.flush()
+
+        self.assertEqual({'heart': 'beat'}, self.cache()._dictionary)
+
+    def test_picks_up_json(self):
+        json_backend = JsonCacheBackend(self.filename[:-4], self.encryptor)
+        json_backend.save({}, lambda: {'foo': 'bar'})
+
+        c = self.cache()
+        self.assertEqual({'foo': 'bar'}, c._dictionary)
+        c.write('heart', 'beat')
+        c.flush()
+
+        self.assertEqual({'foo': 'bar', 'heart': 'beat'}, self.cache()._dictionary)
+
+
+class SqliteCacheBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, 'cache.sqlite3')
+        self.settings = Mock(name="settings", spec=ConfigManager)
+        self.encryptor = Mock(name='enc', spec=Encryptor)
+        self.backends = []
+
+    def tearDown(self):
+        for b in self.backends:
+            b.close()
+        self.tmp.cleanup()
+
+    def cache(self, name='test', reset=False):
+        backend = SqliteCacheBackend(self.database, name)
+        self.backends.append(backend)
+        return Cache(name, reset, self.settings, self.encryptor, self.tmp.name, backend)
+
+    def test_round_trip(self):
+        c = self.cache()
+        c.write('foo', 'bar')
+        c.write('pulse', {'time': 1.5, 'hosts': ['a']})
+        c.flush()
+        c.remove('foo')
+        c.flush()
+
+        self.assertEqual({'pulse': {'time': 1.5, 'hosts': ['a']}}, self.cache()._dictionary)
+
+    def test_table_per_cache(self):
+        first = self.cache('known-pulses')
+        second = self.cache('say "hi"')
+        first.write('foo', 1)
+        second.write('foo', 2)
+        first.flush()
+        second.flush()
+
+        self.assertEqual(1, self.cache('known-pulses').read('foo'))
+        self.assertEqual(2, self.cache('say "hi"').read('foo'))
+
+    def test_wal_and_inspectable(self):
+        c = self.cache()
+        c.write('foo', 'bar')
+        c.flush()
+
+        connection = sqlite3.connect(self.database)
+        try:
+            mode, = connection.execute("PRAGMA journal_mode").fetchone()
+            rows = connection.execute('SELECT key, value FROM "test"').fetchall()
+        finally:
+            connection.close()
+
+        self.assertEqual('wal', mode)
+        self.assertEqual([('foo', '"bar"')], rows)
+
+    def test_reset(self):
+        c = self.cache()
+        c.write('foo', 'bar')
+        c.flush()
+
+        self.assertEqual({}, self.cache(reset=True)._dictionary)
+        self.assertEqual({}, self.cache()._dictionary)
+
+    def test_selected_by_settings(self):
+        self.settings.heartbeat = Mock(name="hbnamespace", spec=ConfigManager)
+        self.settings.heartbeat.cache_backend = 'sqlite'
+
+        backend = get_cache_backend('test', self.settings, self.encryptor, self.tmp.name)
+        self.backends.append(backend)
+
+        self.assertIsInstance(backend, SqliteCacheBackend)
+        self.assertEqual(
+            os.path.join(self.tmp.name, SqliteCacheBackend.database_name),
+            backend.database
+            )
+
+    def test_unknown_backend(self):
+        self.settings.heartbeat = Mock(name="hbnamespace", spec=ConfigManager)
+        self.settings.heartbeat.cache_backend = 'redis'
+
+        self.assertRaises(
+            Exception, get_cache_backend, 'test', self.settings, self.encryptor, self.tmp.name)
+
+
+class BackgroundTimerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = TimerScheduler()
+        self.addCleanup(self.scheduler.shutdown)
+        self.calls = []
+
+    def call(self):
+        self.calls.append((monotonic(), threading.current_thread()))
+
+    def wait_for(self, count, timeout=2):
+        deadline = monotonic() + timeout
+        while len(self.calls) < count and monotonic() < deadline:
+            sleep(0.005)
+
+    def test_one_shot(self):
+        timer = BackgroundTimer(0.01, False, self.call, scheduler=self.scheduler)
+        timer.start()
+        self.assertTrue(timer.is_running)
+
+        self.wait_for(1)
+        sleep(0.05)
+
+        self.assertEqual(1, len(self.calls))
+        self.assertFalse(timer.is_running)
+
+    def test_repeat_at_fixed_rate(self):
+        timer = BackgroundTimer(0.02, True, self.call, scheduler=self.scheduler)
+        started = monotonic()
+        timer.start()
+        self.wait_for(5)
+        timer.stop()
+
+        self.assertEqual(5, len(self.calls))
+        # Each tick is due a whole number of intervals after the start,
+        # however late the one before it ran
+        last = self.calls[-1][0] - started
+        self.assertTrue(0.1 <= last < 0.2, last)
+
+    def test_stop(self):
+        timer = BackgroundTimer(0.01, True, self.call, scheduler=self.scheduler)
+        timer.start()
+        timer.stop()
+        sleep(0.05)
+
+        self.assertEqual([], self.calls)
+        self.assertFalse(timer.is_running)
+
+    def test_restart_ignores_old_ticks(self):
+        timer = BackgroundTimer(0.03, False, self.call, scheduler=self.scheduler)
+        timer.start()
+        timer.stop()
+        timer.start()
+
+        self.wait_for(1)
+        sleep(0.06)
+
+        self.assertEqual(1, len(self.calls))
+
+    def test_skip_if_running(self):
+        release = threading.Event()
+
+        def slow():
+            self.call()
+            release.wait(1)
+
+        timer = BackgroundTimer(0.01, True, slow, scheduler=self.scheduler)
+        timer.start()
+        sleep(0.1)
+        timer.stop()
+        release.set()
+
+        self.assertEqual(1, len(self.calls))
+        self.assertTrue(timer.skipped > 0)
+
+    def test_one_shot_restarted_from_callback(self):
+        def again():
+            self.call()
+            if len(self.calls) < 3:
+                timer.start()
+                # Still running when the next tick is due
+                sleep(0.03)
+
+        timer = BackgroundTimer(0.01, False, again, scheduler=self.scheduler)
+        timer.start()
+        self.wait_for(3)
+
+        self.assertEqual(3, len(self.calls))
+        self.assertEqual(0, timer.skipped)
+
+    def test_default_workers(self):
+        self.assertEqual((os.cpu_count() or 1) * 5, self.scheduler.max_workers)
+
+    def test_jitter(self):
+        timer = BackgroundTimer(0.01, False, self.call, jitter=0.05,
+                                scheduler=self.scheduler)
+        started = monotonic()
+        timer.start()
+        self.wait_for(1)
+
+        self.assertTrue(0.01 <= self.calls[0][0] - started < 0.5)
+
+    def test_one_scheduler_thread(self):
+        timers = [
+            BackgroundTimer(0.005, True, self.call, scheduler=self.scheduler)
+            for i in range(20)
+            ]
+        before = threading.active_count()
+        for timer in timers:
+            timer.start()
+        self.wait_for(200)
+        for timer in timers:
+            timer.stop()
+
+        self.assertTrue(len(self.calls) >= 200)
+        # The scheduler thread and the pool's workers, however many
+        # ticks there are
+        self.assertTrue(
+            threading.active_count() - before <= 1 + self.scheduler._executor._max_workers)
+
+    def test_callback_errors_dont_stop_the_timer(self):
+        def failing():
+            self.call()
+            raise Exception("failed")
+
+        timer = BackgroundTimer(0.01, True, failing, scheduler=self.scheduler)
+        with patch('traceback.print_exc'):
+            timer.start()
+            self.wait_for(3)
+            timer.stop()
+
+        self.assertTrue(len(self.calls) >= 3)
+
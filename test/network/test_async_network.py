@@ -0,0 +1,101 @@
+import unittest
+import sys
+if (sys.version_info < (3, 3)):
+    from mock import ANY
+    from mock import patch
+else:
+    from unittest.mock import ANY
+    from unittest.mock import patch
+
+import asyncio
+import os
+import tempfile
+import threading
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "requires coroutine support")
+class TestServeUnix(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'heartbeat.sock')
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.shutdown = False
+        self.received = []
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        self.tmp.cleanup()
+
+    def serve(self, callback, data):
+        from heartbeat.network import asynchronous
+
+        async def send():
+            while not os.path.exists(self.path):
+                await asyncio.sleep(0.01)
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            writer.write(data)
+            await reader.read()
+            writer.close()
+            self.shutdown = True
+
+        with patch.object(asynchronous, 'POLL_INTERVAL', 0.01):
+            server = self.loop.create_task(asynchronous.serve_unix(
+                self.path, callback, lambda: self.shutdown))
+            self.loop.run_until_complete(asyncio.wait_for(send(), 5))
+            self.loop.run_until_complete(asyncio.wait_for(server, 5))
+
+    def test_callback_runs_in_executor(self):
+        def callback(data, path):
+            self.received.append((data, path, threading.current_thread()))
+
+        self.serve(callback, b'foobar')
+
+        self.assertEqual(1, len(self.received))
+        data, path, thread = self.received[0]
+        self.assertEqual(b'foobar', data)
+        self.assertEqual(self.path, path)
+        self.assertIsNot(threading.main_thread(), thread)
+
+    def test_callback_errors_logged(self):
+        def callback(data, path):
+            raise ValueError('bad data')
+
+        with patch('heartbeat.network.asynchronous.logger') as logger:
+            self.serve(callback, b'foobar')
+
+        logger.exception.assert_called_once_with(
+            "Unable to handle a connection on %s", self.path)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "requires coroutine support")
+class TestDatagramHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_callback_errors_logged(self):
+        from heartbeat.network.asynchronous import DatagramHandler
+
+        def callback(data, addr):
+            raise ValueError('bad data')
+
+        async def wait(logger):
+            while not logger.exception.called:
+                await asyncio.sleep(0.01)
+
+        handler = DatagramHandler(self.loop, callback)
+        with patch('heartbeat.network.asynchronous.logger') as logger:
+            handler.datagram_received(b'foobar', ('127.0.0.1', 22000))
+            self.loop.run_until_complete(asyncio.wait_for(wait(logger), 5))
+
+        logger.exception.assert_called_once_with(
+            "Unable to handle a datagram from %s",
+            "('127.0.0.1', 22000)",
+            exc_info=ANY
+            )
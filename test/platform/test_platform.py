@@ -1,8 +1,19 @@
 import unittest
 import sys
 import json
-from heartbeat.platform import Event
-from heartbeat.platform import get_config_manager
+import datetime
+import os
+import tempfile
+import uuid
+from unittest.mock import patch
+from heartbeat.platform import Event, EventTemplate, EventDecodeError, Topics
+from heartbeat.platform import ConfigManager, get_config_manager
+from heartbeat.platform import _read_config_files, _diff_config
+from heartbeat.platform import config_changed, reload_config_manager
+import heartbeat.platform
+
+def make_event():
+    return Event("", "")
 
 class EventTest(unittest.TestCase):
 
@@ -27,12 +38,63 @@ class EventTest(unittest.TestCase):
         self.assertEqual(message, event.message)
         self.assertEqual(title, event.title)
 
+    def test_source_from_caller(self):
+        self.assertEqual('EventTest', Event("", "").source)
+
+    def test_source_outside_class(self):
+        self.assertIsNone(make_event().source)
+
+    def test_source_explicit(self):
+        self.assertEqual('Plugin', Event("", "", source='Plugin').source)
+
+    def test_json_load_source(self):
+        self.assertEqual('test', Event.from_json(self.event.to_json()).source)
+
+        data = json.loads(self.event.to_json())
+        del data['source']
+        self.assertEqual('Unknown', Event.from_dict(data).source)
+
+    def test_timestamp_follows_when(self):
+        self.assertEqual(datetime.datetime.fromtimestamp(self.event.when), self.event.timestamp)
+
+        self.event.when -= 60
+        self.assertEqual(datetime.datetime.fromtimestamp(self.event.when), self.event.timestamp)
+
+    def test_timestamp_set(self):
+        when = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        self.event.timestamp = when
+
+        self.assertEqual(when, self.event.timestamp)
+        self.assertEqual(when.timestamp(), self.event.when)
+
+    def test_ids_unique(self):
+        ids = set(Event("", "").id for i in range(100))
+        self.assertEqual(100, len(ids))
+
+    def test_id_is_uuid_shaped(self):
+        e = Event("", "")
+        self.assertEqual(e.id, str(uuid.UUID(e.id)))
+
     def test_hash(self):
         self.assertEqual(self.event.__hash__(), self.event.__hash__())
         e = Event("", "")
         self.assertNotEqual(e.__hash__(), self.event.__hash__())
 
 
+    def test_hash_compact(self):
+        self.assertEqual(32, len(self.event.__hash__()))
+
+    def test_hash_follows_identity(self):
+        before = self.event.__hash__()
+        self.event.payload['extra'] = 1
+        self.assertEqual(before, self.event.__hash__())
+
+        self.event.host = 'other'
+        self.assertNotEqual(before, self.event.__hash__())
+
+        self.event.host = 'titanium'
+        self.assertEqual(before, self.event.__hash__())
+
     def test_json_dump(self):
         event_json = self.event.to_json()
 
@@ -48,6 +110,232 @@ class EventTest(unittest.TestCase):
 
         self.assertEqual(self.event.__hash__(), e.__hash__())
 
+    def test_json_load_list(self):
+        events = Event.list_from_json(
+            "[" + self.event.to_json() + "," + self.event.to_json() + "]"
+            )
+
+        self.assertEqual(2, len(events))
+        for e in events:
+            self.assertEqual(self.event.__hash__(), e.__hash__())
+
+        events = Event.list_from_json(self.event.to_json())
+        self.assertEqual(1, len(events))
+
+    def test_json_load_malformed(self):
+        self.assertRaises(Exception, Event.from_json, '["foo"]')
+        self.assertRaises(Exception, Event.list_from_json, '[{"title": "foo"}]')
+
+    def assertRejected(self, reason, field, data):
+        with self.assertRaises(EventDecodeError) as caught:
+            Event.from_dict(data)
+
+        self.assertEqual(reason, caught.exception.reason)
+        self.assertEqual(field, caught.exception.field)
+
+    def test_from_dict_validation(self):
+        valid = {'title': 'a', 'message': 'b', 'type': 'INFO'}
+
+        self.assertRejected(EventDecodeError.MALFORMED, None, ['a'])
+        self.assertRejected(
+            EventDecodeError.MISSING_FIELD, 'message', {'title': 'a', 'type': 'INFO'})
+        self.assertRejected(
+            EventDecodeError.UNSUPPORTED, 'type', dict(valid, type='ERROR'))
+        self.assertRejected(
+            EventDecodeError.UNSUPPORTED, 'type', dict(valid, type=['INFO']))
+        self.assertRejected(
+            EventDecodeError.INVALID_FIELD, 'title', dict(valid, title=5))
+        self.assertRejected(
+            EventDecodeError.INVALID_FIELD, 'host', dict(valid, host={}))
+        self.assertRejected(
+            EventDecodeError.INVALID_FIELD, 'one_time', dict(valid, one_time='yes'))
+        self.assertRejected(
+            EventDecodeError.INVALID_FIELD, 'payload', dict(valid, payload=[1]))
+        self.assertRejected(
+            EventDecodeError.TOO_LARGE, 'message',
+            dict(valid, message='x' * (Event.max_field_length + 1)))
+
+    def test_from_dict_defaults(self):
+        e = Event.from_dict(
+            {'title': 'a', 'message': 'b', 'type': 'INFO', 'source': None, 'payload': None})
+
+        self.assertEqual('localhost', e.host)
+        self.assertEqual('', e.source)
+        self.assertEqual({}, e.payload)
+        self.assertFalse(e.one_time)
+        self.assertIsNotNone(e.id)
+
+    def test_json_round_trip_without_source_or_host(self):
+        e = make_event()
+        e.host = None
+        decoded = Event.from_json(e.to_json())
+
+        self.assertEqual('', decoded.source)
+        self.assertEqual('', decoded.host)
+        self.assertEqual(e.id, decoded.id)
+        self.assertIsNotNone(decoded.__hash__())
+        self.assertEqual('', str(decoded).split(': ')[1])
+
+    def test_json_limits(self):
+        too_many = "[" + ",".join([self.event.to_json()] * (Event.max_events + 1)) + "]"
+
+        self.assertRaises(EventDecodeError, Event.list_from_json, too_many)
+        self.assertRaises(
+            EventDecodeError, Event.from_json, " " * (Event.max_wire_size + 1))
+        self.assertRaises(EventDecodeError, Event.from_json, "[" * 100000)
+        self.assertRaises(EventDecodeError, Event.list_from_wire, b'\xff\xfe')
+
+    def test_bytes_limits(self):
+        long_event = Event('x' * (Event.max_field_length + 1), '', type=Topics.INFO)
+        with patch.object(Event, 'max_field_length', 0xffff):
+            data = long_event.to_bytes()
+
+        with self.assertRaises(EventDecodeError) as caught:
+            Event.from_bytes(data)
+
+        self.assertEqual(EventDecodeError.TOO_LARGE, caught.exception.reason)
+
+    def test_bytes_long_fields_cut_short(self):
+        limit = Event.max_field_length
+        long_event = Event('x' * (limit + 1), '\u00e9' * limit, type=Topics.INFO)
+
+        e = Event.from_bytes(long_event.to_bytes())
+
+        self.assertEqual('x' * limit, e.title)
+        self.assertEqual('\u00e9' * (limit // 2), e.message)
+
+    def test_bytes_round_trip_with_none_fields(self):
+        self.event.title = None
+        self.event.message = None
+        self.event.host = None
+
+        e = Event.from_bytes(self.event.to_bytes())
+
+        self.assertEqual('', e.title)
+        self.assertEqual('', e.message)
+        self.assertEqual('', e.host)
+        self.assertEqual(self.event.source, e.source)
+        self.assertEqual(self.event.id, e.id)
+
+    def test_bytes_round_trip(self):
+        self.event.payload = {'disk': 'sda'}
+        self.event.one_time = True
+
+        self.event.when -= 60
+
+        e = Event.from_bytes(self.event.to_bytes())
+
+        self.assertEqual(self.event.__hash__(), e.__hash__())
+        self.assertEqual(self.event.id, e.id)
+        self.assertGreater(e.when, self.event.when)
+        self.assertEqual({'disk': 'sda'}, e.payload)
+        self.assertTrue(e.one_time)
+
+    def test_bytes_without_source_or_uuid(self):
+        self.event.source = None
+        self.event.id = 'not-a-uuid'
+
+        e = Event.from_bytes(self.event.to_bytes())
+
+        self.assertEqual('', e.source)
+        self.assertIsNotNone(e.__hash__())
+        self.assertEqual('not-a-uuid', e.id)
+        self.assertEqual({}, e.payload)
+
+    def test_bytes_invalid_time(self):
+        for when in (float('nan'), float('inf'), 1e300, -1.0):
+            self.event.when = when
+
+            with self.assertRaises(EventDecodeError) as caught:
+                Event.from_bytes(self.event.to_bytes())
+
+            self.assertEqual('when', caught.exception.field)
+
+    def test_bytes_smaller_than_json(self):
+        self.assertLess(len(self.event.to_bytes()), len(self.event.to_json()))
+
+    def test_bytes_list(self):
+        other = Event('Other', '', 'cobalt', Topics.WARNING)
+        events = Event.list_from_bytes(Event.list_to_bytes([self.event, other]))
+
+        self.assertEqual(
+            [self.event.__hash__(), other.__hash__()],
+            [e.__hash__() for e in events]
+            )
+
+    def test_bytes_malformed(self):
+        data = self.event.to_bytes()
+
+        self.assertRaises(Exception, Event.from_bytes, data[:-3])
+        self.assertRaises(Exception, Event.from_bytes, data + data)
+        self.assertRaises(Exception, Event.from_bytes, b'\x00HB\x09' + data[4:])
+
+    def test_list_from_wire(self):
+        binary = Event.list_from_wire(self.event.to_bytes())
+        text = Event.list_from_wire(self.event.to_json().encode("UTF-8"))
+
+        self.assertEqual(self.event.__hash__(), binary[0].__hash__())
+        self.assertEqual(self.event.__hash__(), text[0].__hash__())
+
+
+class EventTemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.template = EventTemplate(
+            'Beat', 'From %s', 'cobalt', Topics.HEARTBEAT, 'Pulse')
+
+    def slow_copy(self, event):
+        copy = Event(event.title, event.message, event.host, event.type, event.source)
+        copy.id = event.id
+        copy.when = event.when
+        copy.payload = event.payload
+        copy.one_time = event.one_time
+        return copy
+
+    def test_create(self):
+        first = self.template.create()
+        second = self.template.create()
+
+        self.assertEqual('Beat', first.title)
+        self.assertEqual('Pulse', first.source)
+        self.assertEqual(Topics.HEARTBEAT, first.type)
+        self.assertNotEqual(first.id, second.id)
+        self.assertIsNot(first.payload, second.payload)
+
+    def test_source_detected(self):
+        self.assertEqual('EventTemplateTest', EventTemplate('a', 'b').source)
+
+    def test_invalid_topic(self):
+        self.assertRaises(Exception, EventTemplate, 'a', 'b', type='INFO')
+
+    def test_to_json_matches(self):
+        event = self.template.create()
+        event.payload['attempt'] = 3
+
+        self.assertEqual(
+            json.loads(self.slow_copy(event).to_json()),
+            json.loads(event.to_json())
+            )
+
+    def test_to_bytes_matches(self):
+        event = self.template.create()
+
+        self.assertEqual(self.slow_copy(event).to_bytes(), event.to_bytes())
+
+    def test_hash_matches(self):
+        event = self.template.create()
+
+        self.assertEqual(self.slow_copy(event).__hash__(), event.__hash__())
+
+    def test_changed_event(self):
+        event = self.template.create()
+        event.message = 'From %s, again'
+
+        self.assertEqual(self.slow_copy(event).__hash__(), event.__hash__())
+        self.assertEqual('From %s, again', json.loads(event.to_json())['message'])
+        self.assertEqual('From %s, again', Event.from_bytes(event.to_bytes()).message)
+
+
 class ConfigTest(unittest.TestCase):
 
     def setUp(self):
@@ -58,3 +346,159 @@ class ConfigTest(unittest.TestCase):
         conf = get_config_manager('src/heartbeat/resources/cfg')
         self.assertEqual(conf.heartbeat.secret_key, 'heartbeat3477')
         self.assertEqual(conf.heartbeat.port, 21999)
+
+    def test_finalized_sections(self):
+        conf = ConfigManager({'heartbeat': {'port': 21999, 'items': 1}, 'empty': None})
+        conf.finalize()
+
+        self.assertIs(conf.heartbeat, conf.heartbeat)
+        self.assertEqual(21999, conf.heartbeat.port)
+        self.assertIsNone(conf.heartbeat.missing)
+        self.assertIsNone(conf.empty)
+        self.assertIn('items', conf.heartbeat)
+        self.assertTrue(callable(conf.heartbeat.items))
+
+    def test_unfinalized_lookup(self):
+        conf = ConfigManager({'heartbeat': {'port': 21999}})
+        conf.add_item('notifying', {'histamine': {'batch_size': 5}})
+
+        self.assertEqual(21999, conf.heartbeat.port)
+        self.assertEqual(5, conf.notifying.histamine.batch_size)
+        self.assertIsNone(conf.monitoring)
+
+    def test_finalized_frozen(self):
+        conf = ConfigManager({'heartbeat': {'port': 21999}})
+        conf.finalize()
+
+        self.assertRaises(Exception, conf.add_item, 'notifying', {})
+        self.assertRaises(AttributeError, setattr, conf, 'heartbeat', None)
+        self.assertRaises(AttributeError, setattr, conf.heartbeat, 'port', 1)
+
+
+class ConfigSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_dir = os.path.join(self.tmp.name, 'cfg')
+        self.snapshot_dir = os.path.join(self.tmp.name, 'cache')
+        os.makedirs(self.config_dir)
+        self.write('heartbeat.conf', 'secret_key: abc\nport: 21999\n')
+        self.write('notifying.conf', 'histamine:\n    batch_size: 5\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.config_dir, name), 'w') as f:
+            f.write(text)
+
+    def read(self):
+        return _read_config_files(self.config_dir, self.snapshot_dir)
+
+    def test_snapshot_used(self):
+        first = self.read()
+
+        with patch('yaml.safe_load', side_effect=Exception("parsed")):
+            second = self.read()
+
+        self.assertEqual(first, second)
+        self.assertEqual(21999, second['heartbeat']['port'])
+        self.assertEqual(5, second['notifying']['histamine']['batch_size'])
+
+    def test_changed_file(self):
+        self.read()
+        self.write('heartbeat.conf', 'secret_key: abcdef\nport: 21999\n')
+
+        self.assertEqual('abcdef', self.read()['heartbeat']['secret_key'])
+
+    def test_added_file(self):
+        self.read()
+        self.write('monitoring.conf', 'histamine: {}\n')
+
+        self.assertIn('monitoring', self.read())
+
+    def test_corrupt_snapshot(self):
+        self.read()
+        for name in os.listdir(self.snapshot_dir):
+            with open(os.path.join(self.snapshot_dir, name), 'wb') as f:
+                f.write(b'garbage')
+
+        self.assertEqual('abc', self.read()['heartbeat']['secret_key'])
+
+    def test_unsnapshottable(self):
+        self.write('dated.conf', 'since: 2020-01-01\n')
+
+        self.assertEqual(datetime.date(2020, 1, 1), self.read()['dated']['since'])
+        self.assertEqual(datetime.date(2020, 1, 1), self.read()['dated']['since'])
+
+
+class ConfigReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = getattr(heartbeat.platform, '__config_manager')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_dir = os.path.join(self.tmp.name, 'cfg')
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+        os.makedirs(self.config_dir)
+        self.write('heartbeat.conf', 'secret_key: abc\nport: 21999\n')
+        self.write('notifying.conf', 'histamine:\n    batch_size: 5\n')
+
+    def tearDown(self):
+        setattr(heartbeat.platform, '__config_manager', self.previous)
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.config_dir, name), 'w') as f:
+            f.write(text)
+
+    def config(self, entries):
+        conf = ConfigManager(entries)
+        conf.finalize()
+        return conf
+
+    def test_diff(self):
+        before = self.config({
+            'heartbeat': {'port': 1, 'secret_key': 'a'},
+            'notifying': {'histamine': {'batch_size': 5}},
+            'monitoring': {},
+            })
+        after = self.config({
+            'heartbeat': {'port': 1, 'secret_key': 'b', 'monitor_server': 'x'},
+            'notifying': {'histamine': {'batch_size': 5}},
+            'disks': None,
+            })
+
+        self.assertEqual(
+            {'heartbeat.secret_key', 'heartbeat.monitor_server', 'monitoring', 'disks'},
+            _diff_config(before, after)
+            )
+
+    def test_config_changed(self):
+        changed = {'heartbeat.secret_key', 'monitoring'}
+
+        self.assertTrue(config_changed('heartbeat.secret_key', changed))
+        self.assertTrue(config_changed('heartbeat', changed))
+        self.assertTrue(config_changed('monitoring.histamine', changed))
+        self.assertFalse(config_changed('heartbeat.port', changed))
+        self.assertFalse(config_changed('notifying.histamine', changed))
+
+    def test_reload(self):
+        with patch('heartbeat.platform._read_config_files',
+                   side_effect=lambda path: _read_config_files(path, self.cache_dir)):
+            reload_config_manager(self.config_dir)
+            self.write('notifying.conf', 'histamine:\n    batch_size: 10\n')
+            settings, changed = reload_config_manager()
+
+        self.assertEqual({'notifying.histamine'}, changed)
+        self.assertEqual(10, settings.notifying.histamine.batch_size)
+        self.assertIs(settings, get_config_manager())
+
+    def test_reload_failure_keeps_config(self):
+        with patch('heartbeat.platform._read_config_files',
+                   side_effect=lambda path: _read_config_files(path, self.cache_dir)):
+            settings, changed = reload_config_manager(self.config_dir)
+            self.write('notifying.conf', 'histamine: [\n')
+
+            self.assertRaises(Exception, reload_config_manager)
+
+        self.assertIs(settings, get_config_manager())
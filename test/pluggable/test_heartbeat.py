@@ -4,17 +4,20 @@ if (sys.version_info < (3, 3)):
     from mock import MagicMock
     from mock import Mock
     from mock import ANY
+    from mock import patch
 else:
     from unittest.mock import MagicMock
     from unittest.mock import Mock
     from unittest.mock import ANY
+    from unittest.mock import patch
 
 from heartbeat.pluggable.heartbeat import Heartbeat, Monitor
 from heartbeat.pluggable.heartbeat import Pulse, PulseMonitor
 from heartbeat.network import SocketBroadcaster, SocketListener, NetworkInfo
 from heartbeat.platform import Event, Topics, ConfigManager
 from heartbeat.monitoring import MonitorHandler, MonitorType
-from heartbeat.multiprocessing import Cache, BackgroundTimer
+from heartbeat.multiprocessing import Cache, CacheBackend, BackgroundTimer
+from heartbeat.security import Encryptor
 
 import datetime
 from time import time
@@ -69,6 +72,7 @@ class TestMonitor(unittest.TestCase):
 
     def setUp(self):
         self.cache = Mock(name='cache', spec=Cache)
+        self.cache.ttl = 300
         self.listener = Mock(name='listener', spec=SocketListener)
         self.settings = Mock(name='settings', spec=ConfigManager)
         self.settings.heartbeat = Mock(name='settings', spec=ConfigManager)
@@ -103,7 +107,7 @@ class TestMonitor(unittest.TestCase):
     def test__log_host(self):
 
         self.monitor.cache.write = MagicMock(return_value=None)
-        self.monitor.cache.keys = MagicMock(return_value=[])
+        self.monitor.cache.exists = MagicMock(return_value=False)
         self.monitor.callback = MagicMock()
 
         self.monitor._log_host('foo.example.com')
@@ -114,32 +118,29 @@ class TestMonitor(unittest.TestCase):
         self.monitor.cache.write.assert_called_with('foo.example.com', ANY)
 
     def test_cleanup_hosts(self):
-
-        self.monitor.cache.write = MagicMock(return_value=None)
-        self.monitor.cache.keys = MagicMock(return_value=['foo.example.com'])
-        self.monitor.cache.items = MagicMock(return_value=[('foo.example.com', 1453848040.6469207)])
-        self.monitor.callback = MagicMock()
-        self.monitor.cache.read = MagicMock(return_value=datetime.datetime(year=1970, month=1, day=1))
+        self.monitor.cache.expire = MagicMock(
+            side_effect=lambda: self.monitor._flatlined(
+                'foo.example.com', 1453848040.6469207, Cache.EXPIRED)
+            )
 
         cb = MagicMock(return_value=None)
         self.monitor.cleanup_hosts(cb)
         cb.assert_called_once_with(ANY)
+        self.monitor.cache.writeToDisk.assert_called_once_with()
 
     def test_cleanup_hosts_no_expired(self):
-        self.monitor.cache.write = MagicMock(return_value=None)
-        self.monitor.cache.keys = MagicMock(return_value=['foo.example.com'])
-        self.monitor.cache.items = MagicMock(return_value=[('foo.example.com', time())])
-        self.monitor.callback = MagicMock()
-        self.monitor.cache.read = MagicMock(return_value=datetime.datetime(year=1970, month=1, day=1))
+        self.monitor.cache.expire = MagicMock(return_value=[])
 
         cb = MagicMock(return_value=None)
         self.monitor.cleanup_hosts(cb)
+        cb.assert_not_called()
 
 
 class TestPulseMonitor(unittest.TestCase):
 
     def setUp(self):
         self.cache = Mock(name='cache', spec=Cache)
+        self.cache.ttl = 300
         self.monitor = PulseMonitor(
                 cache=self.cache,
                 )
@@ -171,7 +172,7 @@ class TestPulseMonitor(unittest.TestCase):
     def test__log_host(self):
 
         self.monitor.cache.write = MagicMock(return_value=None)
-        self.monitor.cache.keys = MagicMock(return_value=[])
+        self.monitor.cache.exists = MagicMock(return_value=False)
         self.monitor.callback = MagicMock()
 
         self.monitor._log_host('foo.example.com')
@@ -182,23 +183,73 @@ class TestPulseMonitor(unittest.TestCase):
         self.monitor.cache.write.assert_called_with('foo.example.com', ANY)
 
     def test_cleanup_hosts(self):
-
-        self.monitor.cache.write = MagicMock(return_value=None)
-        self.monitor.cache.keys = MagicMock(return_value=['foo.example.com'])
-        self.monitor.cache.items = MagicMock(return_value=[('foo.example.com', 1453848040.6469207)])
-        self.monitor.callback = MagicMock()
-        self.monitor.cache.read = MagicMock(return_value=datetime.datetime(year=1970, month=1, day=1))
+        self.monitor.cache.expire = MagicMock(
+            side_effect=lambda: self.monitor._flatlined(
+                'foo.example.com', 1453848040.6469207, Cache.EXPIRED)
+            )
 
         cb = MagicMock(return_value=None)
         self.monitor.cleanup_hosts(cb)
         cb.assert_called_once_with(ANY)
+        self.monitor.cache.writeToDisk.assert_called_once_with()
 
     def test_cleanup_hosts_no_expired(self):
-        self.monitor.cache.write = MagicMock(return_value=None)
-        self.monitor.cache.keys = MagicMock(return_value=['foo.example.com'])
-        self.monitor.cache.items = MagicMock(return_value=[('foo.example.com', time())])
-        self.monitor.callback = MagicMock()
-        self.monitor.cache.read = MagicMock(return_value=datetime.datetime(year=1970, month=1, day=1))
+        self.monitor.cache.expire = MagicMock(return_value=[])
 
         cb = MagicMock(return_value=None)
         self.monitor.cleanup_hosts(cb)
+        cb.assert_not_called()
+
+    def test_flatlined_hosts_expire(self):
+        cache = Cache('known-pulses', False, Mock(spec=ConfigManager),
+                      Mock(spec=Encryptor), '/foo', CacheBackend(), ttl=300)
+        monitor = PulseMonitor(cache=cache)
+        monitor.callback = MagicMock()
+        with patch('heartbeat.multiprocessing.monotonic', return_value=1000):
+            monitor._log_host('foo.example.com')
+
+        cb = MagicMock(return_value=None)
+        with patch('heartbeat.multiprocessing.monotonic', return_value=1300):
+            monitor.cleanup_hosts(cb)
+
+        cb.assert_called_once_with(ANY)
+        self.assertEqual('Flatlined Host', cb.call_args[0][0].title)
+        self.assertFalse(cache.exists('foo.example.com'))
+
+    def test_injected_cache_given_ttl(self):
+        backend = Mock(spec=CacheBackend)
+        backend.load.return_value = {'foo.example.com': 1453848040.6469207}
+        with patch('heartbeat.multiprocessing.monotonic', return_value=1000):
+            cache = Cache('known-pulses', False, Mock(spec=ConfigManager),
+                          Mock(spec=Encryptor), '/foo', backend)
+            monitor = PulseMonitor(cache=cache)
+            monitor._log_host('bar.example.com')
+
+        self.assertEqual(PulseMonitor.flatline_after, cache.ttl)
+
+        cb = MagicMock(return_value=None)
+        with patch('heartbeat.multiprocessing.monotonic', return_value=1300):
+            monitor.cleanup_hosts(cb)
+
+        self.assertEqual(2, cb.call_count)
+        self.assertFalse(cache.exists('foo.example.com'))
+        self.assertFalse(cache.exists('bar.example.com'))
+
+    def test_expiry_before_callback_set(self):
+        cache = Cache('known-pulses', False, Mock(spec=ConfigManager),
+                      Mock(spec=Encryptor), '/foo', CacheBackend(), ttl=300)
+        monitor = PulseMonitor(cache=cache)
+        with patch('heartbeat.multiprocessing.monotonic', return_value=1000):
+            monitor._log_host('foo.example.com')
+        with patch('heartbeat.multiprocessing.monotonic', return_value=1300):
+            monitor._log_host('bar.example.com')
+
+        self.assertFalse(cache.exists('foo.example.com'))
+
+        cb = MagicMock(return_value=None)
+        monitor.set_callback(cb)
+
+        cb.assert_called_once_with(ANY)
+        self.assertEqual('Flatlined Host', cb.call_args[0][0].title)
+        self.assertEqual('foo.example.com', cb.call_args[0][0].host)
+
@@ -19,12 +19,24 @@ class TestPlugin(unittest.TestCase):
         """
         self.assertEqual(self.plugin.get_subscriptions(), {})
 
+    def test_get_batch_subscriptions(self):
+        self.assertEqual(self.plugin.get_batch_subscriptions(), {})
+
+    def test_get_subscription_filters(self):
+        self.assertEqual(self.plugin.get_subscription_filters(), {})
+
     def test_get_producers(self):
         """
         Test the stub method correctly returns an empty dict
         """
         self.assertEqual(self.plugin.get_producers(), {})
 
+    def test_get_config_sections(self):
+        self.assertEqual(self.plugin.get_config_sections(), [])
+
+    def test_reload(self):
+        self.assertFalse(self.plugin.reload(Mock(spec=ConfigManager)))
+
     def test_get_services(self):
         self.assertEqual(self.plugin.get_services(), [])
 
@@ -0,0 +1,128 @@
+import unittest
+import sys
+if (sys.version_info < (3, 3)):
+    from mock import Mock
+else:
+    from unittest.mock import Mock
+
+from heartbeat.platform import Event, Topics
+from heartbeat.routing import Overflow, RateLimitHandler
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "requires coroutine support")
+class TestAsyncEventRouter(unittest.TestCase):
+
+    def setUp(self):
+        from heartbeat.routing.asynchronous import AsyncEventRouter
+
+        self.loop = asyncio.new_event_loop()
+        self.threadpool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.limiter = Mock(spec=RateLimitHandler)
+        self.limiter.allow_event.return_value = True
+        self.router = AsyncEventRouter(self.threadpool, self.loop, self.limiter)
+        self.router.logger = Mock()
+
+    def tearDown(self):
+        self.threadpool.shutdown()
+        self.loop.close()
+
+    def run_until_delivered(self, received, count):
+        async def wait():
+            while len(received) < count:
+                await asyncio.sleep(0.01)
+
+        self.loop.run_until_complete(asyncio.wait_for(wait(), 5))
+
+    def test_delivers_to_coroutine_subscriber(self):
+        received = []
+
+        async def subscriber(event):
+            received.append(event)
+
+        self.router.attach_async(Topics.INFO, subscriber)
+        e = Event("Test", "Event")
+        self.router.put_event(e)
+
+        self.run_until_delivered(received, 1)
+        self.assertEqual([e], received)
+
+    def test_delivers_to_sync_subscriber_in_threadpool(self):
+        received = []
+
+        def subscriber(event):
+            received.append(event)
+
+        self.router.attach(Topics.INFO, subscriber)
+        e = Event("Test", "Event")
+        self.router.put_event(e)
+
+        self.run_until_delivered(received, 1)
+        self.assertEqual([e], received)
+
+    def test_concurrency_limits_coroutine_tasks(self):
+        running = [0]
+        peak = [0]
+        received = []
+
+        async def subscriber(event):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            received.append(event)
+
+        self.router.attach_async(Topics.INFO, subscriber, concurrency=2)
+        for i in range(6):
+            self.router.put_event(Event("Test", "Event %d" % i))
+
+        self.run_until_delivered(received, 6)
+        self.assertEqual(2, peak[0])
+
+    def test_block_policy_drops_instead_of_blocking_loop(self):
+        async def subscriber(event):
+            pass
+
+        self.router.attach_async(
+            Topics.INFO, subscriber, queue_size=1, overflow=Overflow.BLOCK)
+        self.router._submit(subscriber, Event("Test", "First"))
+        self.router._submit(subscriber, Event("Test", "Second"))
+
+        self.assertEqual(1, self.router.subscribers[subscriber].dropped)
+
+    def test_block_policy_drops_for_sync_subscribers(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def subscriber(event):
+            started.set()
+            release.wait(5)
+
+        self.router.attach(
+            Topics.INFO, subscriber, queue_size=1, overflow=Overflow.BLOCK)
+        self.router._submit(subscriber, Event("Test", "First"))
+        started.wait(5)
+        self.router._submit(subscriber, Event("Test", "Second"))
+        self.router._submit(subscriber, Event("Test", "Third"))
+        release.set()
+
+        self.assertEqual(1, self.router.subscribers[subscriber].dropped)
+
+    def test_logs_coroutine_subscriber_errors(self):
+        received = []
+
+        async def failing(event):
+            raise Exception("failure")
+
+        async def subscriber(event):
+            received.append(event)
+
+        self.router.attach_async(Topics.INFO, failing)
+        self.router.attach_async(Topics.INFO, subscriber)
+        self.router.put_event(Event("Test", "Event"))
+
+        self.run_until_delivered(received, 1)
+        self.assertTrue(self.router.logger.error.called)
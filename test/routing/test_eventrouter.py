@@ -3,20 +3,32 @@ import sys
 if (sys.version_info < (3, 3)):
     from mock import MagicMock
     from mock import Mock
+    from mock import ANY
+    from mock import patch
 else:
     from unittest.mock import MagicMock
     from unittest.mock import Mock
+    from unittest.mock import ANY
+    from unittest.mock import patch
 
 from heartbeat.network import SocketBroadcaster
-from heartbeat.routing import EventRouter, RateLimitHandler
+from heartbeat.routing import EventRouter, RateLimitHandler, TokenBucket, EventBatch
+from heartbeat.routing import Subscriber, Overflow, EventWindow, get_limiter_options
+from heartbeat.routing import EventFilter, get_subscriber_options
+from heartbeat.routing import TopicPriorityQueue, get_queue_options
+from heartbeat.routing import EventCoalescer, get_coalescer_options
 from heartbeat.monitoring import MonitorHandler
-from heartbeat.multiprocessing import Cache
-from heartbeat.platform import Event, Topics
+from heartbeat.multiprocessing import Cache, BackgroundTimer
+from heartbeat.platform import Event, Topics, ConfigManager
 from heartbeat.plugin import Plugin
+from heartbeat.events import EventBuffer
 import logging
 import datetime
+import threading
+from time import monotonic, sleep, time
 
 import concurrent.futures
+import queue
 
 class TestDispatcher(unittest.TestCase):
 
@@ -58,6 +70,300 @@ class TestDispatcher(unittest.TestCase):
        self.eventserver.put_event(self.event)
        self.tp.submit.assert_called_once_with(self.eventserver._event_queue_worker)
 
+    def test_attach_paced(self):
+        bucket = Mock(name='bucket', spec=TokenBucket)
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig, bucket)
+
+        self.assertTrue(self._compare_event_from_sig in self.eventserver.topics[Topics.DEBUG])
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.assertEqual(bucket, subscriber.pacing)
+
+    def test_attach_options(self):
+        self.eventserver.attach(
+                Topics.DEBUG,
+                self._compare_event_from_sig,
+                queue_size=5,
+                overflow=Overflow.BLOCK,
+                concurrency=2
+                )
+
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.assertEqual(5, subscriber.queue_size)
+        self.assertEqual(Overflow.BLOCK, subscriber.overflow)
+        self.assertEqual(2, subscriber.concurrency)
+
+    def test__forward_event_paced(self):
+        bucket = Mock(name='bucket', spec=TokenBucket)
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig, bucket)
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+
+        self.eventserver._forward_event(self.event)
+        self.tp.submit.assert_called_once_with(
+                self.eventserver._drain,
+                subscriber,
+                ANY
+                )
+
+        bucket.reserve.return_value = 0.0
+        self.eventserver._drain(subscriber)
+        bucket.reserve.assert_called_once_with()
+        self.assertTrue(self.ran_compare)
+        self.assertEqual(0, subscriber.active)
+
+    def test__drain_paced_waits_on_timer(self):
+        bucket = Mock(name='bucket', spec=TokenBucket)
+        bucket.reserve.return_value = 0.5
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig, bucket)
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.eventserver._forward_event(self.event)
+        self.tp.submit.reset_mock()
+
+        with patch('heartbeat.routing.BackgroundTimer') as timer:
+            self.eventserver._drain(subscriber)
+
+        # Nothing delivered, and no worker held while waiting
+        self.assertFalse(self.ran_compare)
+        self.assertEqual(1, subscriber.active)
+        self.assertEqual(0.5, timer.call_args[0][0])
+        timer.return_value.start.assert_called_once_with()
+
+        resume = timer.call_args[0][2]
+        resume()
+        self.tp.submit.assert_called_once_with(
+                self.eventserver._drain, subscriber, None, self.event)
+
+        self.eventserver._drain(subscriber, None, self.event)
+        bucket.reserve.assert_called_once_with()
+        self.assertTrue(self.ran_compare)
+        self.assertEqual(0, subscriber.active)
+
+    def test__drain_handler_error(self):
+        callback = MagicMock(side_effect=Exception("test exception"))
+        self.eventserver.attach(Topics.DEBUG, callback)
+        subscriber = self.eventserver.subscribers[callback]
+        self.eventserver.logger.error = MagicMock(return_value=None)
+
+        subscriber.offer(self.event)
+        subscriber.offer(self.event)
+        self.eventserver._drain(subscriber)
+
+        self.assertEqual(2, callback.call_count)
+        self.assertEqual(2, self.eventserver.logger.error.call_count)
+
+    def test_attach_batch(self):
+        self.eventserver.attach_batch(Topics.DEBUG, self._compare_batch, 2, 60)
+        self.eventserver.attach_batch(Topics.INFO, self._compare_batch, 2, 60)
+
+        batch = self.eventserver.batches[self._compare_batch]
+        self.assertTrue(batch in self.eventserver.batch_topics[Topics.DEBUG])
+        self.assertTrue(batch in self.eventserver.batch_topics[Topics.INFO])
+
+        self.eventserver._forward_event(self.event)
+        self.tp.submit.assert_not_called()
+
+        self.eventserver._forward_event(self.event)
+        subscriber = self.eventserver.subscribers[self._compare_batch]
+        self.tp.submit.assert_called_once_with(
+                self.eventserver._drain,
+                subscriber,
+                ANY
+                )
+
+        self.eventserver._drain(subscriber)
+        self.assertTrue(self.ran_compare)
+
+    def test__forward_event_filtered(self):
+        self.eventserver.attach(
+                Topics.DEBUG,
+                self._compare_event_from_sig,
+                event_filter=EventFilter(host='web*')
+                )
+        self.eventserver.attach_batch(
+                Topics.DEBUG,
+                self._compare_batch,
+                1,
+                60,
+                event_filter=EventFilter(host='web*')
+                )
+
+        self.event.host = 'db1.example.com'
+        self.eventserver._forward_event(self.event)
+        self.tp.submit.assert_not_called()
+
+        self.event.host = 'web1.example.com'
+        self.eventserver._forward_event(self.event)
+        self.assertEqual(2, self.tp.submit.call_count)
+
+    def test_halt(self):
+        self.eventserver.attach_batch(Topics.DEBUG, self._compare_batch, 10, 60)
+        self.eventserver._forward_event(self.event)
+
+        self.eventserver.halt()
+
+        self.tp.submit.assert_called_once_with(ANY, ANY, ANY)
+        self.limiter.halt.assert_called_once_with()
+
+    def test_detach(self):
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig)
+        self.eventserver.attach(Topics.INFO, self._compare_event_from_sig)
+
+        self.eventserver.detach(self._compare_event_from_sig)
+        self.eventserver._forward_event(self.event)
+
+        self.assertNotIn(self._compare_event_from_sig, self.eventserver.topics[Topics.DEBUG])
+        self.assertNotIn(self._compare_event_from_sig, self.eventserver.topics[Topics.INFO])
+        self.assertNotIn(self._compare_event_from_sig, self.eventserver.subscribers)
+        self.tp.submit.assert_not_called()
+
+    def test_detach_batch(self):
+        self.eventserver.attach_batch(Topics.DEBUG, self._compare_batch, 10, 60)
+        self.eventserver._forward_event(self.event)
+
+        self.eventserver.detach(self._compare_batch)
+        self.eventserver._forward_event(self.event)
+
+        self.tp.submit.assert_called_once_with(ANY, ANY, ANY)
+        self.assertEqual([], self.eventserver.batch_topics[Topics.DEBUG])
+        self.assertNotIn(self._compare_batch, self.eventserver.batches)
+
+    def test_reattach(self):
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig, queue_size=5)
+        self.eventserver.detach(self._compare_event_from_sig)
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig, queue_size=50)
+
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.assertEqual([self._compare_event_from_sig], self.eventserver.topics[Topics.DEBUG])
+        self.assertEqual(50, subscriber.queue_size)
+
+    def test_metrics_per_instance(self):
+        class Handler(object):
+            def handle(self, event):
+                pass
+
+        first = Handler()
+        second = Handler()
+        self.eventserver.attach(Topics.DEBUG, first.handle)
+        self.eventserver.attach(Topics.DEBUG, second.handle)
+        self.eventserver.detach(first.handle)
+        self.eventserver.attach(Topics.DEBUG, first.handle)
+
+        self.assertEqual('Handler.handle', self.eventserver._describe(first.handle))
+        self.assertEqual('Handler.handle#2', self.eventserver._describe(second.handle))
+        self.assertIsNot(
+            self.eventserver._handler_time[first.handle],
+            self.eventserver._handler_time[second.handle]
+            )
+
+    def test_history(self):
+        history = EventBuffer(10)
+        router = EventRouter(self.tp, self.limiter, history=history)
+
+        router._forward_event(self.event)
+
+        self.assertEqual([self.event], history.query())
+
+    def test__event_queue_worker_survives_raising_filter(self):
+        event_filter = EventFilter(payload={'size': lambda v: v > 5})
+        self.eventserver.attach(
+            Topics.DEBUG, self._compare_event_from_sig, event_filter=event_filter)
+        bad = Event("Bad", "", type=Topics.DEBUG)
+        bad.payload['size'] = 'large'
+        good = Event("Good", "", type=Topics.DEBUG)
+        good.payload['size'] = 10
+        self.eventserver.queue.put(bad)
+        self.eventserver.queue.put(good)
+        self.eventserver.worker_running = True
+
+        with patch.object(EventFilter, '_logger'):
+            self.eventserver._event_queue_worker()
+
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.assertEqual([good], list(subscriber.pending))
+        self.assertTrue(self.eventserver.queue.empty())
+        self.assertFalse(self.eventserver.worker_running)
+
+    def test__event_queue_worker_plain_queue(self):
+        self.eventserver = EventRouter(self.tp, self.limiter, queue=queue.Queue())
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig)
+        self.eventserver.queue.put(self.event)
+        self.eventserver.worker_running = True
+
+        self.eventserver._event_queue_worker()
+
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.assertEqual([self.event], list(subscriber.pending))
+        self.assertFalse(self.eventserver.worker_running)
+
+    def test__event_queue_worker_resets_on_crash(self):
+        self.eventserver.queue.put(self.event)
+        self.eventserver.worker_running = True
+        self.eventserver.queue.get_timed = Mock(side_effect=RuntimeError('broken'))
+
+        self.assertRaises(RuntimeError, self.eventserver._event_queue_worker)
+        self.assertFalse(self.eventserver.worker_running)
+
+    def test__start_worker_checks_result(self):
+        self.eventserver._start_worker()
+
+        self.tp.submit.return_value.add_done_callback.assert_called_once_with(
+            self.eventserver._check_call_status)
+
+    def test_put_event_counts_limiter_decisions(self):
+        self.limiter.allow_event.side_effect = [True, False]
+        self.eventserver.put_event(Event("Accepted", "", type=Topics.INFO))
+        self.eventserver.put_event(Event("Rejected", "", type=Topics.INFO))
+
+        snapshot = self.eventserver.metrics.snapshot()
+        self.assertEqual(1, snapshot['limiter_accepted{topic=INFO}'])
+        self.assertEqual(1, snapshot['limiter_rejected{topic=INFO}'])
+        self.assertEqual(1, snapshot['queue_depth'])
+
+    def test__drain_records_timings(self):
+        received = []
+
+        def handler(event):
+            received.append(event)
+
+        self.eventserver.attach(Topics.INFO, handler)
+        subscriber = self.eventserver.subscribers[handler]
+        subscriber.offer(self.event)
+        self.eventserver._drain(subscriber, 0)
+
+        snapshot = self.eventserver.metrics.snapshot()
+        self.assertEqual([self.event], received)
+        self.assertEqual(1, snapshot['handler_seconds{subscriber=handler}']['count'])
+        self.assertEqual(1, snapshot['threadpool_wait_seconds']['count'])
+        self.assertEqual(0, snapshot['threadpool_busy'])
+
+    def test_put_event_coalesced(self):
+        coalescer = Mock(spec=EventCoalescer)
+        coalescer.add.return_value = False
+        self.eventserver = EventRouter(self.tp, self.limiter, coalescer=coalescer)
+        self.eventserver.put_event(self.event)
+
+        coalescer.add.assert_called_once_with(self.event)
+        self.assertEqual(self.eventserver._enqueue, coalescer.emit)
+        self.assertTrue(self.eventserver.queue.empty())
+
+        self.eventserver.halt()
+        coalescer.halt.assert_called_once_with()
+
+    def test__event_queue_worker(self):
+        self.eventserver.attach(Topics.DEBUG, self._compare_event_from_sig)
+        for i in range(10):
+            self.eventserver.queue.put(self.event)
+        self.eventserver.worker_running = True
+
+        self.eventserver._event_queue_worker()
+
+        self.assertTrue(self.eventserver.queue.empty())
+        self.assertFalse(self.eventserver.worker_running)
+
+        # The subscriber's queue is drained by a single task
+        subscriber = self.eventserver.subscribers[self._compare_event_from_sig]
+        self.assertEqual(1, self.tp.submit.call_count)
+        self.assertEqual(10, len(subscriber.pending))
+
     def test__check_call_status(self):
         f = concurrent.futures.Future()
         f.set_exception(None)
@@ -69,21 +375,643 @@ class TestDispatcher(unittest.TestCase):
         self.eventserver._check_call_status(f)
         self.eventserver.logger.error.assert_called_once_with("Handler: %s at %s", str(e), " -- ")
 
+    def _compare_batch(self, events):
+        for e in events:
+            self._compare_event_from_sig(e)
+
     def _compare_event_from_sig(self, e):
         self.ran_compare = True
         self.assertEquals(self.event.__hash__(), e.__hash__())
 
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.slept = []
+        self.bucket = TokenBucket(2, 2, self._clock, self.slept.append)
+
+    def _clock(self):
+        return self.now
+
+    def test_burst(self):
+        self.assertEqual(0, self.bucket.reserve())
+        self.assertEqual(0, self.bucket.reserve())
+        self.assertAlmostEqual(0.5, self.bucket.reserve())
+        self.assertAlmostEqual(1.0, self.bucket.reserve())
+
+    def test_refill(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.now = 0.5
+        self.assertEqual(0, self.bucket.reserve())
+
+        self.now = 100
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.assertAlmostEqual(0.5, self.bucket.reserve())
+
+    def test_consume(self):
+        self.bucket.consume()
+        self.bucket.consume()
+        self.assertEqual([], self.slept)
+
+        self.bucket.consume()
+        self.assertEqual(1, len(self.slept))
+        self.assertAlmostEqual(0.5, self.slept[0])
+
+    def test_invalid_rate(self):
+        self.assertRaises(Exception, TokenBucket, 0)
+
+class EventBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.submit = MagicMock(return_value=None)
+        self.callback = MagicMock(return_value=None)
+        self.batch = EventBatch(self.callback, self.submit, 3, 0.2)
+
+    def test_flush_on_size(self):
+        events = [Event("", str(i)) for i in range(3)]
+        for e in events:
+            self.batch.add(e)
+
+        self.submit.assert_called_once_with(self.callback, events)
+        self.assertEqual([], self.batch.events)
+
+    def test_flush_on_latency(self):
+        e = Event("", "")
+        self.batch.add(e)
+        self.submit.assert_not_called()
+
+        deadline = monotonic() + 1
+        while not self.submit.called and monotonic() < deadline:
+            sleep(0.01)
+        self.submit.assert_called_once_with(self.callback, [e])
+
+    def test_flush_empty(self):
+        self.batch.flush()
+        self.submit.assert_not_called()
+
+class SubscriberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.callback = MagicMock(return_value=None)
+
+    def test_concurrency(self):
+        subscriber = Subscriber(self.callback, concurrency=2)
+
+        self.assertTrue(subscriber.offer(1))
+        self.assertTrue(subscriber.offer(2))
+        self.assertFalse(subscriber.offer(3))
+
+        self.assertEqual(1, subscriber.take())
+        self.assertEqual(2, subscriber.take())
+        self.assertEqual(3, subscriber.take())
+        self.assertEqual(None, subscriber.take())
+        self.assertEqual(1, subscriber.active)
+
+        self.assertTrue(subscriber.offer(4))
+
+    def test_drop_oldest(self):
+        subscriber = Subscriber(self.callback, 2, Overflow.DROP_OLDEST)
+        for i in range(4):
+            subscriber.offer(i)
+
+        self.assertEqual([2, 3], list(subscriber.pending))
+        self.assertEqual(2, subscriber.dropped)
+
+    def test_drop_newest(self):
+        subscriber = Subscriber(self.callback, 2, Overflow.DROP_NEWEST)
+        for i in range(4):
+            subscriber.offer(i)
+
+        self.assertEqual([0, 1], list(subscriber.pending))
+        self.assertEqual(2, subscriber.dropped)
+
+    def test_unbounded(self):
+        subscriber = Subscriber(self.callback, 0)
+        for i in range(2000):
+            subscriber.offer(i)
+
+        self.assertEqual(2000, len(subscriber.pending))
+        self.assertEqual(0, subscriber.dropped)
+
+    def test_block(self):
+        subscriber = Subscriber(self.callback, 1, Overflow.BLOCK)
+        subscriber.offer(1)
+
+        def take_later():
+            sleep(0.1)
+            subscriber.take()
+
+        t = threading.Thread(target=take_later)
+        t.start()
+        subscriber.offer(2)
+        t.join()
+
+        self.assertEqual([2], list(subscriber.pending))
+        self.assertEqual(0, subscriber.dropped)
+
+class EventWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.window = EventWindow(100, 3)
+
+    def test_touch(self):
+        self.assertEqual([], self.window.touch('a', 1000))
+        self.assertEqual(1000, self.window.last_seen('a'))
+        self.assertEqual(None, self.window.last_seen('b'))
+
+    def test_capacity(self):
+        self.window.touch('a', 1000)
+        self.window.touch('b', 1001)
+        self.window.touch('c', 1002)
+        self.window.touch('a', 1003)
+
+        self.assertEqual(['b'], self.window.touch('d', 1004))
+        self.assertEqual(3, len(self.window))
+
+    def test_expiry(self):
+        self.window.touch('a', 1000)
+        self.window.touch('b', 1050)
+
+        self.assertEqual(['a'], self.window.touch('c', 1100))
+        self.assertEqual(['b', 'c'], self.window.evict(1200))
+        self.assertEqual(0, len(self.window))
+
+class EventFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.event = Event("SMART Alert", "Problem in /dev/sda", "web1.example.com")
+        self.event.source = 'SMARTMonitor'
+        self.event.payload['ip_type'] = 'WAN'
+
+    def test_empty(self):
+        self.assertTrue(EventFilter().matches(self.event))
+
+    def test_patterns(self):
+        self.assertTrue(EventFilter(host='web*').matches(self.event))
+        self.assertTrue(EventFilter(host=['db*', '*.example.com']).matches(self.event))
+        self.assertFalse(EventFilter(host='db*').matches(self.event))
+        self.assertTrue(EventFilter(source='SMARTMonitor').matches(self.event))
+        self.assertFalse(EventFilter(source='SMART').matches(self.event))
+        self.assertTrue(EventFilter(title='SMART*').matches(self.event))
+
+        self.event.source = None
+        self.assertFalse(EventFilter(source='*').matches(self.event))
+
+    def test_payload(self):
+        self.assertTrue(EventFilter(payload={'ip_type': 'WAN'}).matches(self.event))
+        self.assertFalse(EventFilter(payload={'ip_type': 'LAN'}).matches(self.event))
+        self.assertFalse(EventFilter(payload={'ip': 'WAN'}).matches(self.event))
+        self.assertTrue(
+                EventFilter(payload={'ip_type': lambda v: v.startswith('W')}).matches(self.event)
+                )
+
+    def test_raising_predicate(self):
+        event_filter = EventFilter(payload={'ip_type': lambda v: v > 5})
+
+        with patch.object(EventFilter, '_logger') as logger:
+            self.assertFalse(event_filter.matches(self.event))
+
+        self.assertEqual(1, logger.error.call_count)
+
+    def test_all_must_match(self):
+        self.assertFalse(EventFilter(host='web*', title='Foo').matches(self.event))
+
+    def test_combine(self):
+        combined = EventFilter(host='web*').combine(EventFilter(title='Foo'))
+        self.assertFalse(combined.matches(self.event))
+
+        combined = EventFilter(host='web*').combine(EventFilter(title='SMART*'))
+        self.assertTrue(combined.matches(self.event))
+
+class SubscriberOptionsTest(unittest.TestCase):
+
+    def test_get_subscriber_options(self):
+        plugin = Plugin()
+        settings = ConfigManager({
+            'notifying': {
+                'routing': {
+                    'heartbeat.plugin.Plugin': {
+                        'rate': 2,
+                        'queue_size': 10,
+                        'overflow': 'drop-newest',
+                        'filter': {'host': 'web*', 'payload': {'ip_type': 'WAN'}}
+                    }
+                }
+            }
+        })
+        settings.finalize()
+
+        options = get_subscriber_options(plugin, settings)
+        self.assertEqual(2, options['pacing'].rate)
+        self.assertEqual(10, options['queue_size'])
+        self.assertEqual(Overflow.DROP_NEWEST, options['overflow'])
+
+        e = Event("", "", "web1")
+        e.payload['ip_type'] = 'WAN'
+        self.assertTrue(options['event_filter'].matches(e))
+        e.payload['ip_type'] = 'LAN'
+        self.assertFalse(options['event_filter'].matches(e))
+
+    def test_get_subscriber_options_unset(self):
+        settings = ConfigManager({'notifying': {}})
+        settings.finalize()
+
+        self.assertEqual({}, get_subscriber_options(Plugin(), settings))
+
+class LimiterOptionsTest(unittest.TestCase):
+
+    def test_get_limiter_options(self):
+        settings = ConfigManager({
+            'heartbeat': {
+                'rate_limiting': {
+                    'strategies': {'warning': 'window'},
+                    'windows': {'warning': 60},
+                    'max_entries': 5
+                }
+            }
+        })
+        settings.finalize()
+
+        options = get_limiter_options(settings)
+        self.assertEqual('window', options['topic_strategies'][Topics.WARNING])
+        self.assertEqual('always', options['topic_strategies'][Topics.HEARTBEAT])
+        self.assertEqual({Topics.WARNING: 60}, options['windows'])
+        self.assertEqual(5, options['max_entries'])
+
+    def test_get_limiter_options_unset(self):
+        settings = ConfigManager({'heartbeat': {}})
+        settings.finalize()
+
+        self.assertEqual({}, get_limiter_options(settings))
+
+class TopicPriorityQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0]
+        self.queue = TopicPriorityQueue(clock=lambda: self.now[0])
+
+    def test_get_orders_by_topic(self):
+        debug = Event("Debug", "", type=Topics.DEBUG)
+        heartbeat = Event("Heartbeat", "", type=Topics.HEARTBEAT)
+        warning = Event("Warning", "", type=Topics.WARNING)
+        for e in (debug, heartbeat, warning):
+            self.queue.put(e)
+
+        self.assertEqual(3, self.queue.qsize())
+        self.assertEqual(
+            [warning, heartbeat, debug],
+            [self.queue.get() for i in range(3)]
+            )
+        self.assertTrue(self.queue.empty())
+
+    def test_get_keeps_topic_fifo(self):
+        events = [Event("Info %d" % i, "") for i in range(3)]
+        for e in events:
+            self.queue.put(e)
+
+        self.assertEqual(events, [self.queue.get() for i in range(3)])
+
+    def test_waiting_events_gain_priority(self):
+        debug = Event("Debug", "", type=Topics.DEBUG)
+        self.queue.put(debug)
+        self.now[0] = 13
+        warning = Event("Warning", "", type=Topics.WARNING)
+        self.queue.put(warning)
+
+        self.assertIs(debug, self.queue.get())
+
+    def test_aging_disabled(self):
+        self.queue.aging = 0
+        debug = Event("Debug", "", type=Topics.DEBUG)
+        self.queue.put(debug)
+        self.now[0] = 1000
+        warning = Event("Warning", "", type=Topics.WARNING)
+        self.queue.put(warning)
+
+        self.assertIs(warning, self.queue.get())
+
+    def test_custom_order(self):
+        queue = TopicPriorityQueue(order=[Topics.DEBUG])
+        warning = Event("Warning", "", type=Topics.WARNING)
+        debug = Event("Debug", "", type=Topics.DEBUG)
+        queue.put(warning)
+        queue.put(debug)
+
+        self.assertEqual(Topics.DEBUG, queue.order[0])
+        self.assertEqual(Topics.WARNING, queue.order[1])
+        self.assertEqual(len(Topics), len(queue.order))
+        self.assertIs(debug, queue.get())
+
+    def test_get_empty(self):
+        self.assertRaises(Exception, self.queue.get, False)
+        self.assertRaises(Exception, self.queue.get, True, 0.01)
+
+    def test_task_done(self):
+        self.queue.put(Event("Info", ""))
+        self.queue.get()
+        self.queue.task_done()
+        self.queue.join()
+
+        self.assertRaises(ValueError, self.queue.task_done)
+
+    def test_get_queue_options(self):
+        settings = ConfigManager({
+            'heartbeat': {
+                'event_priority': {
+                    'order': ['debug', 'warning'],
+                    'aging': 5
+                }
+            }
+        })
+        settings.finalize()
+
+        options = get_queue_options(settings)
+        self.assertEqual([Topics.DEBUG, Topics.WARNING], options['order'])
+        self.assertEqual(5, options['aging'])
+
+    def test_get_queue_options_unset(self):
+        settings = ConfigManager({'heartbeat': {}})
+        settings.finalize()
+
+        self.assertEqual({}, get_queue_options(settings))
+
+class EventCoalescerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [100]
+        self.emit = Mock(name='emit')
+        self.timer = Mock(name='timer', spec=BackgroundTimer)
+        self.coalescer = EventCoalescer(
+            window=60,
+            emit=self.emit,
+            clock=lambda: self.now[0],
+            timer=self.timer
+            )
+
+    def make_event(self, host="host1", title="Disk failing"):
+        e = Event(title, "sda", host, Topics.WARNING)
+        e.source = "SMARTMonitor"
+        return e
+
+    def test_first_event_passes(self):
+        self.assertTrue(self.coalescer.add(self.make_event()))
+        self.timer.start.assert_called_once_with()
+
+    def test_repeats_are_absorbed(self):
+        self.coalescer.add(self.make_event())
+        self.assertFalse(self.coalescer.add(self.make_event("host2")))
+        self.assertTrue(self.coalescer.add(self.make_event(title="Other")))
+
+    def test_uncoalesced_topics_pass(self):
+        e = Event("Pulse", "", type=Topics.HEARTBEAT)
+        self.assertTrue(self.coalescer.add(e))
+        self.assertTrue(self.coalescer.add(e))
+
+    def test_by_host(self):
+        self.coalescer.by_host = True
+        self.coalescer.add(self.make_event())
+        self.assertTrue(self.coalescer.add(self.make_event("host2")))
+
+    def test_sweep_emits_summary(self):
+        first = self.make_event()
+        first.payload['disk'] = 'sda'
+        self.coalescer.add(first)
+        self.now[0] = 110
+        self.coalescer.add(self.make_event("host2"))
+        self.coalescer.add(self.make_event())
+
+        self.coalescer.sweep()
+        self.emit.assert_not_called()
+
+        self.now[0] = 161
+        self.coalescer.sweep()
+
+        summary = self.emit.call_args[0][0]
+        self.assertEqual("Disk failing", summary.title)
+        self.assertEqual("2 hosts", summary.host)
+        self.assertEqual("SMARTMonitor", summary.source)
+        self.assertEqual(Topics.WARNING, summary.type)
+        self.assertEqual('sda', summary.payload['disk'])
+        self.assertEqual({
+            'count': 3,
+            'first_seen': 100,
+            'last_seen': 110,
+            'hosts': ['host1', 'host2']
+            }, summary.payload['coalesced'])
+        self.assertEqual({}, self.coalescer.groups)
+        self.assertTrue(self.coalescer.add(summary))
+
+    def test_sweep_skips_single_events(self):
+        self.coalescer.add(self.make_event())
+        self.now[0] = 200
+        self.coalescer.sweep()
+
+        self.emit.assert_not_called()
+        self.assertTrue(self.coalescer.add(self.make_event()))
+
+    def test_halt_emits_open_windows(self):
+        self.coalescer.add(self.make_event())
+        self.coalescer.add(self.make_event())
+        self.coalescer.halt()
+
+        self.timer.stop.assert_called_once_with()
+        self.assertEqual(1, self.emit.call_count)
+
+    def test_get_coalescer_options(self):
+        settings = ConfigManager({
+            'heartbeat': {
+                'coalescing': {
+                    'window': 30,
+                    'topics': ['warning'],
+                    'by_host': True
+                }
+            }
+        })
+        settings.finalize()
+
+        self.assertEqual({
+            'window': 30,
+            'topics': [Topics.WARNING],
+            'by_host': True
+            }, get_coalescer_options(settings))
+
+    def test_get_coalescer_options_unset(self):
+        settings = ConfigManager({'heartbeat': {}})
+        settings.finalize()
+
+        self.assertIsNone(get_coalescer_options(settings))
+
 class RateLimitHandlerTest(unittest.TestCase):
 
     def setUp(self):
         self.event_cache = Mock(name='eventcache', spec=Cache)
+        self.event_cache.items.return_value = []
         self.event_time_cache = Mock(name='eventcache', spec=Cache)
+        self.event_time_cache.items.return_value = []
+        self.event_time_cache.keys.return_value = []
+
+        self.timer = Mock(name='timer', spec=BackgroundTimer)
 
         self.limiter = RateLimitHandler(
                     None,
                     self.event_cache,
-                    self.event_time_cache
+                    self.event_time_cache,
+                    timer=self.timer
+                )
+
+    def test_drops_legacy_digests(self):
+        legacy = "a" * 128
+        current = Event("", "").__hash__()
+        self.event_cache.items.return_value = [
+            ('Legacy', legacy),
+            ('Current', current)
+            ]
+        self.event_time_cache.keys.return_value = [legacy, current]
+        self.event_time_cache.exists.return_value = True
+
+        RateLimitHandler(None, self.event_cache, self.event_time_cache, timer=self.timer)
+
+        self.event_cache.remove.assert_called_once_with('Legacy')
+        self.event_time_cache.remove.assert_called_once_with(legacy)
+
+    def test_named_strategies(self):
+        self.assertEqual(
+                self.limiter.event_different_from_previous,
+                self.limiter.topic_strategies[Topics.WARNING]
+                )
+        self.assertEqual(
+                self.limiter.always_allow,
+                self.limiter.topic_strategies[Topics.HEARTBEAT]
+                )
+
+        limiter = RateLimitHandler(
+                {Topics.WARNING: 'window'},
+                self.event_cache,
+                self.event_time_cache
+                )
+        self.assertEqual(
+                limiter.event_outside_window,
+                limiter.topic_strategies[Topics.WARNING]
+                )
+
+    def test_event_outside_window(self):
+        limiter = RateLimitHandler(
+                {Topics.WARNING: 'window'},
+                self.event_cache,
+                self.event_time_cache,
+                timer=self.timer,
+                windows={Topics.WARNING: 60}
+                )
+        e = Event("", "", type=Topics.WARNING)
+        e.source = 'test'
+
+        now = time()
+        with patch('heartbeat.routing.time', return_value=now):
+            self.assertTrue(limiter.allow_event(e))
+            self.assertFalse(limiter.allow_event(e))
+
+        with patch('heartbeat.routing.time', return_value=now + 61):
+            self.assertTrue(limiter.allow_event(e))
+
+    def test_event_time_ignored(self):
+        limiter = RateLimitHandler(
+                {Topics.WARNING: 'window'},
+                self.event_cache,
+                self.event_time_cache,
+                timer=self.timer,
+                windows={Topics.WARNING: 60}
+                )
+        seen = Event("seen", "", type=Topics.WARNING)
+        seen.source = 'test'
+        limiter.log_event(seen)
+
+        for when in (float('nan'), time() + 3 * 3600):
+            e = Event("skewed", "", type=Topics.WARNING)
+            e.source = 'test'
+            e.when = when
+            limiter.log_event(e)
+
+            self.assertIsNotNone(limiter.window.last_seen(seen.__hash__()))
+            self.assertFalse(limiter.allow_event(seen))
+
+    def test_load_window(self):
+        now = time()
+        self.event_time_cache.items.return_value = [
+                ('recent', now - 10),
+                ('expired', now - 8000),
+                ('garbage', 'foo'),
+                ('invalid', float('nan')),
+                ('ahead', now + 3 * 3600)
+                ]
+        self.event_time_cache.exists.return_value = True
+
+        limiter = RateLimitHandler(
+                None,
+                self.event_cache,
+                self.event_time_cache,
+                timer=self.timer
+                )
+
+        self.assertEqual(now - 10, limiter.window.last_seen('recent'))
+        self.assertEqual(None, limiter.window.last_seen('expired'))
+        self.event_time_cache.remove.assert_any_call('expired')
+        self.event_time_cache.remove.assert_any_call('garbage')
+        self.event_time_cache.remove.assert_any_call('invalid')
+        self.assertEqual(3, self.event_time_cache.remove.call_count)
+        self.assertLessEqual(limiter.window.last_seen('ahead'), time())
+
+    def test_log_event_evicts(self):
+        limiter = RateLimitHandler(
+                None,
+                self.event_cache,
+                self.event_time_cache,
+                timer=self.timer,
+                max_entries=1
+                )
+        self.event_time_cache.exists.return_value = True
+        first = Event("first", "")
+        first.source = 'test'
+        second = Event("second", "")
+        second.source = 'test'
+
+        limiter.log_event(first)
+        limiter.log_event(second)
+
+        self.event_time_cache.remove.assert_called_once_with(first.__hash__())
+
+    def test_log_event(self):
+        e = Event("", "")
+        e.when -= 3600
+        with patch('heartbeat.routing.time', return_value=1000.0):
+            self.limiter.log_event(e)
+
+        self.event_time_cache.write.assert_called_once_with(e.__hash__(), 1000.0)
+        self.event_cache.write.assert_called_once_with(e.source, e.__hash__())
+        self.timer.start.assert_called_once_with()
+        self.event_cache.flush.assert_not_called()
+        self.event_time_cache.flush.assert_not_called()
+
+    def test_log_event_write_through(self):
+        limiter = RateLimitHandler(
+                    None,
+                    self.event_cache,
+                    self.event_time_cache,
+                    flush_interval=0
                 )
+        self.assertEqual(None, limiter.timer)
+
+        limiter.log_event(Event("", ""))
+        self.event_cache.flush.assert_called_once_with()
+        self.event_time_cache.flush.assert_called_once_with()
+
+    def test_halt(self):
+        self.limiter.halt()
+
+        self.timer.stop.assert_called_once_with()
+        self.event_cache.flush.assert_called_once_with()
+        self.event_time_cache.flush.assert_called_once_with()
 
     def test_event_delay_passed(self):
         e = Event("", "")
@@ -99,3 +99,12 @@ class EncryptorTest(unittest.TestCase):
         encrypted = b'aGVhcnRiZWF0aGVhcnRiZct2fh0EhS3LRnxKJkFWsdFG9+RffOSPDIzvndEoNGfZ'
         plaintext = self.encryptor.decrypt(encrypted, True)
         self.assertEqual(plaintext, correct_plaintext)
+
+    def test_encrypt_bytes(self):
+        """
+        Encryptor round trips bytes without decoding them
+        """
+        data = b'\x00HB\x01\xff binary'
+
+        encrypted = self.encryptor.encrypt(data)
+        self.assertEqual(data, self.encryptor.decrypt(encrypted, decode=False))